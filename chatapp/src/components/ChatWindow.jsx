@@ -38,6 +38,34 @@ const ChatWindow = ({ addToHistory = () => {} }) => {
     }
   }, [messages]);
 
+  // With deferred insights the chat reply carries an insight_job; poll it and fill the insight in when done.
+  const pollInsightJob = async (jobId, headers) => {
+    for (let attempt = 0; attempt < 30; attempt += 1) {
+      await new Promise((resolve) => setTimeout(resolve, 1000));
+      try {
+        const response = await fetch(
+          `http://localhost:8000/api/chatbot/insights/jobs/${jobId}/?session_id=${encodeURIComponent(sessionId)}`,
+          { headers }
+        );
+        if (!response.ok) return;
+        const job = await response.json();
+        if (job.status === 'done') {
+          setMessages((prevMessages) =>
+            prevMessages.map((msg) =>
+              msg.insightJobId === jobId
+                ? { ...msg, insight: job.insight, categories: job.categories, insightJobId: null }
+                : msg
+            )
+          );
+          return;
+        }
+        if (job.status === 'failed') return;
+      } catch (error) {
+        return;
+      }
+    }
+  };
+
   const handleSendMessage = async () => {
     if (currentMessage.trim() === '') return;
 
@@ -77,6 +105,7 @@ const ChatWindow = ({ addToHistory = () => {} }) => {
             categories: data.categories,
             sentiment: data.question_sentiment?.label,
             emotion: data.question_emotion?.label,
+            insightJobId: data.insight_job?.id,
             isThinking: false, // End thinking state
           }
         : { bot: `Error: ${data.error || 'Unknown error'}`, isThinking: false };
@@ -86,6 +115,10 @@ const ChatWindow = ({ addToHistory = () => {} }) => {
         ...prevMessages.slice(0, -1),
         botReply,
       ]);
+
+      if (botReply.insightJobId) {
+        pollInsightJob(botReply.insightJobId, headers);
+      }
     } catch (error) {
       setMessages((prevMessages) => [
         ...prevMessages.slice(0, -1),
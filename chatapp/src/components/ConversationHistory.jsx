@@ -17,7 +17,8 @@ const ConversationHistory = () => {
         const sessionId = localStorage.getItem('chat_session_id');
         response = await API.get(`chatbot/messages/anonymous/?session_id=${sessionId}`);
       }
-      setConversationHistory(response.data); // Update the conversation history with the response
+      // Pages come newest first; show the latest page in chronological order
+      setConversationHistory([...response.data.results].reverse());
     } catch (error) {
       console.error('Error fetching conversation history:', error);
     }
@@ -0,0 +1,62 @@
+import random
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from rag_project.jobs import DatabaseJobRunner
+from .models import ZoningEnrichmentJob
+from .profile_utils import fetch_zoning_context, save_zoning_context
+
+DEFAULT_ZONING_ENRICHMENT = {
+    'workers': 2,
+    'max_attempts': 5,
+    'retry_backoff': 10,
+    'max_backoff': 600,
+    'stale_after': 300,
+    'heartbeat': 60,
+}
+
+
+def enrichment_config():
+    return {**DEFAULT_ZONING_ENRICHMENT, **getattr(settings, 'ZONING_ENRICHMENT', {})}
+
+
+class ZoningEnrichmentRunner(DatabaseJobRunner):
+    """Runs ZoningEnrichmentJob rows on the shared job runner (see rag_project.jobs).
+
+    Network errors and timeouts are retried with jittered exponential
+    backoff; an address that cannot be geocoded or zoned fails immediately.
+    """
+
+    model = ZoningEnrichmentJob
+    name = 'zoning-job'
+
+    def config(self):
+        return enrichment_config()
+
+    def submit(self, user):
+        """Queues enrichment for ``user`` once the surrounding transaction commits."""
+        job = ZoningEnrichmentJob.objects.create(user=user)
+        transaction.on_commit(lambda: self.enqueue(job.pk))
+        return job
+
+    def get_job(self, job_id):
+        return ZoningEnrichmentJob.objects.select_related('user').get(pk=job_id)
+
+    def process(self, job):
+        # The lookups stay outside the transaction so it does not hold a write lock over network calls.
+        zoning_data = fetch_zoning_context(job.user)
+        with transaction.atomic():
+            save_zoning_context(job.user, zoning_data)
+            self.finish(job, ZoningEnrichmentJob.DONE)
+
+    def retryable(self, error):
+        return isinstance(error, requests.exceptions.RequestException)
+
+    def retry_delay(self, job, config):
+        ceiling = min(config['max_backoff'], config['retry_backoff'] * 2 ** (job.attempts - 1))
+        return random.uniform(ceiling / 2, ceiling)
+
+
+zoning_jobs = ZoningEnrichmentRunner()
@@ -0,0 +1,179 @@
+import hashlib
+import re
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils import timezone
+
+from rag_project.metrics import metrics
+from .geo_utils import fetch_zoning_properties, geocode_address, with_location
+from .models import GeoLookup
+from .zoning_atlas import get_zoning_atlas, local_zoning_available
+
+DEFAULT_GEO_CACHE = {
+    'enabled': True,
+    'backend': 'db',
+    'alias': 'default',
+    'ttl': 30 * 24 * 3600,
+    'negative_ttl': 24 * 3600,
+    'coordinate_precision': 5,
+}
+
+_separators = re.compile(r'[\s,.#]+')
+
+
+def geo_cache_config():
+    return {**DEFAULT_GEO_CACHE, **getattr(settings, 'GEO_LOOKUP_CACHE', {})}
+
+
+def normalize_address(address):
+    return _separators.sub(' ', address).strip().casefold()
+
+
+def coordinate_key(lat, lon, precision):
+    # Five decimals is about a metre, well inside any zoning district.
+    return f"{round(lat, precision):.{precision}f},{round(lon, precision):.{precision}f}"
+
+
+class DatabaseBackend:
+    """Keeps lookups in the accounts_geolookup table so they survive restarts and are shared by workers."""
+
+    def get(self, kind, key):
+        entry = GeoLookup.objects.filter(kind=kind, key_hash=GeoLookup.hash_key(key),
+                                         expires_at__gt=timezone.now()).first()
+        if entry is None:
+            return None
+        GeoLookup.objects.filter(pk=entry.pk).update(hits=F('hits') + 1)
+        return entry.found, entry.value
+
+    def set(self, kind, key, found, value, ttl):
+        defaults = {'key': key, 'found': found, 'value': value, 'hits': 0,
+                    'expires_at': timezone.now() + timedelta(seconds=ttl)}
+        GeoLookup.objects.update_or_create(kind=kind, key_hash=GeoLookup.hash_key(key), defaults=defaults)
+
+    def prune(self):
+        deleted, _ = GeoLookup.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class DjangoCacheBackend:
+    """Stores lookups in a configured Django cache alias instead of the table."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, kind, key):
+        return f"geo:{kind}:{hashlib.sha1(key.encode('utf-8')).hexdigest()}"
+
+    def get(self, kind, key):
+        return self.cache.get(self._key(kind, key))
+
+    def set(self, kind, key, found, value, ttl):
+        self.cache.set(self._key(kind, key), (found, value), timeout=ttl)
+
+    def prune(self):
+        return 0
+
+
+class GeoCache:
+    """Read-through cache for geocoding (by normalized address) and zoning (by rounded coordinates).
+
+    Misses are cached too, with a shorter TTL, so an unknown address does not
+    hit Nominatim on every retry. Transport errors are never cached.
+    """
+
+    def __init__(self, backend, ttl, negative_ttl, precision, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.precision = precision
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls):
+        config = geo_cache_config()
+        if config['backend'] == 'django':
+            backend = DjangoCacheBackend(config['alias'])
+        else:
+            backend = DatabaseBackend()
+        return cls(backend, config['ttl'], config['negative_ttl'], config['coordinate_precision'],
+                   enabled=config['enabled'])
+
+    def lookup(self, kind, key, fetch):
+        """Returns the cached value for (kind, key), calling fetch() and storing its result on a miss."""
+        if self.enabled:
+            cached = self.backend.get(kind, key)
+            self._count(kind, cached is not None)
+            if cached is not None:
+                return cached
+        value = fetch()
+        found = value is not None
+        if self.enabled:
+            self.backend.set(kind, key, found, value, self.ttl if found else self.negative_ttl)
+        return found, value
+
+    def geocode(self, address):
+        """Same contract as geo_utils.geocode_address: (lat, lon, display_name) or ValueError."""
+
+        def fetch():
+            try:
+                return list(geocode_address(address))
+            except ValueError:
+                return None
+
+        found, value = self.lookup(GeoLookup.GEOCODE, normalize_address(address), fetch)
+        if not found:
+            raise ValueError("Address not found.")
+        return tuple(value)
+
+    def zoning(self, lat, lon, geocoded_address, user_entered_address):
+        """Same contract as geo_utils.get_zoning_info; only the district properties are cached.
+
+        An imported zoning atlas answers locally and bypasses the cache.
+        """
+        if local_zoning_available():
+            props = get_zoning_atlas().lookup(lat, lon)
+            return with_location(props, lat, lon, geocoded_address, user_entered_address) if props else None
+        found, props = self.lookup(GeoLookup.ZONING, coordinate_key(lat, lon, self.precision),
+                                   lambda: fetch_zoning_properties(lat, lon))
+        if not found:
+            return None
+        return with_location(props, lat, lon, geocoded_address, user_entered_address)
+
+    def _count(self, kind, hit):
+        if hit:
+            metrics.counter('geo_cache_hits_total', 'Geo lookup cache hits', kind=kind).inc()
+        else:
+            metrics.counter('geo_cache_misses_total', 'Geo lookup cache misses', kind=kind).inc()
+
+    def stats(self):
+        stats = {}
+        for kind, _ in GeoLookup.KIND_CHOICES:
+            hits = metrics.counter('geo_cache_hits_total', kind=kind).value
+            misses = metrics.counter('geo_cache_misses_total', kind=kind).value
+            total = hits + misses
+            stats[kind] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else 0.0}
+        return stats
+
+    def prune(self):
+        return self.backend.prune()
+
+
+_geo_cache = None
+_geo_cache_lock = threading.Lock()
+
+
+def get_geo_cache():
+    global _geo_cache
+    if _geo_cache is None:
+        with _geo_cache_lock:
+            if _geo_cache is None:
+                _geo_cache = GeoCache.from_settings()
+    return _geo_cache
@@ -1,11 +1,50 @@
 # accounts/geo_utils.py
+import threading
+import time
+
 import requests
+from django.conf import settings
+
+def request_timeout():
+    # (connect, read) seconds; without it a stalled geocoder holds a worker indefinitely.
+    return getattr(settings, 'GEO_REQUEST_TIMEOUT', (5, 15))
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads; rate=None disables it."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + 1.0 / self.rate
+        time.sleep(start - now)
+
+_nominatim_limiter = None
+_nominatim_limiter_lock = threading.Lock()
+
+def nominatim_limiter():
+    # Nominatim's usage policy allows at most one request per second per application.
+    global _nominatim_limiter
+    if _nominatim_limiter is None:
+        with _nominatim_limiter_lock:
+            if _nominatim_limiter is None:
+                _nominatim_limiter = RateLimiter(getattr(settings, 'NOMINATIM_RPS', 1))
+    return _nominatim_limiter
 
 def geocode_address(address):
+    nominatim_limiter().wait()
     print(f"📍 Geocoding: {address}")
     geocode_url = "https://nominatim.openstreetmap.org/search"
     params = {'q': address, 'format': 'json', 'limit': 1}
-    response = requests.get(geocode_url, params=params, headers={"User-Agent": "geo-bot"})
+    response = requests.get(geocode_url, params=params, headers={"User-Agent": "geo-bot"},
+                            timeout=request_timeout())
     response.raise_for_status()
     data = response.json()
     if not data:
@@ -14,7 +53,7 @@ def geocode_address(address):
     lon = float(data[0]['lon'])
     return lat, lon, data[0].get("display_name", "")
 
-def get_zoning_info(lat, lon, geocoded_address, user_entered_address):
+def fetch_zoning_properties(lat, lon):
     zoning_url = "https://services1.arcgis.com/CjMORKCN9JBntrcv/arcgis/rest/services/RIZoningAtlas1016_WFL1/FeatureServer/14/query"
     params = {
         'geometry': f"{lon},{lat}",
@@ -25,13 +64,22 @@ def get_zoning_info(lat, lon, geocoded_address, user_entered_address):
         'returnGeometry': 'false',
         'f': 'geojson'
     }
-    response = requests.get(zoning_url, params=params)
+    response = requests.get(zoning_url, params=params, timeout=request_timeout())
     response.raise_for_status()
     data = response.json()
     if not data["features"]:
         return None
-    props = data["features"][0]["properties"]
+    return data["features"][0]["properties"]
+
+def with_location(props, lat, lon, geocoded_address, user_entered_address):
+    props = dict(props)
     props["geocoded_address"] = geocoded_address
     props["coordinates"] = {"lat": lat, "lon": lon}
     props["entered_address"] = user_entered_address
-    return props
\ No newline at end of file
+    return props
+
+def get_zoning_info(lat, lon, geocoded_address, user_entered_address):
+    props = fetch_zoning_properties(lat, lon)
+    if props is None:
+        return None
+    return with_location(props, lat, lon, geocoded_address, user_entered_address)
@@ -0,0 +1,113 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+
+from accounts.geo_cache import get_geo_cache, normalize_address
+from accounts.geo_utils import nominatim_limiter
+from accounts.models import CustomUser, UserProfile
+from accounts.profile_utils import ZONING_FIELDS, apply_zoning_info, full_address_of
+
+ADDRESS_FIELDS = ['address_line1', 'address_line2', 'city', 'state', 'zip_code']
+
+
+class Command(BaseCommand):
+    help = ('Enriches existing users with zoning data. Users whose profile already matches their current '
+            'address are skipped, so the command can be re-run (or resumed with --start-after) at any time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--rps', type=float, default=None,
+                            help='Maximum Nominatim requests per second (default: NOMINATIM_RPS)')
+        parser.add_argument('--start-after', type=int, default=0, help='Only process users with a larger id')
+        parser.add_argument('--force', action='store_true', help='Re-enrich users that are already up to date')
+
+    def handle(self, *args, **options):
+        if options['rps'] is not None:
+            nominatim_limiter().rate = options['rps']
+        self.geo_cache = get_geo_cache()
+        self.force = options['force']
+        self.verbosity = options['verbosity']
+        self.totals = {'users': 0, 'enriched': 0, 'failed': 0, 'skipped': 0, 'lookups': 0}
+        self.started = time.monotonic()
+
+        users = (
+            CustomUser.objects
+            .exclude(address_line1='', city='', zip_code='')
+            .order_by('pk')
+            .only('pk', *ADDRESS_FIELDS)
+        )
+        last_id = options['start_after']
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='zoning-backfill') as executor:
+            while True:
+                # Keyset chunks rather than one long-lived .iterator() cursor: on SQLite an open read
+                # cursor blocks the lookup threads from writing to the geo cache table.
+                chunk = list(users.filter(pk__gt=last_id)[:options['chunk_size']])
+                if not chunk:
+                    break
+                self._process(executor, chunk)
+                last_id = chunk[-1].pk
+
+        totals = self.totals
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {totals['enriched']} enriched, {totals['failed']} failed, {totals['skipped']} already up to date "
+            f"in {time.monotonic() - self.started:.1f}s"
+        ))
+
+    def _lookup(self, address):
+        close_old_connections()
+        try:
+            lat, lon, geocoded = self.geo_cache.geocode(address)
+            zoning = self.geo_cache.zoning(lat, lon, geocoded, address)
+            return zoning, None if zoning else 'No zoning data found.'
+        except Exception as e:
+            return None, str(e)
+        finally:
+            close_old_connections()
+
+    def _process(self, executor, chunk):
+        profiles = UserProfile.objects.in_bulk([user.pk for user in chunk], field_name='user_id')
+        pending = {}
+        for user in chunk:
+            address = full_address_of(user)
+            profile = profiles.get(user.pk)
+            if not self.force and profile and profile.zoning_abbr and profile.address_entered == address:
+                self.totals['skipped'] += 1
+                continue
+            pending.setdefault(normalize_address(address), (address, []))[1].append((user, address))
+
+        keys = list(pending)
+        results = dict(zip(keys, executor.map(self._lookup, [pending[key][0] for key in keys])))
+
+        created, updated = [], []
+        for key, (_, members) in pending.items():
+            zoning, error = results[key]
+            for user, address in members:
+                if zoning is None:
+                    self.totals['failed'] += 1
+                    if self.verbosity > 1:
+                        self.stderr.write(f"User {user.pk} ({address}): {error}")
+                    continue
+                profile = profiles.get(user.pk)
+                if profile is None:
+                    profile = UserProfile(user=user)
+                    created.append(profile)
+                else:
+                    updated.append(profile)
+                apply_zoning_info(profile, {**zoning, 'entered_address': address})
+        with transaction.atomic():
+            UserProfile.objects.bulk_create(created, batch_size=500)
+            UserProfile.objects.bulk_update(updated, ZONING_FIELDS, batch_size=500)
+
+        totals = self.totals
+        totals['users'] += len(chunk)
+        totals['lookups'] += len(keys)
+        totals['enriched'] += len(created) + len(updated)
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{totals['users']} users processed (last id {chunk[-1].pk}): {totals['enriched']} enriched, "
+            f"{totals['failed']} failed, {totals['skipped']} skipped; {totals['lookups']} unique addresses; "
+            f"{totals['users'] / elapsed:.1f} users/s, {totals['lookups'] / elapsed:.1f} lookups/s"
+        )
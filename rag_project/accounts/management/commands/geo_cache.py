@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from accounts.geo_cache import get_geo_cache
+from accounts.models import GeoLookup
+
+
+class Command(BaseCommand):
+    help = 'Reports geocoding/zoning lookup cache usage and optionally prunes expired entries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Delete expired entries')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = get_geo_cache().prune()
+            self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} expired entries'))
+
+        rows = (
+            GeoLookup.objects
+            .values('kind')
+            .annotate(
+                entries=Count('id'),
+                negative=Count('id', filter=Q(found=False)),
+                expired=Count('id', filter=Q(expires_at__lte=timezone.now())),
+                hits=Sum('hits'),
+            )
+            .order_by('kind')
+        )
+        for row in rows:
+            served = row['hits'] or 0
+            lookups = served + row['entries']
+            self.stdout.write(
+                f"{row['kind']}: {row['entries']} entries ({row['negative']} negative, {row['expired']} expired), "
+                f"{served} hits, hit rate {served / lookups:.1%}"
+            )
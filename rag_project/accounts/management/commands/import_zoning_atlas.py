@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import ZoningDistrict
+from accounts.zoning_atlas import as_multipolygon, bounds
+
+
+class Command(BaseCommand):
+    help = ('Imports a zoning atlas GeoJSON FeatureCollection (e.g. an export of RIZoningAtlas1016_WFL1) '
+            'for local zoning lookups, replacing any previous import.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], encoding='utf-8') as f:
+                collection = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['path']}: {e}")
+        if collection.get('type') != 'FeatureCollection':
+            raise CommandError('Expected a GeoJSON FeatureCollection')
+
+        batch_size = options['batch_size']
+        imported = skipped = 0
+        with transaction.atomic():
+            ZoningDistrict.objects.all().delete()
+            batch = []
+            for feature in collection.get('features', []):
+                polygons = as_multipolygon(feature.get('geometry'))
+                if not polygons:
+                    skipped += 1
+                    continue
+                min_lon, min_lat, max_lon, max_lat = bounds(polygons)
+                batch.append(ZoningDistrict(
+                    properties=feature.get('properties') or {},
+                    polygons=polygons,
+                    min_lon=min_lon,
+                    min_lat=min_lat,
+                    max_lon=max_lon,
+                    max_lat=max_lat,
+                ))
+                if len(batch) >= batch_size:
+                    ZoningDistrict.objects.bulk_create(batch)
+                    imported += len(batch)
+                    batch = []
+            if batch:
+                ZoningDistrict.objects.bulk_create(batch)
+                imported += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} zoning districts ({skipped} features without polygon geometry skipped). '
+            'Restart running servers to load the new atlas.'
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_userprofile_address_entered_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeoLookup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('geocode', 'Geocode'), ('zoning', 'Zoning')], max_length=10)),
+                ('key', models.CharField(max_length=255)),
+                ('found', models.BooleanField(default=True)),
+                ('value', models.JSONField(blank=True, null=True)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_geolookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZoningDistrict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('properties', models.JSONField(default=dict)),
+                ('polygons', models.JSONField()),
+                ('min_lon', models.FloatField()),
+                ('min_lat', models.FloatField()),
+                ('max_lon', models.FloatField()),
+                ('max_lat', models.FloatField()),
+            ],
+        ),
+    ]
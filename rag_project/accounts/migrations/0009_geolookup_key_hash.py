@@ -0,0 +1,46 @@
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_keys(apps, schema_editor):
+    GeoLookup = apps.get_model('accounts', 'GeoLookup')
+    batch = []
+    for entry in GeoLookup.objects.iterator(chunk_size=500):
+        entry.key_hash = hashlib.sha256(entry.key.encode('utf-8')).hexdigest()
+        batch.append(entry)
+        if len(batch) >= 500:
+            GeoLookup.objects.bulk_update(batch, ['key_hash'])
+            batch = []
+    if batch:
+        GeoLookup.objects.bulk_update(batch, ['key_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_zoningenrichmentjob'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='geolookup',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='geolookup',
+            name='key',
+            field=models.TextField(),
+        ),
+        migrations.AddField(
+            model_name='geolookup',
+            name='key_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_keys, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='geolookup',
+            unique_together={('kind', 'key_hash')},
+        ),
+    ]
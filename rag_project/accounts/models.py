@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
 from django.utils import timezone
+import hashlib
 import random
 import string
 
@@ -66,6 +67,79 @@ class UserProfile(models.Model):
         return f"Profile for {self.user.username}"
     
 
+class ZoningEnrichmentJob(models.Model):
+    """Background geocoding + zoning lookup for a verified user (see accounts.enrichment)."""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='zoning_jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Zoning enrichment {self.pk} for {self.user.username} ({self.status})"
+
+
+class GeoLookup(models.Model):
+    """Cached result of a remote geocoding or zoning lookup (see accounts.geo_cache)."""
+
+    GEOCODE = 'geocode'
+    ZONING = 'zoning'
+    KIND_CHOICES = [
+        (GEOCODE, 'Geocode'),
+        (ZONING, 'Zoning'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Addresses have no length limit, so uniqueness is enforced on a digest of the key.
+    key = models.TextField()
+    key_hash = models.CharField(max_length=64)
+    found = models.BooleanField(default=True)
+    value = models.JSONField(null=True, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('kind', 'key_hash')]
+
+    def __str__(self):
+        return f"{self.kind}: {self.key}"
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class ZoningDistrict(models.Model):
+    """One feature of the imported zoning atlas (manage.py import_zoning_atlas)."""
+
+    properties = models.JSONField(default=dict)
+    # GeoJSON coordinates normalised to a MultiPolygon: [[[[lon, lat], ...] (outer ring), holes...], ...]
+    polygons = models.JSONField()
+    min_lon = models.FloatField()
+    min_lat = models.FloatField()
+    max_lon = models.FloatField()
+    max_lat = models.FloatField()
+
+    def __str__(self):
+        return self.properties.get('name') or f"Zoning district {self.pk}"
+
+
 class OTP(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     code = models.CharField(max_length=6, blank=True)
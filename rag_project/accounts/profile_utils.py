@@ -1,6 +1,6 @@
 # accounts/utils.py
 from .models import UserProfile
-from .geo_utils import geocode_address, get_zoning_info
+from .geo_cache import get_geo_cache
 
 def safe_int(val):
     try:
@@ -14,7 +14,14 @@ def safe_float(val):
     except (TypeError, ValueError):
         return None
 
-def update_user_zoning_info(user_profile, zoning_data):
+ZONING_FIELDS = [
+    'zoning_abbr', 'zoning_name', 'jurisdiction', 'front_setback_ft', 'rear_setback_ft', 'side_setback_ft',
+    'max_height_ft', 'min_parking_spaces', 'min_lot_acres', 'address_entered', 'address_geocoded',
+    'latitude', 'longitude', 'context',
+]
+
+def apply_zoning_info(user_profile, zoning_data):
+    """Sets ZONING_FIELDS on the profile without saving it."""
     user_profile.zoning_abbr = zoning_data.get('abbrvname')
     user_profile.zoning_name = zoning_data.get('name')
     user_profile.jurisdiction = zoning_data.get('Jurisdiction')
@@ -35,10 +42,13 @@ def update_user_zoning_info(user_profile, zoning_data):
         user_profile.longitude = coords['lon']
 
     user_profile.context = zoning_data
+
+def update_user_zoning_info(user_profile, zoning_data):
+    apply_zoning_info(user_profile, zoning_data)
     user_profile.save()
 
-def store_zoning_context(user):
-    full_address = ", ".join(filter(None, [
+def full_address_of(user):
+    return ", ".join(filter(None, [
         user.address_line1,
         user.address_line2,
         user.city,
@@ -46,15 +56,25 @@ def store_zoning_context(user):
         user.zip_code
     ]))
 
+def fetch_zoning_context(user):
+    """Geocodes the user's address and looks up its zoning; network only, no database writes."""
+    full_address = full_address_of(user)
+
     try:
-        lat, lon, geocoded = geocode_address(full_address)
-        zoning_data = get_zoning_info(lat, lon, geocoded, full_address)
-        if zoning_data:
-            profile, _ = UserProfile.objects.get_or_create(user=user)
-            update_user_zoning_info(profile, zoning_data)
-            return zoning_data
-        else:
+        geo_cache = get_geo_cache()
+        lat, lon, geocoded = geo_cache.geocode(full_address)
+        zoning_data = geo_cache.zoning(lat, lon, geocoded, full_address)
+        if not zoning_data:
             raise ValueError("No zoning data found.")
+        return zoning_data
     except Exception as e:
         print(f"❌ Error storing zoning context: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def save_zoning_context(user, zoning_data):
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    update_user_zoning_info(profile, zoning_data)
+    return zoning_data
+
+def store_zoning_context(user):
+    return save_zoning_context(user, fetch_zoning_context(user))
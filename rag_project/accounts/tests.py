@@ -1,3 +1,277 @@
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+
+from rag_project.metrics import metrics
+
+from .enrichment import DEFAULT_ZONING_ENRICHMENT, zoning_jobs
+from .geo_cache import DatabaseBackend, DjangoCacheBackend, GeoCache, normalize_address
+from .models import CustomUser, GeoLookup, UserProfile, ZoningDistrict, ZoningEnrichmentJob
+from .zoning_atlas import ZoningAtlas
+
+ZONING = {'abbrvname': 'R-1', 'name': 'Single Family', 'Jurisdiction': 'Springfield',
+          'family1_maxheightft': '35'}
+
+
+class ZoningEnrichmentJobTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='owner', password='secret')
+        self.job = ZoningEnrichmentJob.objects.create(user=self.user)
+        patcher = mock.patch.object(zoning_jobs, 'enqueue')
+        self.enqueue = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_job(self, **fetch):
+        with mock.patch('accounts.enrichment.fetch_zoning_context', **fetch):
+            zoning_jobs.run(self.job.pk)
+        self.job.refresh_from_db()
+
+    def test_successful_job_stores_zoning_and_finishes(self):
+        self.run_job(return_value=ZONING)
+        self.assertEqual((self.job.status, self.job.attempts), (ZoningEnrichmentJob.DONE, 1))
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.zoning_abbr, profile.max_height_ft), ('R-1', 35))
+
+    def test_network_errors_are_rescheduled(self):
+        self.run_job(side_effect=requests.exceptions.ConnectTimeout('slow'))
+        self.assertEqual((self.job.status, self.job.attempts), (ZoningEnrichmentJob.PENDING, 1))
+        self.assertGreater(self.job.run_after, timezone.now())
+        self.enqueue.assert_called_once()
+
+    def test_unknown_addresses_fail_without_retry(self):
+        self.run_job(side_effect=ValueError('Address not found.'))
+        self.assertEqual(self.job.status, ZoningEnrichmentJob.FAILED)
+        self.assertEqual(self.job.last_error, 'Address not found.')
+        self.enqueue.assert_not_called()
+
+    def test_worker_that_lost_its_claim_writes_nothing(self):
+        def reclaimed(user):
+            # Another worker re-claims the job while this one is still looking up the address.
+            ZoningEnrichmentJob.objects.filter(pk=self.job.pk).update(attempts=F('attempts') + 1)
+            return ZONING
+
+        self.run_job(side_effect=reclaimed)
+        self.assertEqual((self.job.status, self.job.attempts), (ZoningEnrichmentJob.RUNNING, 2))
+        self.assertFalse(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_backoff_is_jittered_exponential_and_capped(self):
+        config = DEFAULT_ZONING_ENRICHMENT
+        self.job.attempts = 3
+        for _ in range(20):
+            self.assertTrue(20 <= zoning_jobs.retry_delay(self.job, config) <= 40)
+        self.job.attempts = 20
+        self.assertLessEqual(zoning_jobs.retry_delay(self.job, config), config['max_backoff'])
+
+
+class GeoCacheTests(TestCase):
+    def setUp(self):
+        self.cache = GeoCache(DatabaseBackend(), ttl=3600, negative_ttl=60, precision=5)
+        self.geocode = self.patch('accounts.geo_cache.geocode_address', return_value=(41.8, -71.4, 'Providence'))
+        self.fetch_zoning = self.patch('accounts.geo_cache.fetch_zoning_properties', return_value={'name': 'R-1'})
+        self.patch('accounts.geo_cache.local_zoning_available', return_value=False)
+
+    def patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_addresses_are_normalized(self):
+        self.assertEqual(normalize_address(' 12 Main St., Providence,RI '),
+                         normalize_address('12 main st providence ri'))
+
+    def test_repeat_lookups_are_served_from_the_table(self):
+        hits = metrics.counter('geo_cache_hits_total', kind=GeoLookup.GEOCODE).value
+        misses = metrics.counter('geo_cache_misses_total', kind=GeoLookup.GEOCODE).value
+
+        self.assertEqual(self.cache.geocode('12 Main St., Providence'), (41.8, -71.4, 'Providence'))
+        self.assertEqual(self.cache.geocode('12 main st providence'), (41.8, -71.4, 'Providence'))
+
+        self.geocode.assert_called_once()
+        self.assertEqual(GeoLookup.objects.get().hits, 1)
+        self.assertEqual(metrics.counter('geo_cache_hits_total', kind=GeoLookup.GEOCODE).value, hits + 1)
+        self.assertEqual(metrics.counter('geo_cache_misses_total', kind=GeoLookup.GEOCODE).value, misses + 1)
+
+    def test_long_addresses_are_keyed_by_digest(self):
+        address = 'Unit 4 ' * 500
+        self.cache.geocode(address)
+        self.cache.geocode(address)
+
+        entry = GeoLookup.objects.get()
+        self.assertEqual((len(entry.key_hash), entry.key), (64, normalize_address(address)))
+        self.geocode.assert_called_once()
+
+    def test_unknown_addresses_are_cached_briefly(self):
+        self.geocode.side_effect = ValueError('Address not found.')
+        for _ in range(2):
+            with self.assertRaises(ValueError):
+                self.cache.geocode('nowhere')
+
+        self.geocode.assert_called_once()
+        entry = GeoLookup.objects.get()
+        self.assertFalse(entry.found)
+        self.assertLessEqual(entry.expires_at, timezone.now() + timedelta(seconds=60))
+
+    def test_transport_errors_are_not_cached(self):
+        self.geocode.side_effect = requests.exceptions.ConnectTimeout('slow')
+        with self.assertRaises(requests.exceptions.ConnectTimeout):
+            self.cache.geocode('12 Main St')
+
+        self.assertFalse(GeoLookup.objects.exists())
+
+    def test_expired_entries_are_refetched_and_pruned(self):
+        self.cache.geocode('12 Main St')
+        GeoLookup.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(self.cache.prune(), 1)
+        self.cache.geocode('12 Main St')
+        self.assertEqual(self.geocode.call_count, 2)
+
+    def test_zoning_is_keyed_by_rounded_coordinates(self):
+        first = self.cache.zoning(41.800001, -71.4, 'Providence', '12 Main St')
+        second = self.cache.zoning(41.800002, -71.4, 'Providence', '14 Main St')
+
+        self.fetch_zoning.assert_called_once()
+        self.assertEqual((first['name'], second['entered_address']), ('R-1', '14 Main St'))
+
+    def test_django_cache_backend(self):
+        caches['default'].clear()
+        cache = GeoCache(DjangoCacheBackend('default'), ttl=3600, negative_ttl=60, precision=5)
+        cache.geocode('12 Main St')
+        cache.geocode('12 MAIN ST')
+
+        self.geocode.assert_called_once()
+        self.assertFalse(GeoLookup.objects.exists())
+
+
+def square(min_lon, min_lat, max_lon, max_lat):
+    return [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+
+
+def feature(name, geometry_type, coordinates):
+    return {'type': 'Feature', 'properties': {'name': name},
+            'geometry': {'type': geometry_type, 'coordinates': coordinates}}
+
+
+ATLAS = {'type': 'FeatureCollection', 'features': [
+    # A district with a hole, and a smaller district inside that hole.
+    feature('Residential', 'Polygon', [square(-71.5, 41.8, -71.4, 41.9), square(-71.48, 41.82, -71.42, 41.88)]),
+    feature('Park', 'Polygon', [square(-71.46, 41.84, -71.44, 41.86)]),
+    feature('Harbor', 'MultiPolygon', [[square(-71.3, 41.7, -71.29, 41.71)], [square(-71.2, 41.7, -71.19, 41.71)]]),
+    feature('Overlapping', 'Polygon', [square(-71.5, 41.8, -71.49, 41.81)]),
+    feature('Survey marker', 'Point', [-71.0, 41.0]),
+]}
+
+
+class ZoningAtlasTests(TestCase):
+    def import_atlas(self, collection):
+        fd, path = tempfile.mkstemp(suffix='.geojson')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(collection, f)
+        call_command('import_zoning_atlas', path, batch_size=2, stdout=open(os.devnull, 'w'))
+
+    def lookup(self, lat, lon):
+        result = ZoningAtlas(0.01).lookup(lat, lon)
+        return result and result['name']
+
+    def test_import_skips_features_without_polygons(self):
+        self.import_atlas(ATLAS)
+        self.assertEqual(ZoningDistrict.objects.count(), 4)
+        harbor = ZoningDistrict.objects.get(properties__name='Harbor')
+        self.assertEqual((harbor.min_lon, harbor.max_lon), (-71.3, -71.19))
+
+    def test_reimport_replaces_the_atlas(self):
+        self.import_atlas(ATLAS)
+        self.import_atlas({'type': 'FeatureCollection', 'features': ATLAS['features'][1:2]})
+        self.assertEqual(list(ZoningDistrict.objects.values_list('properties__name', flat=True)), ['Park'])
+
+    def test_import_rejects_other_geojson(self):
+        with self.assertRaises(CommandError):
+            self.import_atlas(ATLAS['features'][0])
+
+    def test_holes_are_outside_their_district(self):
+        self.import_atlas(ATLAS)
+        self.assertEqual(self.lookup(41.81, -71.41), 'Residential')
+        self.assertEqual(self.lookup(41.85, -71.45), 'Park')
+        self.assertIsNone(self.lookup(41.83, -71.47))
+
+    def test_every_part_of_a_multipolygon_matches(self):
+        self.import_atlas(ATLAS)
+        self.assertEqual(self.lookup(41.705, -71.295), 'Harbor')
+        self.assertEqual(self.lookup(41.705, -71.195), 'Harbor')
+        self.assertIsNone(self.lookup(41.705, -71.25))
+
+    def test_first_imported_district_wins(self):
+        self.import_atlas(ATLAS)
+        self.assertEqual(self.lookup(41.805, -71.495), 'Residential')
+
+    def test_districts_are_indexed_in_every_cell_they_overlap(self):
+        self.import_atlas(ATLAS)
+        atlas = ZoningAtlas(0.01)
+        atlas.lookup(0, 0)
+
+        residential_cells = [cell for cell, districts in atlas._grid.items() if 0 in districts]
+        self.assertEqual(len(residential_cells), 11 * 11)
+        self.assertEqual(atlas._grid[atlas._cell(-71.295, 41.705)], [2])
+        self.assertNotIn(atlas._cell(-71.35, 41.705), atlas._grid)
+
+    def test_empty_atlas_is_unavailable(self):
+        self.assertFalse(ZoningAtlas(0.01).available)
+        self.assertIsNone(self.lookup(41.85, -71.45))
+
+
+class BackfillZoningTests(TestCase):
+    def setUp(self):
+        self.geo_cache = mock.Mock()
+        self.geo_cache.geocode.return_value = (41.8, -71.4, 'Providence')
+        self.geo_cache.zoning.side_effect = lambda lat, lon, geocoded, entered: dict(ZONING, geocoded_address=geocoded)
+        patcher = mock.patch('accounts.management.commands.backfill_zoning.get_geo_cache', return_value=self.geo_cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def user(self, username, address_line1, city='Providence'):
+        return CustomUser.objects.create_user(username=username, password='secret', address_line1=address_line1,
+                                              city=city)
+
+    def backfill(self, *args):
+        out = io.StringIO()
+        call_command('backfill_zoning', *args, '--workers', '2', '--chunk-size', '2', stdout=out)
+        return out.getvalue()
+
+    def test_users_are_enriched_with_one_lookup_per_address(self):
+        first = self.user('first', '12 Main St')
+        second = self.user('second', '12 MAIN ST.')
+        self.user('third', '9 Elm St')
+        CustomUser.objects.create_user(username='no-address', password='secret')
+
+        self.assertIn('3 enriched, 0 failed', self.backfill())
+        self.assertEqual(UserProfile.objects.count(), 3)
+        self.assertEqual(self.geo_cache.geocode.call_count, 2)
+        self.assertEqual(UserProfile.objects.get(user=first).address_entered, '12 Main St, Providence')
+        self.assertEqual(UserProfile.objects.get(user=second).max_height_ft, 35)
+
+    def test_rerun_skips_up_to_date_profiles(self):
+        self.user('first', '12 Main St')
+        self.backfill()
+        self.geo_cache.geocode.reset_mock()
+
+        self.assertIn('0 enriched, 0 failed, 1 already up to date', self.backfill())
+        self.geo_cache.geocode.assert_not_called()
+        self.assertIn('1 enriched', self.backfill('--force'))
+
+    def test_failed_lookups_are_counted_and_written_nowhere(self):
+        self.user('lost', 'Nowhere Rd')
+        self.geo_cache.geocode.side_effect = ValueError('Address not found.')
 
-# Create your tests here.
+        self.assertIn('0 enriched, 1 failed', self.backfill())
+        self.assertFalse(UserProfile.objects.exists())
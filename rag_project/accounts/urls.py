@@ -8,4 +8,5 @@ urlpatterns = [
     path('verify-otp/', VerifyOTPView.as_view(), name='verify-otp'),
     path('request-verification/', RequestVerificationView.as_view()),
     path('verified-info/', VerifiedInfoView.as_view(), name='verified-info'),
+    path('conversations/', conversation_history, name='conversation-history'),
 ]
@@ -5,14 +5,16 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
 from django.contrib.auth import authenticate
+from django.db import transaction
 from datetime import timedelta
 import logging
-from .profile_utils import store_zoning_context
+from .enrichment import zoning_jobs
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Min, Max
-from chatbot.models import Message
+from chatbot.pagination import ConversationCursorPagination
+from chatbot.queries import conversations_for
+from chatbot.serializers import ConversationSerializer
 
 
 from .models import CustomUser, OTP
@@ -111,17 +113,16 @@ class VerifyOTPView(APIView):
         if otp.expires_at < timezone.now():
             return Response({'error': 'OTP expired'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user.is_verified = True
-        user.save()
-        otp.is_used = True
-        otp.save()
-        
-        try:
-            store_zoning_context(user)
-        except Exception as e:
-            print(f"Zoning info failed: {e}")
+        with transaction.atomic():
+            user.is_verified = True
+            user.save()
+            otp.is_used = True
+            otp.save()
+            # Geocoding and zoning run in the background; clients poll verified-info for zoning_status.
+            job = zoning_jobs.submit(user)
 
-        return Response({'message': 'OTP verified successfully', 'person_id': user.id}, status=status.HTTP_200_OK)
+        return Response({'message': 'OTP verified successfully', 'person_id': user.id,
+                         'zoning_status': job.status}, status=status.HTTP_200_OK)
     
 class VerifiedInfoView(APIView):
     permission_classes = [IsAuthenticated]
@@ -129,6 +130,7 @@ class VerifiedInfoView(APIView):
     def get(self, request):
         user = request.user
         profile = getattr(user, 'userprofile', None)
+        zoning_job = user.zoning_jobs.order_by('-created_at', '-id').first()
 
         data = {
             "username": user.username,
@@ -141,8 +143,11 @@ class VerifiedInfoView(APIView):
             "city": user.city,
             "state": user.state,
             "zip_code": user.zip_code,
-            "zoning_context": profile.context if profile else None
+            "zoning_context": profile.context if profile else None,
+            "zoning_status": zoning_job.status if zoning_job else None,
         }
+        if zoning_job and zoning_job.status == zoning_job.FAILED:
+            data["zoning_error"] = zoning_job.last_error
 
         return Response(data, status=status.HTTP_200_OK)
     
@@ -150,28 +155,6 @@ class VerifiedInfoView(APIView):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def conversation_history(request):
-    user = request.user
-
-    conversations = (
-        Message.objects
-        .filter(user=user)
-        .values('session_id')
-        .annotate(
-            started_at=Min('id'),  # or use created_at if you add a timestamp
-            last_message_id=Max('id')
-        )
-        .order_by('-last_message_id')
-    )
-
-    # You can enhance this with better timestamps if available
-    response = [
-        {
-            'session_id': c['session_id'],
-            'started_at_id': c['started_at'],
-            'last_message_id': c['last_message_id'],
-            'title': f"Conversation {i + 1}"
-        }
-        for i, c in enumerate(conversations)
-    ]
-
-    return Response(response)
\ No newline at end of file
+    paginator = ConversationCursorPagination()
+    page = paginator.paginate_queryset(conversations_for(request.user), request)
+    return paginator.get_paginated_response(ConversationSerializer(page, many=True).data)
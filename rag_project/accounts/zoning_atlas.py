@@ -0,0 +1,143 @@
+import logging
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from rag_project.metrics import metrics
+from .models import ZoningDistrict
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ZONING_ATLAS = {
+    'enabled': True,
+    'cell_size': 0.01,
+}
+
+
+def zoning_atlas_config():
+    return {**DEFAULT_ZONING_ATLAS, **getattr(settings, 'ZONING_ATLAS', {})}
+
+
+def as_multipolygon(geometry):
+    """GeoJSON Polygon/MultiPolygon coordinates as a MultiPolygon list; None for other geometry types."""
+    if not geometry:
+        return None
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['coordinates']
+    return None
+
+
+def bounds(polygons):
+    points = [point for polygon in polygons for point in polygon[0]]
+    lons = [point[0] for point in points]
+    lats = [point[1] for point in points]
+    return min(lons), min(lats), max(lons), max(lats)
+
+
+def point_in_ring(x, y, ring):
+    """Even-odd ray casting against one closed ring given as an (n, 2) array."""
+    xs, ys = ring[:, 0], ring[:, 1]
+    xj, yj = np.roll(xs, 1), np.roll(ys, 1)
+    crosses = (ys > y) != (yj > y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_at = (xj - xs) * (y - ys) / (yj - ys) + xs
+    return bool(np.count_nonzero(crosses & (x < x_at)) % 2)
+
+
+def point_in_polygons(x, y, polygons):
+    for rings in polygons:
+        if point_in_ring(x, y, rings[0]) and not any(point_in_ring(x, y, hole) for hole in rings[1:]):
+            return True
+    return False
+
+
+class ZoningAtlas:
+    """In-memory copy of the imported zoning districts behind a uniform grid.
+
+    Each grid cell lists the districts whose bounding box overlaps it, so a
+    lookup tests only a handful of polygons. Districts are checked in import
+    order and the first match wins, like the first feature of the remote query.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self._districts = None
+        self._lock = threading.Lock()
+
+    def _cell(self, lon, lat):
+        return math.floor(lon / self.cell_size), math.floor(lat / self.cell_size)
+
+    def load(self):
+        started = time.monotonic()
+        districts = []
+        grid = {}
+        rows = ZoningDistrict.objects.order_by('id').values_list(
+            'properties', 'polygons', 'min_lon', 'min_lat', 'max_lon', 'max_lat'
+        )
+        for properties, polygons, min_lon, min_lat, max_lon, max_lat in rows.iterator(chunk_size=500):
+            index = len(districts)
+            districts.append((
+                properties,
+                [[np.asarray(ring, dtype=np.float64)[:, :2] for ring in polygon] for polygon in polygons],
+                (min_lon, min_lat, max_lon, max_lat),
+            ))
+            (x0, y0), (x1, y1) = self._cell(min_lon, min_lat), self._cell(max_lon, max_lat)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    grid.setdefault((x, y), []).append(index)
+        self._districts = districts
+        self._grid = grid
+        logger.info('Loaded %d zoning districts into %d grid cells in %.2fs',
+                    len(districts), len(grid), time.monotonic() - started)
+
+    def reload(self):
+        with self._lock:
+            self.load()
+
+    def _ensure_loaded(self):
+        if self._districts is None:
+            with self._lock:
+                if self._districts is None:
+                    self.load()
+
+    @property
+    def available(self):
+        self._ensure_loaded()
+        return bool(self._districts)
+
+    def lookup(self, lat, lon):
+        """The matching district's properties (a copy), or None when the point is outside the atlas."""
+        self._ensure_loaded()
+        started = time.monotonic()
+        result = None
+        for index in self._grid.get(self._cell(lon, lat), ()):
+            properties, polygons, (min_lon, min_lat, max_lon, max_lat) = self._districts[index]
+            if min_lon <= lon <= max_lon and min_lat <= lat <= max_lat and point_in_polygons(lon, lat, polygons):
+                result = dict(properties)
+                break
+        metrics.histogram('zoning_atlas_lookup_seconds', 'Local zoning atlas lookup latency').observe(
+            time.monotonic() - started
+        )
+        return result
+
+
+_atlas = None
+_atlas_lock = threading.Lock()
+
+
+def get_zoning_atlas():
+    global _atlas
+    if _atlas is None:
+        with _atlas_lock:
+            if _atlas is None:
+                _atlas = ZoningAtlas(zoning_atlas_config()['cell_size'])
+    return _atlas
+
+
+def local_zoning_available():
+    return zoning_atlas_config()['enabled'] and get_zoning_atlas().available
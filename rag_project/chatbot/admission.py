@@ -0,0 +1,231 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from rag_project.metrics import metrics
+
+DEFAULT_LLM_ADMISSION = {
+    'enabled': True,
+    'max_concurrency': 4,
+    'max_queue': 32,
+    'max_queue_per_client': 4,
+    'queue_timeout': 15,
+    'expected_seconds': 5,
+}
+
+
+def admission_config():
+    return {**DEFAULT_LLM_ADMISSION, **getattr(settings, 'LLM_ADMISSION', {})}
+
+
+def admission_client(user, session_id):
+    """The fairness key: one queue per user, or per session for anonymous chats."""
+    return f"user:{user.pk}" if user else f"session:{session_id}"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason, status_code, retry_after):
+        super().__init__(f"The chatbot is busy, please retry in {retry_after}s")
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {'Retry-After': str(self.retry_after)}
+
+
+class Waiter:
+    def __init__(self, client, loop=None):
+        self.client = client
+        self.loop = loop
+        self.granted = False
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def grant(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Permit:
+    """One admitted chat; releasing it hands the slot to the next waiter. Safe to release twice."""
+
+    def __init__(self, controller=None):
+        self.controller = controller
+        self.started = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released or self.controller is None:
+            return
+        self._released = True
+        self.controller.release(time.monotonic() - self.started)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmittedStream:
+    """Streaming response body that releases its permit when the response is closed, even if never iterated."""
+
+    def __init__(self, iterable, permit):
+        self.iterable = iterable
+        self.permit = permit
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        try:
+            if hasattr(self.iterable, 'close'):
+                self.iterable.close()
+        finally:
+            self.permit.release()
+
+
+class AdmissionController:
+    """Caps chats talking to the model server and queues the overflow fairly.
+
+    At most ``max_concurrency`` chats hold a slot. Others wait in a queue per
+    client (user or anonymous session), and freed slots go to the clients in
+    round-robin order, so a client with many queued chats gets one turn per
+    rotation like everyone else. A client with ``max_queue_per_client`` chats
+    waiting is rejected with 429, a full queue or a wait past
+    ``queue_timeout`` with 503; both carry a Retry-After estimated from the
+    queue length and recent slot hold times.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._hold_seconds = None
+
+    def acquire(self, client):
+        config = admission_config()
+        if not config['enabled']:
+            return Permit()
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._admit_or_enqueue(client, config)
+        if waiter is not None and not waiter.event.wait(config['queue_timeout']):
+            self._timed_out(waiter, config)
+        return self._admitted(started)
+
+    async def aacquire(self, client):
+        config = admission_config()
+        if not config['enabled']:
+            return Permit()
+        started = time.monotonic()
+        with self._lock:
+            waiter = self._admit_or_enqueue(client, config, loop=asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter.future), config['queue_timeout'])
+            except asyncio.TimeoutError:
+                self._timed_out(waiter, config)
+            except asyncio.CancelledError:
+                # The client went away; give back a slot that was granted in the meantime.
+                with self._lock:
+                    if not waiter.granted:
+                        self._remove(waiter)
+                if waiter.granted:
+                    self.release(0)
+                raise
+        return self._admitted(started)
+
+    def release(self, hold_seconds):
+        with self._lock:
+            if hold_seconds:
+                self._hold_seconds = (hold_seconds if self._hold_seconds is None
+                                      else 0.8 * self._hold_seconds + 0.2 * hold_seconds)
+            if self._queues:
+                # The slot passes straight to the next client in rotation.
+                client, queue = next(iter(self._queues.items()))
+                waiter = queue.popleft()
+                self._queued -= 1
+                if queue:
+                    self._queues.move_to_end(client)
+                else:
+                    del self._queues[client]
+                waiter.grant()
+            else:
+                self._in_flight -= 1
+            self._record()
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': self._in_flight, 'queued': self._queued, 'queued_clients': len(self._queues)}
+
+    def _admit_or_enqueue(self, client, config, loop=None):
+        if self._in_flight < config['max_concurrency'] and not self._queued:
+            self._in_flight += 1
+            self._record()
+            return None
+        queue = self._queues.get(client)
+        if queue is not None and len(queue) >= config['max_queue_per_client']:
+            self._reject('client_queue_full', 429, config)
+        if self._queued >= config['max_queue']:
+            self._reject('queue_full', 503, config)
+        waiter = Waiter(client, loop)
+        self._queues.setdefault(client, deque()).append(waiter)
+        self._queued += 1
+        self._record()
+        return waiter
+
+    def _timed_out(self, waiter, config):
+        with self._lock:
+            # Granted between the timeout and taking the lock: keep the slot.
+            if waiter.granted:
+                return
+            self._remove(waiter)
+            self._reject('queue_timeout', 503, config)
+
+    def _remove(self, waiter):
+        queue = self._queues[waiter.client]
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[waiter.client]
+        self._queued -= 1
+        self._record()
+
+    def _reject(self, reason, status_code, config):
+        hold_seconds = self._hold_seconds or config['expected_seconds']
+        retry_after = max(1, math.ceil((self._queued + 1) * hold_seconds / config['max_concurrency']))
+        metrics.counter('llm_admission_rejected_total', 'Chats turned away by admission control',
+                        reason=reason).inc()
+        raise AdmissionRejected(reason, status_code, retry_after)
+
+    def _admitted(self, started):
+        metrics.histogram('llm_admission_wait_seconds', 'Time chats waited for a model server slot').observe(
+            time.monotonic() - started
+        )
+        return Permit(self)
+
+    def _record(self):
+        metrics.gauge('llm_admission_in_flight', 'Chats holding a model server slot').set(self._in_flight)
+        metrics.gauge('llm_admission_queue_depth', 'Chats waiting for a model server slot').set(self._queued)
+        metrics.gauge('llm_admission_queued_clients', 'Users and sessions with chats waiting').set(
+            len(self._queues)
+        )
+
+
+admission = AdmissionController()
@@ -0,0 +1,424 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from rag_project.metrics import metrics
+from .client import get_async_client, get_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_BACKEND = {
+    'type': 'ollama',
+    'model': 'mistral',
+    'nodes': [{'url': 'http://localhost:11434'}],
+    'balancing': 'least_outstanding',
+    'max_concurrency': 8,
+    'acquire_timeout': 30,
+    'failover': 1,
+    'eject_after_failures': 3,
+    'eject_seconds': 30,
+    'health_check_interval': 10,
+    'api_key': None,
+    'stub_response': 'This is a stub response.',
+    'stub_latency': 0.0,
+}
+
+BACKEND_TYPES = {
+    'ollama': 'chatbot.backends.OllamaBackend',
+    'openai': 'chatbot.backends.OpenAICompatibleBackend',
+    'stub': 'chatbot.backends.StubBackend',
+}
+
+
+def backend_config():
+    return {**DEFAULT_LLM_BACKEND, **getattr(settings, 'LLM_BACKEND', {})}
+
+
+class BackendUnavailable(requests.exceptions.ConnectionError):
+    """No model server node is healthy with a free slot before ``acquire_timeout``."""
+
+
+class Node:
+    def __init__(self, url, weight=1, max_concurrency=8):
+        self.url = url.rstrip('/')
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.current_weight = 0
+
+    @property
+    def healthy(self):
+        return self.ejected_until <= time.monotonic()
+
+    @property
+    def available(self):
+        return self.healthy and self.outstanding < self.max_concurrency
+
+
+class NodePool:
+    """Picks a model server node per request and tracks its in-flight requests.
+
+    ``least_outstanding`` sends each request to the node with the fewest
+    in-flight requests relative to its weight; ``weighted_round_robin`` uses
+    smooth weighted round robin. Nodes at their ``max_concurrency`` or ejected
+    after consecutive failures are skipped; callers wait for a free slot up to
+    ``acquire_timeout``.
+    """
+
+    def __init__(self, nodes, balancing='least_outstanding', eject_after_failures=3, eject_seconds=30,
+                 acquire_timeout=30):
+        self.nodes = nodes
+        self.balancing = balancing
+        self.eject_after_failures = eject_after_failures
+        self.eject_seconds = eject_seconds
+        self.acquire_timeout = acquire_timeout
+        self._condition = threading.Condition()
+        self._async_waiters = deque()
+
+    def _pick(self, exclude):
+        candidates = [node for node in self.nodes if node.available and node not in exclude]
+        if not candidates:
+            return None
+        if self.balancing == 'weighted_round_robin':
+            total = sum(node.weight for node in candidates)
+            for node in candidates:
+                node.current_weight += node.weight
+            node = max(candidates, key=lambda node: node.current_weight)
+            node.current_weight -= total
+        else:
+            node = min(candidates, key=lambda node: node.outstanding / node.weight)
+        node.outstanding += 1
+        self._record(node)
+        return node
+
+    def try_acquire(self, exclude=()):
+        with self._condition:
+            return self._pick(exclude)
+
+    def acquire(self, exclude=()):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                node = self._pick(exclude)
+                if node is not None:
+                    return node
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BackendUnavailable('No model server available')
+                # Ejected nodes come back on their own, so wake up at least once a second to re-check.
+                self._condition.wait(min(remaining, 1.0))
+
+    async def aacquire(self, exclude=()):
+        deadline = time.monotonic() + self.acquire_timeout
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                node = self._pick(exclude)
+                if node is not None:
+                    return node
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise BackendUnavailable('No model server available')
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter[1], min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._condition:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def release(self, node, ok):
+        with self._condition:
+            node.outstanding -= 1
+            self._record(node)
+            if ok:
+                node.failures = 0
+            else:
+                self.mark_failed(node)
+            self._condition.notify()
+            self._wake_async()
+
+    def mark_failed(self, node):
+        node.failures += 1
+        if node.failures >= self.eject_after_failures and node.healthy:
+            node.ejected_until = time.monotonic() + self.eject_seconds
+            metrics.counter('llm_node_ejections_total', 'Model server nodes taken out of rotation',
+                            node=node.url).inc()
+            logger.warning('Ejecting model server %s for %ss after %d failures',
+                           node.url, self.eject_seconds, node.failures)
+
+    def mark_healthy(self, node):
+        with self._condition:
+            if not node.healthy:
+                logger.info('Model server %s is healthy again', node.url)
+            node.failures = 0
+            node.ejected_until = 0.0
+            self._condition.notify_all()
+            self._wake_async()
+
+    def _wake_async(self):
+        # Called with the condition held, possibly from another thread than the waiters' loops.
+        # Every waiter re-checks; those that lose the race wait again.
+        while self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._resolve, future)
+
+    @staticmethod
+    def _resolve(future):
+        if not future.done():
+            future.set_result(None)
+
+    def _record(self, node):
+        metrics.gauge('llm_node_outstanding', 'In-flight requests per model server node', node=node.url).set(
+            node.outstanding
+        )
+
+
+class HTTPBackend:
+    """Base for model servers reached over HTTP through the shared pooled clients."""
+
+    chat_path = None
+    health_path = None
+
+    def __init__(self, config):
+        self.config = config
+        self.model = config['model']
+        self.pool = NodePool(
+            [Node(node['url'], node.get('weight', 1), node.get('max_concurrency', config['max_concurrency']))
+             for node in config['nodes']],
+            balancing=config['balancing'],
+            eject_after_failures=config['eject_after_failures'],
+            eject_seconds=config['eject_seconds'],
+            acquire_timeout=config['acquire_timeout'],
+        )
+        self._health_thread = None
+
+    def payload(self, prompt, stream=False):
+        raise NotImplementedError
+
+    def parse(self, data):
+        raise NotImplementedError
+
+    def parse_stream_line(self, line):
+        """Returns (content, done) for one line of a streamed response."""
+        raise NotImplementedError
+
+    @property
+    def headers(self):
+        return None
+
+    def chat(self, prompt):
+        response = self._post(get_client(), self.payload(prompt))
+        response.raise_for_status()
+        return self.parse(response.json())
+
+    async def achat(self, prompt):
+        response = await self._apost(get_async_client(), self.payload(prompt))
+        response.raise_for_status()
+        return self.parse(response.json())
+
+    def stream(self, prompt):
+        node = self.pool.acquire()
+        ok = False
+        try:
+            with get_client().post(node.url + self.chat_path, json=self.payload(prompt, stream=True), stream=True,
+                                   headers=self.headers) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    content, done = self.parse_stream_line(line)
+                    if content:
+                        yield content
+                    if done:
+                        break
+            ok = True
+        finally:
+            self.pool.release(node, ok)
+
+    def _post(self, client, payload):
+        tried = []
+        while True:
+            node = self.pool.acquire(exclude=tried)
+            try:
+                response = client.post(node.url + self.chat_path, json=payload, headers=self.headers)
+            except requests.exceptions.ConnectionError:
+                # Never reached the node (ConnectTimeout included), so another node can take it.
+                self.pool.release(node, ok=False)
+                tried.append(node)
+                if len(tried) > self.config['failover']:
+                    raise
+                continue
+            except BaseException:
+                # A read timeout means the node has the request; failing over would generate twice.
+                self.pool.release(node, ok=False)
+                raise
+            self.pool.release(node, ok=response.status_code < 500)
+            return response
+
+    async def _apost(self, client, payload):
+        import httpx
+
+        tried = []
+        while True:
+            node = await self.pool.aacquire(exclude=tried)
+            try:
+                response = await client.post(node.url + self.chat_path, json=payload, headers=self.headers)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                self.pool.release(node, ok=False)
+                tried.append(node)
+                if len(tried) > self.config['failover']:
+                    raise
+                continue
+            except BaseException:
+                self.pool.release(node, ok=False)
+                raise
+            self.pool.release(node, ok=response.status_code < 500)
+            return response
+
+    def check_health(self):
+        for node in self.pool.nodes:
+            try:
+                response = requests.get(node.url + self.health_path, headers=self.headers, timeout=3)
+                healthy = response.ok
+            except requests.exceptions.RequestException:
+                healthy = False
+            if healthy:
+                self.pool.mark_healthy(node)
+            else:
+                with self.pool._condition:
+                    # A failed probe ejects the node right away.
+                    node.failures = max(node.failures + 1, self.pool.eject_after_failures)
+                    self.pool.mark_failed(node)
+
+    def start_health_checks(self):
+        interval = self.config['health_check_interval']
+        if not interval or self._health_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.check_health()
+                except Exception:
+                    logger.exception('Model server health check failed')
+
+        self._health_thread = threading.Thread(target=loop, name='llm-health-check', daemon=True)
+        self._health_thread.start()
+
+
+class OllamaBackend(HTTPBackend):
+    chat_path = '/api/chat'
+    health_path = '/'
+
+    def payload(self, prompt, stream=False):
+        return {
+            'model': self.model,
+            'stream': stream,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
+
+    def parse(self, data):
+        if isinstance(data, dict):
+            return data.get("message", {}).get("content", "")
+        return None
+
+    def parse_stream_line(self, line):
+        data = json.loads(line)
+        if data.get('error'):
+            raise RuntimeError(data['error'])
+        return data.get('message', {}).get('content', ''), data.get('done', False)
+
+
+class OpenAICompatibleBackend(HTTPBackend):
+    """Any server exposing /v1/chat/completions (vLLM, llama.cpp server, LM Studio, ...)."""
+
+    chat_path = '/v1/chat/completions'
+    health_path = '/v1/models'
+
+    @property
+    def headers(self):
+        if self.config['api_key']:
+            return {'Authorization': f"Bearer {self.config['api_key']}"}
+        return None
+
+    def payload(self, prompt, stream=False):
+        return {
+            'model': self.model,
+            'stream': stream,
+            'messages': [{'role': 'user', 'content': prompt}]
+        }
+
+    def parse(self, data):
+        try:
+            return data['choices'][0]['message']['content'] or ''
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    def parse_stream_line(self, line):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.startswith('data:'):
+            return '', False
+        data = line[len('data:'):].strip()
+        if data == '[DONE]':
+            return '', True
+        data = json.loads(data)
+        if data.get('error'):
+            raise RuntimeError(data['error'])
+        choice = (data.get('choices') or [{}])[0]
+        return choice.get('delta', {}).get('content') or '', choice.get('finish_reason') is not None
+
+
+class StubBackend:
+    """In-process canned responses for tests and load tests without a model server."""
+
+    def __init__(self, config):
+        self.config = config
+        self.model = config['model']
+
+    def chat(self, prompt):
+        time.sleep(self.config['stub_latency'])
+        return self.config['stub_response']
+
+    async def achat(self, prompt):
+        await asyncio.sleep(self.config['stub_latency'])
+        return self.config['stub_response']
+
+    def stream(self, prompt):
+        time.sleep(self.config['stub_latency'])
+        for word in self.config['stub_response'].split(' '):
+            yield word + ' '
+
+    def start_health_checks(self):
+        pass
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = backend_config()
+                backend_class = import_string(BACKEND_TYPES.get(config['type'], config['type']))
+                _backend = backend_class(config)
+                _backend.start_health_checks()
+    return _backend
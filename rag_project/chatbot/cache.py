@@ -0,0 +1,167 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rag_project.metrics import metrics
+
+DEFAULT_LLM_RESPONSE_CACHE = {
+    'enabled': True,
+    'backend': 'lru',
+    'alias': 'default',
+    'ttl': 3600,
+    'max_entries': 1000,
+    'max_bytes': 16 * 1024 * 1024,
+}
+
+_whitespace = re.compile(r'\s+')
+
+
+def normalize_prompt(prompt):
+    # Case is kept: 'US' and 'us', or code and identifiers, can need different answers.
+    return _whitespace.sub(' ', unicodedata.normalize('NFC', prompt)).strip()
+
+
+def cache_key(model, prompt):
+    digest = hashlib.sha256(f"{model}\0{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+    return f"llm:{digest}"
+
+
+class LRUBackend:
+    """In-process LRU bounded by entry count and total response size."""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value, ttl):
+        self.set(key, value, ttl)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class DjangoCacheBackend:
+    """Shares responses across workers through a configured Django cache alias."""
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, value, timeout=ttl)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    async def aset(self, key, value, ttl):
+        await self.cache.aset(key, value, timeout=ttl)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+
+    @classmethod
+    def from_settings(cls):
+        config = {**DEFAULT_LLM_RESPONSE_CACHE, **getattr(settings, 'LLM_RESPONSE_CACHE', {})}
+        if config['backend'] == 'django':
+            backend = DjangoCacheBackend(config['alias'])
+        else:
+            backend = LRUBackend(config['max_entries'], config['max_bytes'])
+        return cls(backend, config['ttl'], enabled=config['enabled'])
+
+    def get(self, model, prompt):
+        if not self.enabled:
+            return None
+        return self._count(self.backend.get(cache_key(model, prompt)))
+
+    def set(self, model, prompt, response):
+        if self.enabled:
+            self.backend.set(cache_key(model, prompt), response, self.ttl)
+
+    async def aget(self, model, prompt):
+        if not self.enabled:
+            return None
+        return self._count(await self.backend.aget(cache_key(model, prompt)))
+
+    async def aset(self, model, prompt, response):
+        if self.enabled:
+            await self.backend.aset(cache_key(model, prompt), response, self.ttl)
+
+    def _count(self, value):
+        if value is None:
+            metrics.counter('llm_cache_misses_total', 'LLM response cache misses').inc()
+        else:
+            metrics.counter('llm_cache_hits_total', 'LLM response cache hits').inc()
+        return value
+
+    def stats(self):
+        hits = metrics.counter('llm_cache_hits_total').value
+        misses = metrics.counter('llm_cache_misses_total').value
+        return {'hits': hits, 'misses': misses}
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache.from_settings()
+    return _response_cache
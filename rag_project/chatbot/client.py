@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from rag_project.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LLM_CLIENT = {
+    'connect_timeout': 3.05,
+    'read_timeout': 120,
+    'max_retries': 2,
+    'backoff_base': 0.5,
+    'backoff_max': 5.0,
+    'pool_size': 20,
+}
+
+# Only statuses that say the request was not processed; a 502/504 may come after generation started.
+RETRY_STATUSES = {429, 503}
+
+
+def client_config():
+    return {**DEFAULT_LLM_CLIENT, **getattr(settings, 'LLM_CLIENT', {})}
+
+
+def backoff_delay(attempt, config):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(config['backoff_max'], config['backoff_base'] * 2 ** attempt))
+
+
+def record_call(url, started, outcome):
+    elapsed = time.monotonic() - started
+    metrics.histogram('llm_request_seconds', 'Model server call latency', outcome=outcome).observe(elapsed)
+    logger.debug('LLM call %s %s in %.3fs', url, outcome, elapsed)
+
+
+class LLMClient:
+    """Keep-alive connection pool for the model server with timeouts and bounded retries.
+
+    Only calls that never reached the server are retried: connection errors,
+    connect timeouts and 429/503 answers. A read timeout is raised at once,
+    because generation is not idempotent and a retry would run it again.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or client_config()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.config['pool_size'], pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def timeout(self):
+        return (self.config['connect_timeout'], self.config['read_timeout'])
+
+    def post(self, url, json=None, stream=False, headers=None):
+        max_retries = self.config['max_retries']
+        for attempt in range(max_retries + 1):
+            started = time.monotonic()
+            try:
+                response = self.session.post(url, json=json, stream=stream, headers=headers,
+                                             timeout=self.timeout)
+            except requests.exceptions.ReadTimeout:
+                # The server has the request and may still be generating; running it again doubles the work.
+                record_call(url, started, 'timeout')
+                raise
+            except requests.exceptions.ConnectionError:
+                # Includes ConnectTimeout: nothing reached the server, so it is safe to retry.
+                record_call(url, started, 'error')
+                if attempt == max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    record_call(url, started, 'ok' if response.ok else 'http_error')
+                    return response
+                record_call(url, started, 'http_error')
+                response.close()
+            metrics.counter('llm_request_retries_total', 'Retried model server calls').inc()
+            time.sleep(backoff_delay(attempt, self.config))
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient:
+    """httpx counterpart of LLMClient for the ASGI views."""
+
+    def __init__(self, config=None):
+        self.config = config or client_config()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.config['read_timeout'], connect=self.config['connect_timeout']),
+            limits=httpx.Limits(max_connections=self.config['pool_size'],
+                                max_keepalive_connections=self.config['pool_size']),
+        )
+
+    async def post(self, url, json=None, headers=None):
+        max_retries = self.config['max_retries']
+        for attempt in range(max_retries + 1):
+            started = time.monotonic()
+            try:
+                response = await self.client.post(url, json=json, headers=headers)
+            except (httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout):
+                record_call(url, started, 'timeout')
+                raise
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                record_call(url, started, 'error')
+                if attempt == max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                    record_call(url, started, 'ok' if response.is_success else 'http_error')
+                    return response
+                record_call(url, started, 'http_error')
+            metrics.counter('llm_request_retries_total', 'Retried model server calls').inc()
+            await asyncio.sleep(backoff_delay(attempt, self.config))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = LLMClient()
+    return _client
+
+
+def get_async_client():
+    # httpx connections belong to the event loop that opened them.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncLLMClient()
+    return client
@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Conversation, Message
+
+
+def shorten(text, length):
+    text = ' '.join(text.split())
+    return text if len(text) <= length else text[:length - 1].rstrip() + '…'
+
+
+def record_message(user, session_id, user_message):
+    """Returns the session's conversation after counting one more message in it.
+
+    Must run inside the transaction that saves the message so the counters
+    never drift from the message table.
+    """
+    now = timezone.now()
+    conversation, created = Conversation.objects.get_or_create(
+        user=user,
+        session_id=session_id,
+        defaults={'title': shorten(user_message, 100), 'started_at': now},
+    )
+    Conversation.objects.filter(pk=conversation.pk).update(
+        message_count=F('message_count') + 1,
+        last_activity=now,
+        snippet=shorten(user_message, 200),
+    )
+    return conversation
+
+
+def save_message(user, session_id, **fields):
+    """Creates a Message and updates its conversation atomically."""
+    with transaction.atomic():
+        conversation = record_message(user, session_id, fields['user_message'])
+        return Message.objects.create(
+            user=user,
+            session_id=session_id if not user else None,
+            conversation=conversation,
+            **fields
+        )
@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from rag_project.metrics import metrics
+from .embeddings import embed_texts, embeddings_config
+from .models import Document, DocumentChunk
+from .vector_index import IVFVectorIndex
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS = {
+    'enabled': True,
+    'dir': None,
+    'mode': 'ivf',
+    'nprobe': 8,
+    'top_k': 3,
+    'min_score': 0.3,
+    'chunk_size': 800,
+    'chunk_overlap': 100,
+}
+
+SUPPORTED_EXTENSIONS = {'.txt', '.md', '.pdf'}
+
+
+def corpus_config():
+    config = {**DEFAULT_CORPUS, **getattr(settings, 'CHATBOT_CORPUS', {})}
+    if config['dir'] is None:
+        config['dir'] = embeddings_config()['dir'] / 'corpus'
+    return config
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield os.path.join(root, name)
+        elif os.path.splitext(path)[1].lower() in SUPPORTED_EXTENSIONS:
+            yield path
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_blocks(path, block_size=1 << 16):
+    """Yields the document's text piece by piece (blocks for text files, pages for PDFs)."""
+    if path.lower().endswith('.pdf'):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise ImportError('PDF ingestion requires the pypdf package')
+        for page in PdfReader(path).pages:
+            yield (page.extract_text() or '') + '\n'
+        return
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for block in iter(lambda: f.read(block_size), ''):
+            yield block
+
+
+def chunk_stream(blocks, size, overlap):
+    """Splits streamed text into ~size character chunks on whitespace, each overlapping the previous one."""
+    if not 0 <= overlap < size // 2:
+        raise ValueError('overlap must be smaller than half the chunk size')
+    buffer = ''
+    for block in blocks:
+        buffer += block
+        while len(buffer) >= size:
+            cut = buffer.rfind(' ', size // 2, size)
+            if cut <= 0:
+                cut = size
+            chunk = buffer[:cut].strip()
+            if chunk:
+                yield chunk
+            start = cut - overlap
+            boundary = buffer.find(' ', start, cut)
+            buffer = buffer[boundary + 1 if boundary != -1 else start:]
+    if buffer.strip():
+        yield buffer.strip()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_corpus_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = IVFVectorIndex(corpus_config()['dir'], embeddings_config()['dim'])
+    return _index
+
+
+class CorpusIngestor:
+    def __init__(self, chunk_size=None, overlap=None, batch_size=64):
+        config = corpus_config()
+        self.chunk_size = chunk_size or config['chunk_size']
+        self.overlap = config['chunk_overlap'] if overlap is None else overlap
+        self.batch_size = batch_size
+        self.index = get_corpus_index()
+
+    def ingest(self, path):
+        """Returns the number of chunks written, or None when the file is unchanged."""
+        path = os.path.abspath(path)
+        sha256 = file_sha256(path)
+        document = Document.objects.filter(path=path).first()
+        if document and document.sha256 == sha256:
+            return None
+        with transaction.atomic():
+            if document:
+                # Searches skip the old vectors from now on; the next index build drops them.
+                self.index.delete(list(document.chunks.values_list('pk', flat=True)))
+                document.chunks.all().delete()
+            else:
+                document = Document(path=path)
+            document.title = os.path.basename(path)
+            document.sha256 = sha256
+            document.size = os.path.getsize(path)
+            document.chunk_count = 0
+            document.save()
+
+        pending = []
+        for ordinal, text in enumerate(chunk_stream(read_blocks(path), self.chunk_size, self.overlap)):
+            pending.append(DocumentChunk(document=document, ordinal=ordinal, text=text))
+            if len(pending) >= self.batch_size:
+                self._flush(pending)
+                document.chunk_count += len(pending)
+                pending = []
+        if pending:
+            self._flush(pending)
+            document.chunk_count += len(pending)
+        document.save(update_fields=['chunk_count', 'updated_at'])
+        return document.chunk_count
+
+    def reindex(self, chunks):
+        """Embeds already stored chunks (used when rebuilding the index from the database)."""
+        self.index.add([chunk.pk for chunk in chunks], embed_texts([chunk.text for chunk in chunks]))
+
+    def _flush(self, chunks):
+        DocumentChunk.objects.bulk_create(chunks)
+        self.reindex(chunks)
+
+
+def retrieve_passages(query, k=None):
+    """Top-k document chunks for ``query`` (a LazyEmbedding), best first."""
+    config = corpus_config()
+    if not config['enabled']:
+        return []
+    index = get_corpus_index()
+    if not len(index):
+        return []
+    k = k or config['top_k']
+    started = time.monotonic()
+    try:
+        # Over-fetch so chunks deleted while another process was ingesting do not leave the result short.
+        hits = index.search(query.vector, k * 2, nprobe=config['nprobe'], exact=config['mode'] != 'ivf')
+        hits = [(chunk_id, score) for chunk_id, score in hits if score >= config['min_score']]
+        chunks = DocumentChunk.objects.select_related('document').in_bulk([chunk_id for chunk_id, _ in hits])
+        passages = [
+            {'text': chunks[chunk_id].text, 'document': chunks[chunk_id].document.title, 'score': score}
+            for chunk_id, score in hits if chunk_id in chunks
+        ][:k]
+    except Exception:
+        logger.exception('Document retrieval failed')
+        passages = []
+    metrics.histogram('retrieval_seconds', 'Retrieval stage latency', stage='documents').observe(
+        time.monotonic() - started
+    )
+    return passages
@@ -0,0 +1,122 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from rag_project.metrics import metrics
+from .nlp import registry
+from .queries import insights_for
+from .vector_index import InsightIndexStore, normalize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDINGS = {
+    'dim': 384,
+    'top_k': 5,
+    'dir': None,
+}
+
+
+def embeddings_config():
+    config = {**DEFAULT_EMBEDDINGS, **getattr(settings, 'CHATBOT_EMBEDDINGS', {})}
+    if config['dir'] is None:
+        config['dir'] = settings.BASE_DIR / 'vector_store'
+    return config
+
+
+def embed_texts(texts):
+    """Mean-pooled, L2-normalised sentence vectors from the registry's 'embedding' pipeline."""
+    if not texts:
+        return np.empty((0, embeddings_config()['dim']), dtype=np.float32)
+    started = time.monotonic()
+    outputs = registry.get('embedding')(list(texts), truncation=True)
+    vectors = np.stack([np.asarray(output, dtype=np.float32).reshape(-1, np.shape(output)[-1]).mean(axis=0)
+                        for output in outputs])
+    metrics.histogram('embedding_seconds', 'Embedding time per batch').observe(time.monotonic() - started)
+    return normalize(vectors)
+
+
+class LazyEmbedding:
+    """Embeds a query on first use so several retrieval stages can share one vector."""
+
+    def __init__(self, text):
+        self.text = text
+        self._vector = None
+
+    @property
+    def vector(self):
+        if self._vector is None:
+            self._vector = embed_texts([self.text])[0]
+        return self._vector
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_insight_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = embeddings_config()
+                _store = InsightIndexStore(config['dir'], config['dim'])
+    return _store
+
+
+def index_insights(insights):
+    """Embeds insights once, at write time, into their owner's index; returns how many were added.
+
+    Insights already in their index are skipped. Failures are logged, not raised.
+    """
+    store = get_insight_store()
+    grouped = {}
+    for insight in insights:
+        if insight.insight:
+            grouped.setdefault(store.owner_key(insight.user_id, insight.session_id), []).append(insight)
+    for key, group in grouped.items():
+        indexed = store.index(key).ids()
+        grouped[key] = [insight for insight in group if insight.pk not in indexed]
+    insights = [insight for group in grouped.values() for insight in group]
+    if not insights:
+        return 0
+    try:
+        vectors = iter(embed_texts([insight.insight for insight in insights]))
+    except Exception:
+        logger.exception('Could not embed %d insights', len(insights))
+        return 0
+    added = 0
+    for key, group in grouped.items():
+        if group:
+            added += store.add(key, [insight.pk for insight in group], np.stack([next(vectors) for _ in group]))
+    return added
+
+
+def relevant_insights(user, session_id, query, k=None):
+    """Texts of the k insights most similar to ``query`` (a LazyEmbedding), best first.
+
+    Falls back to the k most recent, newest first.
+    """
+    k = k or embeddings_config()['top_k']
+    started = time.monotonic()
+    owner = insights_for(user, session_id)
+    hits = []
+    try:
+        store = get_insight_store()
+        key = store.owner_key(user.pk if user else None, session_id)
+        if len(store.index(key)):
+            hits = store.search(key, query.vector, k)
+    except Exception:
+        logger.exception('Insight retrieval failed; using recent insights')
+    if hits:
+        ids = list(dict.fromkeys(insight_id for insight_id, _ in hits))
+        texts = dict(owner.filter(pk__in=ids).values_list('pk', 'insight'))
+        result = [texts[insight_id] for insight_id in ids if insight_id in texts]
+    else:
+        result = list(owner.reverse().values_list('insight', flat=True)[:k])
+    metrics.histogram('retrieval_seconds', 'Retrieval stage latency', stage='insights').observe(
+        time.monotonic() - started
+    )
+    return result
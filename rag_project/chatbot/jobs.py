@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from rag_project.jobs import DatabaseJobRunner
+from .embeddings import index_insights
+from .llama import LLaMA
+from .models import Insight, InsightJob, Message
+
+DEFAULT_INSIGHT_JOBS = {
+    'deferred': True,
+    'workers': 2,
+    'max_attempts': 3,
+    'retry_backoff': 5,
+    'stale_after': 300,
+    'heartbeat': 60,
+}
+
+
+def jobs_config():
+    return {**DEFAULT_INSIGHT_JOBS, **getattr(settings, 'CHATBOT_INSIGHT_JOBS', {})}
+
+
+class InsightJobRunner(DatabaseJobRunner):
+    """Generates the insight for a chat whose answer was already returned (see rag_project.jobs)."""
+
+    model = InsightJob
+    name = 'insight-job'
+
+    def config(self):
+        return jobs_config()
+
+    def process(self, job):
+        result = LLaMA().generate_insight(job.question, job.previous_insights, use_cache=job.use_cache)
+        with transaction.atomic():
+            job.insight = Insight.objects.create(
+                user=job.user,
+                session_id=job.session_id,
+                question=job.question,
+                insight=result['insight'],
+                categories=result['categories'],
+                question_sentiment=job.question_sentiment,
+                question_emotion=job.question_emotion,
+                question_categories=job.question_categories
+            )
+            if job.message_id:
+                Message.objects.filter(pk=job.message_id).update(
+                    insight=result['insight'], updated_at=timezone.now()
+                )
+            # Raises LostClaim, rolling back the Insight, if another worker re-claimed the job meanwhile.
+            self.finish(job, InsightJob.DONE, fields=['insight'])
+        index_insights([job.insight])
+
+
+insight_jobs = InsightJobRunner()
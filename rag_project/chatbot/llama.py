@@ -1,58 +1,172 @@
+import asyncio
+import json
+import logging
+import httpx
 import requests
-import re
+from .backends import BackendUnavailable, get_backend
+from .cache import get_response_cache
+from .prompt import PromptBuilder
+from .singleflight import get_single_flight
+from rag_project.tracing import span
+from .taxonomy import categorize
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """The model server call failed or gave no usable answer; the text is never cached or saved as a reply."""
+
 
 class LLaMA:
-    def __init__(self):
-        self.url = 'http://localhost:11434/api/chat'
-        self.model = 'mistral'
+    def __init__(self, backend=None, cache=None):
+        self.backend = backend or get_backend()
+        self.model = self.backend.model
+        self.cache = cache or get_response_cache()
+        self.single_flight = get_single_flight()
+        self.prompt_builder = PromptBuilder()
 
-    def chat(self, message, user_insights, profile_data=None):
+    def build_prompt(self, message, profile_data=None, passages=None):
+        builder = self.prompt_builder
+        context = ""
+        passages = builder.section('retrieved', passages or [])
+        if passages:
+            context = "Use the following information if it is relevant:\n" + "\n".join(
+                f"- {passage}" for passage in passages
+            ) + "\n\n"
         profile_context = ""
         if profile_data:
             dominant_emotion = max(profile_data['personality_traits'], key=profile_data['personality_traits'].get, default='neutral')
             frequent_topic = max(profile_data['interaction_patterns'], key=profile_data['interaction_patterns'].get, default='general')
-            profile_context = f"The user often shows {dominant_emotion} emotions and frequently discusses {frequent_topic} topics. "
+            profile_context = builder.profile(
+                f"The user often shows {dominant_emotion} emotions and frequently discusses {frequent_topic} topics."
+            ) + " "
 
-        prompt = f"{profile_context}User message: {message}"
-        answer = self._get_response(prompt)
+        prompt = f"{context}{profile_context}User message: {builder.message(message)}"
+        builder.record('answer', prompt)
+        return prompt
 
-        insight_prompt = (
-            f"Generate an insightful statement about the user based on the question '{message}' "
-            f"and previous conversations: {', '.join(user_insights)}."
+    def build_insight_prompt(self, message, user_insights):
+        # user_insights arrive most relevant (or most recent) first, so the oldest are dropped first.
+        builder = self.prompt_builder
+        prompt = (
+            f"Generate an insightful statement about the user based on the question '{builder.message(message)}' "
+            f"and previous conversations: {', '.join(builder.section('history', user_insights))}."
+        )
+        builder.record('insight', prompt)
+        return prompt
+
+    def chat(self, message, user_insights, profile_data=None, use_cache=True, passages=None):
+        return {
+            'answer': self.answer(message, profile_data, use_cache, passages),
+            'insight': self.generate_insight(message, user_insights, use_cache)
+        }
+
+    def answer(self, message, profile_data=None, use_cache=True, passages=None):
+        prompt = self.build_prompt(message, profile_data, passages)
+        with span('llm_answer'):
+            return self._get_response(prompt, use_cache).strip()
+
+    def generate_insight(self, message, user_insights, use_cache=True):
+        prompt = self.build_insight_prompt(message, user_insights)
+        with span('llm_insight'):
+            insight = self._get_response(prompt, use_cache)
+        return {
+            'insight': insight.strip(),
+            'categories': self.categorize_insight(insight)
+        }
+
+    def stream(self, message, profile_data=None, use_cache=True, passages=None):
+        prompt = self.build_prompt(message, profile_data, passages)
+        with span('llm_answer'):
+            yield from self._stream_response(prompt, use_cache)
+
+    def _get_response(self, prompt, use_cache=True):
+        if use_cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                return cached
+        try:
+            content = self.single_flight.do(self.model, prompt, lambda: self._request(prompt))
+        except requests.exceptions.RequestException as e:
+            logger.warning('Model server request failed: %s', e)
+            raise LLMError(f"Model server request failed: {e}") from e
+        if content is None:
+            raise LLMError("Unexpected response format.")
+        if use_cache:
+            self.cache.set(self.model, prompt, content)
+        return content
+
+    def _request(self, prompt):
+        return self.backend.chat(prompt)
+
+    def _stream_response(self, prompt, use_cache=True):
+        """Yields content tokens from the backend's stream as they arrive."""
+        if use_cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                yield cached
+                return
+        tokens = []
+        for content in self.backend.stream(prompt):
+            tokens.append(content)
+            yield content
+        if use_cache:
+            self.cache.set(self.model, prompt, ''.join(tokens))
+
+    def categorize_insight(self, insight):
+        return categorize(insight)
+
+
+class AsyncLLaMA(LLaMA):
+    """Event-loop friendly LLaMA: the answer and insight requests run concurrently."""
+
+    async def chat(self, message, user_insights, profile_data=None, use_cache=True, passages=None):
+        answer, insight = await asyncio.gather(
+            self._traced('llm_answer', self._get_response(self.build_prompt(message, profile_data, passages), use_cache)),
+            self._traced('llm_insight', self._get_response(self.build_insight_prompt(message, user_insights), use_cache)),
         )
-        insight = self._get_response(insight_prompt)
-        categories = self.categorize_insight(insight)
         return {
             'answer': answer.strip(),
             'insight': {
                 'insight': insight.strip(),
-                'categories': categories
+                'categories': self.categorize_insight(insight)
             }
         }
 
-    def _get_response(self, prompt):
-        payload = {
-            'model': self.model,
-            'stream': False,
-            'messages': [{'role': 'user', 'content': prompt}]
+    async def answer(self, message, profile_data=None, use_cache=True, passages=None):
+        answer = await self._traced(
+            'llm_answer', self._get_response(self.build_prompt(message, profile_data, passages), use_cache)
+        )
+        return answer.strip()
+
+    async def generate_insight(self, message, user_insights, use_cache=True):
+        insight = await self._traced(
+            'llm_insight', self._get_response(self.build_insight_prompt(message, user_insights), use_cache)
+        )
+        return {
+            'insight': insight.strip(),
+            'categories': self.categorize_insight(insight)
         }
+
+    async def _traced(self, stage, awaitable):
+        with span(stage):
+            return await awaitable
+
+    async def _get_response(self, prompt, use_cache=True):
+        if use_cache:
+            cached = await self.cache.aget(self.model, prompt)
+            if cached is not None:
+                return cached
         try:
-            response = requests.post(self.url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, dict):
-                return data.get("message", {}).get("content", "")
-            return "Unexpected response format."
-        except requests.exceptions.RequestException as e:
-            print("Request failed:", e)
-            return str(e)
+            content = await self.single_flight.ado(self.model, prompt, lambda: self._request(prompt))
+        except (httpx.HTTPError, BackendUnavailable, json.JSONDecodeError) as e:
+            logger.warning('Model server request failed: %s', e)
+            raise LLMError(f"Model server request failed: {e}") from e
+        if content is None:
+            raise LLMError("Unexpected response format.")
+        if use_cache:
+            await self.cache.aset(self.model, prompt, content)
+        return content
 
-    def categorize_insight(self, insight):
-        categories = []
-        if re.search(r'\b(productivity|efficient|focus)\b', insight, re.IGNORECASE):
-            categories.append('Productivity')
-        if re.search(r'\b(health|wellness|fitness)\b', insight, re.IGNORECASE):
-            categories.append('Health')
-        if re.search(r'\b(relationship|social|communication)\b', insight, re.IGNORECASE):
-            categories.append('Relationships')
-        return categories
\ No newline at end of file
+    async def _request(self, prompt):
+        return await self.backend.achat(prompt)
@@ -0,0 +1,33 @@
+import shutil
+
+from django.core.management.base import BaseCommand
+
+from chatbot.embeddings import embeddings_config, index_insights
+from chatbot.models import Insight
+
+
+class Command(BaseCommand):
+    help = 'Embeds existing insights into the per-user/session vector indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=64)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Delete existing insight indexes first. Without it, indexed insights are skipped.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            shutil.rmtree(embeddings_config()['dir'] / 'insights', ignore_errors=True)
+        batch_size = options['batch_size']
+        batch = []
+        total = 0
+        added = 0
+        for insight in Insight.objects.only('id', 'user_id', 'session_id', 'insight').order_by('id').iterator(chunk_size=batch_size):
+            batch.append(insight)
+            if len(batch) >= batch_size:
+                added += index_insights(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            added += index_insights(batch)
+            total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {added} new insights out of {total}'))
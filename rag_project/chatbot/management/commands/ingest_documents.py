@@ -0,0 +1,60 @@
+import shutil
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.corpus import CorpusIngestor, corpus_config, get_corpus_index, iter_files
+from chatbot.models import DocumentChunk
+
+
+class Command(BaseCommand):
+    help = 'Ingests local .txt/.md/.pdf files into the retrieval corpus and (re)builds the vector index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='Files or directories to ingest.')
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--overlap', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=64, help='Chunks embedded per batch.')
+        parser.add_argument('--nlist', type=int, default=None, help='IVF lists (default: sqrt of chunk count).')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Drop the vector index and re-embed every stored chunk.')
+
+    def handle(self, *args, **options):
+        if not options['paths'] and not options['rebuild']:
+            raise CommandError('Give at least one path, or --rebuild.')
+        ingestor = CorpusIngestor(options['chunk_size'], options['overlap'], options['batch_size'])
+        started = time.monotonic()
+
+        if options['rebuild']:
+            shutil.rmtree(corpus_config()['dir'], ignore_errors=True)
+            batch = []
+            for chunk in DocumentChunk.objects.order_by('id').iterator(chunk_size=options['batch_size']):
+                batch.append(chunk)
+                if len(batch) >= options['batch_size']:
+                    ingestor.reindex(batch)
+                    batch = []
+            if batch:
+                ingestor.reindex(batch)
+
+        documents = chunks = skipped = 0
+        for path in iter_files(options['paths']):
+            try:
+                count = ingestor.ingest(path)
+            except Exception as e:
+                self.stderr.write(f'{path}: {e}')
+                continue
+            if count is None:
+                skipped += 1
+                continue
+            documents += 1
+            chunks += count
+            self.stdout.write(f'{path}: {count} chunks')
+
+        index = get_corpus_index()
+        if corpus_config()['mode'] == 'ivf' and len(index):
+            nlist = index.build(nlist=options['nlist'])
+            self.stdout.write(f'Built IVF index: {len(index)} vectors in {nlist} lists')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Ingested {documents} documents ({chunks} chunks, {skipped} unchanged) in {elapsed:.1f}s'
+        ))
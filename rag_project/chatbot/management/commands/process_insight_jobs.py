@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.jobs import insight_jobs
+from chatbot.models import InsightJob
+
+
+class Command(BaseCommand):
+    help = 'Runs due insight jobs in the foreground (e.g. from cron or after a restart).'
+
+    def handle(self, *args, **options):
+        done = failed = 0
+        for job_id, _ in insight_jobs.pending_jobs(due_only=True):
+            job = insight_jobs.run(job_id)
+            if job is None:
+                continue
+            if job.status == InsightJob.DONE:
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Insight jobs: {done} done, {failed} failed or rescheduled'))
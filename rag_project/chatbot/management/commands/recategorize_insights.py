@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.models import Insight
+from chatbot.taxonomy import get_category_engine
+
+
+class Command(BaseCommand):
+    help = 'Recomputes Insight categories with the current taxonomy.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        engine = get_category_engine()
+        batch_size = options['batch_size']
+        updated = 0
+        batch = []
+        for insight in Insight.objects.only('id', 'question', 'insight').iterator(chunk_size=batch_size):
+            batch.append(insight)
+            if len(batch) >= batch_size:
+                updated += self._update(engine, batch)
+                batch = []
+        if batch:
+            updated += self._update(engine, batch)
+        self.stdout.write(self.style.SUCCESS(f'Recategorized {updated} insights'))
+
+    def _update(self, engine, batch):
+        categories = engine.categorize_many([insight.insight for insight in batch])
+        question_categories = engine.categorize_many([insight.question for insight in batch])
+        for insight, cats, question_cats in zip(batch, categories, question_categories):
+            insight.categories = cats
+            insight.question_categories = question_cats
+        Insight.objects.bulk_update(batch, ['categories', 'question_categories'])
+        return len(batch)
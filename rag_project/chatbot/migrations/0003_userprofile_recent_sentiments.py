@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_insightjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='recent_sentiments',
+            field=models.JSONField(default=list),
+        ),
+    ]
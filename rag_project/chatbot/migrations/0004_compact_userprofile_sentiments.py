@@ -0,0 +1,45 @@
+from django.db import migrations
+
+RECENT_SIZE = 20
+
+
+def is_legacy(scores):
+    return bool(scores) and all(key.isdigit() and isinstance(value, dict) and 'label' in value
+                                for key, value in scores.items())
+
+
+def compact_profiles(apps, schema_editor):
+    UserProfile = apps.get_model('chatbot', 'UserProfile')
+    batch = []
+    for profile in UserProfile.objects.iterator(chunk_size=500):
+        if not is_legacy(profile.sentiment_scores):
+            continue
+        history = [profile.sentiment_scores[key] for key in sorted(profile.sentiment_scores, key=int)]
+        stats = {}
+        for item in history:
+            entry = stats.setdefault(item['label'], {'count': 0, 'mean': 0.0, 'm2': 0.0})
+            entry['count'] += 1
+            delta = item['score'] - entry['mean']
+            entry['mean'] += delta / entry['count']
+            entry['m2'] += delta * (item['score'] - entry['mean'])
+        profile.sentiment_scores = stats
+        profile.recent_sentiments = [
+            {'label': item['label'], 'score': item['score']} for item in history[-RECENT_SIZE:]
+        ]
+        batch.append(profile)
+        if len(batch) >= 500:
+            UserProfile.objects.bulk_update(batch, ['sentiment_scores', 'recent_sentiments'])
+            batch = []
+    if batch:
+        UserProfile.objects.bulk_update(batch, ['sentiment_scores', 'recent_sentiments'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_userprofile_recent_sentiments'),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_profiles, migrations.RunPython.noop),
+    ]
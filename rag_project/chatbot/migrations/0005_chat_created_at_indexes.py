@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    # Legacy rows have no timestamp; space them one microsecond apart in id
+    # order, all before the migration ran, so created_at ordering matches id ordering.
+    now = timezone.now()
+    for model_name in ('Message', 'Insight'):
+        model = apps.get_model('chatbot', model_name)
+        max_id = model.objects.aggregate(max_id=Max('id'))['max_id']
+        if max_id is None:
+            continue
+        batch = []
+        for row in model.objects.filter(created_at__isnull=True).only('id').iterator(chunk_size=1000):
+            row.created_at = now - timedelta(microseconds=max_id - row.id + 1)
+            batch.append(row)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['created_at'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['created_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_compact_userprofile_sentiments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='insight',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='insight',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='anonymousinteraction',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'created_at'], name='chatbot_msg_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['session_id', 'created_at'], name='chatbot_msg_sess_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='insight',
+            index=models.Index(fields=['user', 'created_at'], name='chatbot_ins_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='insight',
+            index=models.Index(fields=['session_id', 'created_at'], name='chatbot_ins_sess_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anonymousinteraction',
+            index=models.Index(fields=['session_id', 'created_at'], name='chatbot_anon_sess_created_idx'),
+        ),
+    ]
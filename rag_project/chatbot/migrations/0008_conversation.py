@@ -0,0 +1,95 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:23
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# Authenticated messages were stored without a session id; split them where the user went quiet this long.
+SESSION_GAP = timedelta(minutes=30)
+
+
+def shorten(text, length):
+    text = ' '.join(text.split())
+    return text if len(text) <= length else text[:length - 1].rstrip() + '…'
+
+
+def backfill_conversations(apps, schema_editor):
+    Conversation = apps.get_model('chatbot', 'Conversation')
+    Message = apps.get_model('chatbot', 'Message')
+
+    def flush(conversation, message_ids):
+        conversation.save()
+        Message.objects.filter(pk__in=message_ids).update(conversation=conversation)
+
+    conversation, message_ids, owner = None, [], None
+    messages = Message.objects.order_by('user_id', 'session_id', 'created_at', 'id').iterator(chunk_size=2000)
+    for message in messages:
+        if message.user_id is None and not message.session_id:
+            continue
+        message_owner = (message.user_id, message.user_id is None and message.session_id)
+        new_session = (
+            conversation is None
+            or message_owner != owner
+            or (message.user_id is not None and message.created_at - conversation.last_activity > SESSION_GAP)
+        )
+        if new_session:
+            if conversation is not None:
+                flush(conversation, message_ids)
+            owner, message_ids = message_owner, []
+            conversation = Conversation(
+                user_id=message.user_id,
+                session_id=message.session_id if message.user_id is None else f"legacy-{message.pk}",
+                title=shorten(message.user_message, 100),
+                started_at=message.created_at,
+            )
+        conversation.message_count += 1
+        conversation.last_activity = message.created_at
+        conversation.snippet = shorten(message.user_message, 200)
+        message_ids.append(message.pk)
+    if conversation is not None:
+        flush(conversation, message_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0007_document_corpus'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100)),
+                ('title', models.CharField(blank=True, max_length=100)),
+                ('snippet', models.CharField(blank=True, max_length=200)),
+                ('message_count', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_activity', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='messages', to='chatbot.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', 'last_activity'], name='chatbot_conv_user_activity_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('user', 'session_id'), name='chatbot_conv_user_session_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('session_id',), name='chatbot_conv_anon_session_uniq'),
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+SOURCES = ('model', 'lexicon')
+
+
+def is_flat(scores):
+    # Label statistics written before sentiment had a source all came from the transformer model.
+    return bool(scores) and not set(scores) <= set(SOURCES)
+
+
+def split_by_source(apps, schema_editor):
+    UserProfile = apps.get_model('chatbot', 'UserProfile')
+    batch = []
+    for profile in UserProfile.objects.iterator(chunk_size=500):
+        if not is_flat(profile.sentiment_scores):
+            continue
+        profile.sentiment_scores = {'model': profile.sentiment_scores}
+        batch.append(profile)
+        if len(batch) >= 500:
+            UserProfile.objects.bulk_update(batch, ['sentiment_scores'])
+            batch = []
+    if batch:
+        UserProfile.objects.bulk_update(batch, ['sentiment_scores'])
+
+
+def merge_sources(apps, schema_editor):
+    UserProfile = apps.get_model('chatbot', 'UserProfile')
+    batch = []
+    for profile in UserProfile.objects.iterator(chunk_size=500):
+        if not profile.sentiment_scores or is_flat(profile.sentiment_scores):
+            continue
+        # Lexicon statistics have no place in the old layout and are dropped.
+        profile.sentiment_scores = profile.sentiment_scores.get('model', {})
+        batch.append(profile)
+        if len(batch) >= 500:
+            UserProfile.objects.bulk_update(batch, ['sentiment_scores'])
+            batch = []
+    if batch:
+        UserProfile.objects.bulk_update(batch, ['sentiment_scores'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0008_conversation'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_by_source, merge_sources),
+    ]
@@ -1,13 +1,15 @@
 from django.db import models
+from django.utils import timezone
 from accounts.models import CustomUser
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
 class UserProfile(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='profile')
     sentiment_scores = models.JSONField(default=dict)
     personality_traits = models.JSONField(default=dict)
     interaction_patterns = models.JSONField(default=dict)
-def __str__(self):
+    recent_sentiments = models.JSONField(default=list)
+
+    def __str__(self):
         return f"Profile for {self.user.username}"
 
 class AnonymousInteraction(models.Model):
@@ -16,18 +18,14 @@ class AnonymousInteraction(models.Model):
     question_sentiment = models.JSONField(default=dict)
     question_emotion = models.JSONField(default=dict)
     question_categories = models.JSONField(default=list)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
-def analyze_sentiment(self, text):
-        analyzer = SentimentIntensityAnalyzer()
-        return analyzer.polarity_scores(text)
+    class Meta:
+        indexes = [
+            models.Index(fields=['session_id', 'created_at'], name='chatbot_anon_sess_created_idx'),
+        ]
 
-def save(self, *args, **kwargs):
-        if self.question:
-            self.question_sentiment = self.analyze_sentiment(self.question)
-        super().save(*args, **kwargs)
-
-def __str__(self):
+    def __str__(self):
         return f"Anonymous Interaction: {self.question[:50]}"
 
 class Insight(models.Model):
@@ -39,25 +37,115 @@ class Insight(models.Model):
     question_sentiment = models.JSONField(default=dict)
     question_emotion = models.JSONField(default=dict)
     question_categories = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
-def analyze_sentiment(self, text):
-        analyzer = SentimentIntensityAnalyzer()
-        return analyzer.polarity_scores(text)
-
-def save(self, *args, **kwargs):
-        if self.question:
-            self.question_sentiment = self.analyze_sentiment(self.question)
-        super().save(*args, **kwargs)
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='chatbot_ins_user_created_idx'),
+            models.Index(fields=['session_id', 'created_at'], name='chatbot_ins_sess_created_idx'),
+        ]
 
-def __str__(self):
+    def __str__(self):
         return self.insight
 
+class Conversation(models.Model):
+    """One chat session, with counters kept up to date as messages are saved (see chatbot.conversations)."""
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='conversations', null=True, blank=True)
+    session_id = models.CharField(max_length=100)
+    title = models.CharField(max_length=100, blank=True)
+    snippet = models.CharField(max_length=200, blank=True)
+    message_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    last_activity = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'session_id'], name='chatbot_conv_user_session_uniq'),
+            models.UniqueConstraint(fields=['session_id'], condition=models.Q(user__isnull=True),
+                                    name='chatbot_conv_anon_session_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_activity'], name='chatbot_conv_user_activity_idx'),
+        ]
+
+    def __str__(self):
+        return self.title or f"Conversation {self.session_id}"
+
 class Message(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='messages', null=True, blank=True)
     session_id = models.CharField(max_length=100, null=True, blank=True)  # For anonymous users
+    conversation = models.ForeignKey(Conversation, on_delete=models.SET_NULL, related_name='messages',
+                                     null=True, blank=True)
     user_message = models.CharField(max_length=200)
     chatbot_response = models.CharField(max_length=200)
     insight = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='chatbot_msg_user_created_idx'),
+            models.Index(fields=['session_id', 'created_at'], name='chatbot_msg_sess_created_idx'),
+        ]
 
-def __str__(self):
+    def __str__(self):
         return f"Message: {self.user_message[:50]}"
+
+
+class InsightJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='insight_jobs', null=True, blank=True)
+    session_id = models.CharField(max_length=100, null=True, blank=True)
+    message = models.ForeignKey(Message, on_delete=models.SET_NULL, related_name='insight_jobs', null=True, blank=True)
+    insight = models.ForeignKey(Insight, on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    question = models.TextField()
+    previous_insights = models.JSONField(default=list)
+    question_sentiment = models.JSONField(default=dict)
+    question_emotion = models.JSONField(default=dict)
+    question_categories = models.JSONField(default=list)
+    use_cache = models.BooleanField(default=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Insight job {self.pk} ({self.status})"
+
+
+class Document(models.Model):
+    path = models.CharField(max_length=500, unique=True)
+    title = models.CharField(max_length=255, blank=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField(default=0)
+    chunk_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.title or self.path
+
+
+class DocumentChunk(models.Model):
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
+    ordinal = models.PositiveIntegerField()
+    text = models.TextField()
+
+    class Meta:
+        unique_together = [('document', 'ordinal')]
+
+    def __str__(self):
+        return f"{self.document} #{self.ordinal}"
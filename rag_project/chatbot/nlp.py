@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+
+from rag_project.metrics import metrics
+from .prompt import get_token_counter
+from .sentiment import SentimentService, get_vader, uses_model
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NLP_MODELS = {
+    'sentiment': {'task': 'sentiment-analysis'},
+    'emotion': {'task': 'text-classification', 'model': 'bhadresh-savani/distilbert-base-uncased-emotion'},
+    'embedding': {'task': 'feature-extraction', 'model': 'sentence-transformers/all-MiniLM-L6-v2'},
+}
+
+DEFAULT_NLP_BATCHING = {
+    'enabled': True,
+    'window_ms': 10,
+    'max_batch_size': 32,
+    'timeout': 30,
+}
+
+
+class ModelRegistry:
+    """Loads each transformers pipeline once per process and shares it across requests."""
+
+    def __init__(self, specs=None):
+        self._specs = specs
+        self._models = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def specs(self):
+        if self._specs is not None:
+            return self._specs
+        return getattr(settings, 'CHATBOT_NLP_MODELS', DEFAULT_NLP_MODELS)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(name)
+                if model is None:
+                    model = self._load(name)
+                    self._models[name] = model
+        return model
+
+    def register(self, name, model):
+        with self._lock:
+            self._models[name] = model
+
+    def _load(self, name):
+        spec = dict(self.specs[name])
+        logger.info('Loading NLP model %s: %s', name, spec)
+        if spec.pop('stub', False):
+            return StubPipeline(**spec)
+
+        from transformers import pipeline
+
+        return pipeline(**spec)
+
+    def warm_up(self):
+        try:
+            get_vader()
+            # Loads the prompt tokenizer here so the first chat does not pay for it.
+            get_token_counter().tokenizer
+            for name in self.specs:
+                if name == 'sentiment' and not uses_model():
+                    continue
+                self.get(name)('warm up')
+        except Exception:
+            logger.exception('NLP model warm-up failed')
+            return False
+        self._ready.set()
+        logger.info('NLP models ready: %s', ', '.join(self.specs))
+        return True
+
+    def warm_up_in_background(self):
+        thread = threading.Thread(target=self.warm_up, name='nlp-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+
+class StubPipeline:
+    """Deterministic stand-in for a transformers pipeline, selected with ``'stub': True`` in a model spec.
+
+    Used for load tests and machines without model weights: labels and
+    vectors are derived from a hash of the text, and ``latency_ms`` simulates
+    inference time per batch.
+    """
+
+    def __init__(self, task, model=None, labels=('POSITIVE', 'NEGATIVE'), dim=384, latency_ms=0):
+        self.task = task
+        self.labels = list(labels)
+        self.dim = dim
+        self.latency_ms = latency_ms
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return [self._predict(text) for text in texts]
+
+    def _predict(self, text):
+        digest = hashlib.sha1(text.encode('utf-8')).digest()
+        if self.task == 'feature-extraction':
+            seed = int.from_bytes(digest[:8], 'little')
+            return np.random.default_rng(seed).standard_normal((1, self.dim)).astype(np.float32)
+        return {'label': self.labels[digest[0] % len(self.labels)], 'score': 0.5 + digest[1] / 510.0}
+
+
+registry = ModelRegistry()
+
+
+class _Pending:
+    __slots__ = ('text', 'enqueued_at', 'future')
+
+    def __init__(self, text):
+        self.text = text
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+
+
+class InferenceBatcher:
+    """Collects messages from concurrent requests and classifies them in one batch.
+
+    A batch is flushed when ``window_ms`` has passed since its first message or
+    when it reaches ``max_batch_size``; sentiment (see chatbot.sentiment) and the
+    emotion pipeline then run over the whole batch and each caller gets its own
+    pair of results back.
+    """
+
+    def __init__(self, model_registry, config=None):
+        self.registry = model_registry
+        self.sentiment = SentimentService(model_registry)
+        self._config = config
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        if self._config is not None:
+            return self._config
+        return {**DEFAULT_NLP_BATCHING, **getattr(settings, 'CHATBOT_NLP_BATCHING', {})}
+
+    def analyze(self, text):
+        config = self.config
+        if not config['enabled']:
+            return self._classify([text])[0]
+        self._ensure_worker()
+        pending = _Pending(text)
+        self._queue.put(pending)
+        return pending.future.result(timeout=config['timeout'])
+
+    async def analyze_async(self, text):
+        """Awaits the batch result without tying up a thread per caller."""
+        config = self.config
+        if not config['enabled']:
+            return await asyncio.to_thread(self.analyze, text)
+        self._ensure_worker()
+        pending = _Pending(text)
+        self._queue.put(pending)
+        return await asyncio.wait_for(asyncio.wrap_future(pending.future), config['timeout'])
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='nlp-batcher', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            config = self.config
+            deadline = batch[0].enqueued_at + config['window_ms'] / 1000.0
+            while len(batch) < config['max_batch_size']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        # Callers that gave up (async timeouts) are dropped; the rest can no longer be cancelled.
+        batch = [pending for pending in batch if pending.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.monotonic()
+        metrics.histogram('nlp_batch_size', 'Messages per NLP inference batch').observe(len(batch))
+        queue_wait = metrics.histogram('nlp_queue_wait_seconds', 'Time a message waited for its NLP batch')
+        for pending in batch:
+            queue_wait.observe(started - pending.enqueued_at)
+        try:
+            results = self._classify([pending.text for pending in batch])
+        except Exception as e:
+            logger.exception('NLP batch of %d failed', len(batch))
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+
+    def _classify(self, texts):
+        started = time.monotonic()
+        sentiments = self.sentiment.classify(texts)
+        emotions = self.registry.get('emotion')(texts, batch_size=len(texts))
+        metrics.histogram('nlp_inference_seconds', 'NLP pipeline time per batch').observe(time.monotonic() - started)
+        return list(zip(sentiments, emotions))
+
+
+batcher = InferenceBatcher(registry)
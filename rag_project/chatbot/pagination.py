@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.pagination import CursorPagination
+
+
+class MessageCursorPagination(CursorPagination):
+    """Keyset pagination over the (user|session_id, created_at) indexes, newest first."""
+
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, 'CHATBOT_HISTORY_PAGE_SIZE', 50)
+        return super().get_page_size(request)
+
+
+class ConversationCursorPagination(MessageCursorPagination):
+    """Most recently active conversations first, over the (user, last_activity) index."""
+
+    ordering = ('-last_activity', '-id')
+
+
+def history_validators(request, queryset):
+    """ETag and Last-Modified for a history page from one aggregate query, without loading the page.
+
+    Any message added, removed or updated in the filtered history changes the
+    count, the highest id or the latest ``updated_at``; the query string picks
+    out the page (cursor and page size).
+    """
+    state = queryset.order_by().aggregate(count=Count('id'), last_id=Max('id'), last_modified=Max('updated_at'))
+    last_modified = state['last_modified']
+    version = f"{state['count']}:{state['last_id']}:{last_modified and last_modified.isoformat()}"
+    query = request.query_params.urlencode()
+    etag = quote_etag(hashlib.sha1(f"{version}|{query}".encode('utf-8')).hexdigest())
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def paginated_history(view, request, queryset, serializer_class):
+    """Returns one cursor page with ETag/Last-Modified, or a 304 when the client's copy is current.
+
+    The validators come from an aggregate over the whole filtered history, so
+    a 304 is answered before the page is queried or serialized.
+    """
+    etag, timestamp = history_validators(request, queryset)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is None:
+        paginator = MessageCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=view)
+        response = paginator.get_paginated_response(serializer_class(page, many=True).data)
+    else:
+        response = not_modified
+
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,79 @@
+import math
+
+from django.conf import settings
+from django.db import transaction
+
+DEFAULT_PROFILE_STATS = {
+    'recent_size': 20,
+    'emotion_decay': 0.9,
+}
+
+
+def profile_stats_config():
+    return {**DEFAULT_PROFILE_STATS, **getattr(settings, 'CHATBOT_PROFILE_STATS', {})}
+
+
+def update_running_stats(stats, label, score):
+    """Welford update of count/mean/m2 for one label; variance is m2 / count."""
+    entry = stats.setdefault(label, {'count': 0, 'mean': 0.0, 'm2': 0.0})
+    entry['count'] += 1
+    delta = score - entry['mean']
+    entry['mean'] += delta / entry['count']
+    entry['m2'] += delta * (score - entry['mean'])
+    return stats
+
+
+def variance(entry):
+    return entry['m2'] / entry['count'] if entry['count'] else 0.0
+
+
+def stddev(entry):
+    return math.sqrt(variance(entry))
+
+
+def push_recent(recent, item, size):
+    recent.append(item)
+    del recent[:-size]
+    return recent
+
+
+def decay_weights(weights, label, score, decay):
+    for key in weights:
+        weights[key] *= decay
+    weights[label] = weights.get(label, 0.0) + score
+    return weights
+
+
+def record_analysis(profile, sentiment, emotion, categories):
+    """Folds one message's analysis into the profile's bounded aggregates.
+
+    Returns the names of the fields that changed.
+    """
+    config = profile_stats_config()
+    # VADER and the transformer score on different scales, so their statistics are never mixed.
+    source = sentiment.get('source', 'model')
+    update_running_stats(profile.sentiment_scores.setdefault(source, {}), sentiment['label'], sentiment['score'])
+    push_recent(profile.recent_sentiments,
+                {'label': sentiment['label'], 'score': sentiment['score'], 'source': source},
+                config['recent_size'])
+    decay_weights(profile.personality_traits, emotion['label'], emotion['score'], config['emotion_decay'])
+    changed = ['sentiment_scores', 'recent_sentiments', 'personality_traits']
+    for category in categories:
+        profile.interaction_patterns[category] = profile.interaction_patterns.get(category, 0) + 1
+    if categories:
+        changed.append('interaction_patterns')
+    return changed
+
+
+def update_profile(user, sentiment, emotion, categories):
+    """Applies one message's analysis under a row lock so concurrent chats never lose updates."""
+    from .models import UserProfile
+
+    with transaction.atomic():
+        profile = UserProfile.objects.select_for_update().filter(user=user).first()
+        if profile is None:
+            UserProfile.objects.get_or_create(user=user)
+            profile = UserProfile.objects.select_for_update().get(user=user)
+        changed = record_analysis(profile, sentiment, emotion, categories)
+        profile.save(update_fields=changed)
+    return profile
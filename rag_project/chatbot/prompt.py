@@ -0,0 +1,161 @@
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from rag_project.metrics import metrics
+from rag_project.tracing import annotate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT = {
+    'tokenizer': None,
+    'chars_per_token': 3,
+    'cache_size': 4096,
+    'budgets': {
+        'profile': 64,
+        'retrieved': 768,
+        'history': 512,
+        'message': 1024,
+    },
+    'min_trimmed_tokens': 16,
+}
+
+_word_tokens = re.compile(r"\w+|[^\w\s]")
+
+
+def prompt_config():
+    config = {**DEFAULT_PROMPT, **getattr(settings, 'CHATBOT_PROMPT', {})}
+    config['budgets'] = {**DEFAULT_PROMPT['budgets'], **config['budgets']}
+    return config
+
+
+class TokenCounter:
+    """Counts and truncates with the model's tokenizer, loaded once.
+
+    Falls back to an approximation when no tokenizer is configured or it
+    cannot be loaded, so prompt assembly never depends on network access.
+    Subword tokenizers split rare words into several tokens, so the fallback
+    counts the larger of words/punctuation and one token per
+    ``chars_per_token`` characters, which errs on the side of overcounting.
+    Counts are cached by a digest of the text rather than the
+    text itself, so the cache does not keep whole prompts alive.
+    """
+
+    def __init__(self, name, cache_size=4096, chars_per_token=3):
+        self.name = name
+        self.cache_size = cache_size
+        self.chars_per_token = chars_per_token
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._counts = OrderedDict()
+        self._counts_lock = threading.Lock()
+
+    @property
+    def tokenizer(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded and self.name:
+                    try:
+                        from transformers import AutoTokenizer
+                        self._tokenizer = AutoTokenizer.from_pretrained(self.name)
+                    except Exception as e:
+                        logger.warning('Tokenizer %s unavailable, approximating token counts: %s', self.name, e)
+                self._loaded = True
+        return self._tokenizer
+
+    def count(self, text):
+        key = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        with self._counts_lock:
+            tokens = self._counts.get(key)
+            if tokens is not None:
+                self._counts.move_to_end(key)
+                return tokens
+        tokens = self._count(text)
+        with self._counts_lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def _count(self, text):
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        return max(len(_word_tokens.findall(text)), math.ceil(len(text) / self.chars_per_token))
+
+    def truncate(self, text, max_tokens):
+        if max_tokens <= 0:
+            return ''
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)
+            return text if len(ids) <= max_tokens else self.tokenizer.decode(ids[:max_tokens])
+        max_chars = max_tokens * self.chars_per_token
+        for index, match in enumerate(_word_tokens.finditer(text)):
+            if index == max_tokens or match.end() > max_chars:
+                return text[:match.start()].rstrip()
+        return text if len(text) <= max_chars else text[:max_chars].rstrip()
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_token_counter():
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                config = prompt_config()
+                _counter = TokenCounter(config['tokenizer'], config['cache_size'], config['chars_per_token'])
+    return _counter
+
+
+class PromptBuilder:
+    """Fits each prompt section into its token budget.
+
+    Items are passed most important first (best retrieval score, most recent
+    insight); whole items are kept while they fit, the first one that does
+    not is trimmed if enough budget is left, and the rest are dropped.
+    """
+
+    def __init__(self, counter=None, config=None):
+        self.counter = counter or get_token_counter()
+        self.config = config or prompt_config()
+        self.budgets = self.config['budgets']
+
+    def fit(self, items, budget):
+        kept = []
+        remaining = budget
+        for item in items:
+            tokens = self.counter.count(item)
+            if tokens <= remaining:
+                kept.append(item)
+                remaining -= tokens
+                continue
+            if remaining >= self.config['min_trimmed_tokens']:
+                kept.append(self.counter.truncate(item, remaining))
+            break
+        return kept
+
+    def fit_text(self, text, budget):
+        return text if self.counter.count(text) <= budget else self.counter.truncate(text, budget)
+
+    def record(self, kind, prompt):
+        tokens = self.counter.count(prompt)
+        metrics.histogram('prompt_tokens', 'Final prompt size in tokens', prompt=kind).observe(tokens)
+        annotate(prompt=kind, tokens=tokens)
+        return tokens
+
+    def section(self, name, items):
+        return self.fit(items, self.budgets[name])
+
+    def message(self, message):
+        return self.fit_text(message, self.budgets['message'])
+
+    def profile(self, profile_context):
+        return self.fit_text(profile_context, self.budgets['profile']) if profile_context else ''
@@ -0,0 +1,19 @@
+from .models import Conversation, Insight, Message
+
+
+def messages_for(user, session_id):
+    # Served by the (user, created_at) / (session_id, created_at) indexes.
+    if user:
+        return Message.objects.filter(user=user).order_by('created_at', 'id')
+    return Message.objects.filter(session_id=session_id).order_by('created_at', 'id')
+
+
+def insights_for(user, session_id):
+    if user:
+        return Insight.objects.filter(user=user).order_by('created_at')
+    return Insight.objects.filter(session_id=session_id).order_by('created_at')
+
+
+def conversations_for(user):
+    # Served by the (user, last_activity) index.
+    return Conversation.objects.filter(user=user).order_by('-last_activity', '-id')
@@ -0,0 +1,97 @@
+import threading
+
+from django.conf import settings
+
+from rag_project.metrics import metrics
+
+DEFAULT_SENTIMENT = {
+    'mode': 'tiered',
+    'ambiguous_below': 0.3,
+    'long_message_words': 50,
+}
+
+MODES = ('fast', 'accurate', 'tiered')
+
+_vader = None
+_vader_lock = threading.Lock()
+
+
+def sentiment_config():
+    config = {**DEFAULT_SENTIMENT, **getattr(settings, 'CHATBOT_SENTIMENT', {})}
+    if config['mode'] not in MODES:
+        raise ValueError(f"CHATBOT_SENTIMENT mode must be one of {', '.join(MODES)}, not {config['mode']!r}")
+    return config
+
+
+def uses_model():
+    return sentiment_config()['mode'] != 'fast'
+
+
+def get_vader():
+    """The process-wide VADER analyzer; it is stateless after loading its lexicon, so threads share it."""
+    global _vader
+    if _vader is None:
+        with _vader_lock:
+            if _vader is None:
+                from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+                _vader = SentimentIntensityAnalyzer()
+    return _vader
+
+
+def lexicon_sentiment(text):
+    """VADER scores in the transformer pipeline's shape: POSITIVE/NEGATIVE with a 0.5-1.0 score.
+
+    The score is not on the transformer's scale (which sits mostly above 0.9),
+    so results carry a ``source`` and profiles keep statistics per source.
+    """
+    compound = get_vader().polarity_scores(text)['compound']
+    return {
+        'label': 'NEGATIVE' if compound < 0 else 'POSITIVE',
+        'score': 0.5 + abs(compound) / 2,
+        'compound': compound,
+        'source': 'lexicon',
+    }
+
+
+class SentimentService:
+    """Sentiment for a batch of messages, from VADER, the transformer pipeline or both.
+
+    ``fast`` scores everything with VADER and ``accurate`` with the
+    transformer. ``tiered`` scores everything with VADER first and sends only
+    the messages VADER is unsure about to the transformer: those whose
+    compound score is within ``ambiguous_below`` of zero, and those longer
+    than ``long_message_words``, where the lexicon sum is least reliable.
+    """
+
+    def __init__(self, model_registry):
+        self.registry = model_registry
+
+    def classify(self, texts):
+        config = sentiment_config()
+        if config['mode'] == 'accurate':
+            self._count('model', len(texts))
+            return self._model(texts)
+        results = [lexicon_sentiment(text) for text in texts]
+        if config['mode'] == 'fast':
+            self._count('lexicon', len(texts))
+            return results
+        escalate = [i for i, text in enumerate(texts) if self.ambiguous(text, results[i], config)]
+        self._count('lexicon', len(texts) - len(escalate))
+        if escalate:
+            self._count('escalated', len(escalate))
+            for i, result in zip(escalate, self._model([texts[i] for i in escalate])):
+                results[i] = result
+        return results
+
+    def ambiguous(self, text, result, config):
+        return (abs(result['compound']) < config['ambiguous_below']
+                or len(text.split()) > config['long_message_words'])
+
+    def _model(self, texts):
+        results = self.registry.get('sentiment')(texts, batch_size=len(texts))
+        return [{**result, 'source': 'model'} for result in results]
+
+    def _count(self, path, amount):
+        if amount:
+            metrics.counter('sentiment_messages_total', 'Messages scored per sentiment path', path=path).inc(amount)
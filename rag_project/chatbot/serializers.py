@@ -1,13 +1,18 @@
 from rest_framework import serializers
-from .models import Message, Insight, AnonymousInteraction
+from .models import Conversation, Message, Insight, AnonymousInteraction
 
 
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = ['id', 'user_message', 'chatbot_response', 'insight', 'session_id']
+        fields = ['id', 'user_message', 'chatbot_response', 'insight', 'session_id', 'created_at']
 
 
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ['session_id', 'title', 'snippet', 'message_count', 'started_at', 'last_activity']
+
 
 class InsightSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+import uuid
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rag_project.metrics import metrics
+from .cache import cache_key
+
+DEFAULT_LLM_SINGLE_FLIGHT = {
+    'enabled': True,
+    'shared': False,
+    'alias': 'default',
+    'lock_timeout': 120,
+    'poll_interval': 0.05,
+    'result_ttl': 30,
+}
+
+
+def single_flight_config():
+    return {**DEFAULT_LLM_SINGLE_FLIGHT, **getattr(settings, 'LLM_SINGLE_FLIGHT', {})}
+
+
+def count_coalesced(scope):
+    metrics.counter('llm_coalesced_requests_total', 'Model server calls answered by an identical in-flight call',
+                    scope=scope).inc()
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesces concurrent model server calls for the same model and prompt.
+
+    The first caller for a key makes the upstream call; callers arriving while
+    it is in flight wait for it and share its result or exception. Keys are the
+    response cache keys, so prompts differing only in whitespace or Unicode form
+    coalesce too. With ``shared`` the leader also holds a lock in a Django
+    cache alias, and callers in other workers poll for its result instead of
+    making their own call; if the leader fails or the lock expires they go
+    upstream themselves.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or single_flight_config()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._tasks = weakref.WeakKeyDictionary()
+
+    @property
+    def cache(self):
+        return caches[self.config['alias']]
+
+    def do(self, model, prompt, fn):
+        if not self.config['enabled']:
+            return fn()
+        key = cache_key(model, prompt)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight()
+        if not leader:
+            count_coalesced('local')
+            return flight.wait()
+        try:
+            flight.result = self._shared(key, fn) if self.config['shared'] else fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    async def ado(self, model, prompt, coro_fn):
+        if not self.config['enabled']:
+            return await coro_fn()
+        key = cache_key(model, prompt)
+        # Tasks belong to the event loop that created them.
+        tasks = self._tasks.setdefault(asyncio.get_running_loop(), {})
+        task = tasks.get(key)
+        if task is None:
+            task = tasks[key] = asyncio.ensure_future(
+                self._ashared(key, coro_fn) if self.config['shared'] else coro_fn()
+            )
+            task.add_done_callback(lambda _: tasks.pop(key, None))
+        else:
+            count_coalesced('local')
+        # A waiter whose request is cancelled must not cancel the call the others are waiting on.
+        return await asyncio.shield(task)
+
+    def _shared(self, key, fn):
+        cache = self.cache
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.config['lock_timeout']
+        while time.monotonic() < deadline:
+            if cache.add(f"{key}:flight", token, timeout=self.config['lock_timeout']):
+                try:
+                    content = fn()
+                    # Published under the leader's token, so only callers that saw this flight pick it up.
+                    cache.set(f"{key}:{token}", {'content': content}, timeout=self.config['result_ttl'])
+                    return content
+                finally:
+                    cache.delete(f"{key}:flight")
+            leader = cache.get(f"{key}:flight")
+            while leader is not None and time.monotonic() < deadline:
+                # The result is written before the lock is released, so read the lock first.
+                released = cache.get(f"{key}:flight") != leader
+                shared = cache.get(f"{key}:{leader}")
+                if shared is not None:
+                    count_coalesced('shared')
+                    return shared['content']
+                if released:
+                    break  # the leader failed; try to lead
+                time.sleep(self.config['poll_interval'])
+        return fn()
+
+    async def _ashared(self, key, coro_fn):
+        cache = self.cache
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.config['lock_timeout']
+        while time.monotonic() < deadline:
+            if await cache.aadd(f"{key}:flight", token, timeout=self.config['lock_timeout']):
+                try:
+                    content = await coro_fn()
+                    await cache.aset(f"{key}:{token}", {'content': content}, timeout=self.config['result_ttl'])
+                    return content
+                finally:
+                    await cache.adelete(f"{key}:flight")
+            leader = await cache.aget(f"{key}:flight")
+            while leader is not None and time.monotonic() < deadline:
+                released = await cache.aget(f"{key}:flight") != leader
+                shared = await cache.aget(f"{key}:{leader}")
+                if shared is not None:
+                    count_coalesced('shared')
+                    return shared['content']
+                if released:
+                    break
+                await asyncio.sleep(self.config['poll_interval'])
+        return await coro_fn()
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,95 @@
+import json
+import re
+import threading
+
+from django.conf import settings
+
+DEFAULT_TAXONOMY = {
+    'Productivity': ['productivity', 'efficient', 'focus'],
+    'Health': ['health', 'wellness', 'fitness'],
+    'Relationships': ['relationship', 'social', 'communication'],
+}
+
+
+def load_taxonomy():
+    """Reads CHATBOT_TAXONOMY_FILE (JSON) if set, else CHATBOT_TAXONOMY, else the built-in default."""
+    path = getattr(settings, 'CHATBOT_TAXONOMY_FILE', None)
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return getattr(settings, 'CHATBOT_TAXONOMY', DEFAULT_TAXONOMY)
+
+
+class CategoryEngine:
+    """Matches every keyword of every category in one scan of the text.
+
+    The pattern is a zero-width lookahead tried at every position, so matches
+    may overlap: "mental health" finds both a "mental health" and a "health"
+    keyword. At each position the longest keyword wins, and the keywords that
+    are whole-word prefixes of it ("mental") are credited too. Keyword edges
+    use ``(?<!\w)``/``(?!\w)`` rather than ``\b`` so keywords that start or
+    end with punctuation ("c++") still match. Results keep the taxonomy's
+    category order.
+    """
+
+    def __init__(self, taxonomy):
+        self.categories = list(taxonomy)
+        self._order = {category: index for index, category in enumerate(self.categories)}
+        lookup = {}
+        for category, keywords in taxonomy.items():
+            for keyword in keywords:
+                lookup.setdefault(self._normalize(keyword), set()).add(category)
+        self._lookup = {
+            keyword: set().union(*(lookup[other] for other in lookup if self._is_prefix(other, keyword)))
+            for keyword in lookup
+        }
+        # Longest first so multi-word phrases win over their prefixes at the same position.
+        alternatives = sorted(lookup, key=len, reverse=True)
+        if alternatives:
+            pattern = r'(?<!\w)(?=(%s)(?!\w))' % '|'.join(
+                r'\s+'.join(map(re.escape, k.split(' '))) for k in alternatives
+            )
+            self._pattern = re.compile(pattern, re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    @staticmethod
+    def _is_prefix(prefix, keyword):
+        """True if ``prefix`` matches wherever ``keyword`` does (``keyword`` itself included)."""
+        return keyword.startswith(prefix) and (
+            len(prefix) == len(keyword) or not re.match(r'\w', keyword[len(prefix)])
+        )
+
+    @staticmethod
+    def _normalize(keyword):
+        return ' '.join(keyword.split()).casefold()
+
+    def categorize(self, text):
+        if not text or self._pattern is None:
+            return []
+        found = set()
+        for match in self._pattern.finditer(text):
+            found.update(self._lookup[self._normalize(match.group(1))])
+            if len(found) == len(self.categories):
+                break
+        return sorted(found, key=self._order.__getitem__)
+
+    def categorize_many(self, texts):
+        return [self.categorize(text) for text in texts]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_category_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = CategoryEngine(load_taxonomy())
+    return _engine
+
+
+def categorize(text):
+    return get_category_engine().categorize(text)
@@ -1,3 +1,1114 @@
-from django.test import TestCase
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import numpy as np
+import requests
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.models import CustomUser
+from rag_project.jobs import Heartbeat, LostClaim
+from rag_project.metrics import metrics
+from rag_project.middleware import RequestTimingMiddleware
+from rag_project.tracing import current_trace_id
+from .admission import AdmissionController, AdmissionRejected, admission
+from .backends import DEFAULT_LLM_BACKEND, BackendUnavailable, Node, NodePool, OllamaBackend
+from .cache import LRUBackend, cache_key
+from .client import DEFAULT_LLM_CLIENT, AsyncLLMClient, LLMClient, backoff_delay
+from .conversations import save_message
+from .corpus import CorpusIngestor, chunk_stream, retrieve_passages
+from .embeddings import index_insights, relevant_insights
+from .jobs import InsightJobRunner
+from .models import (
+    AnonymousInteraction, Conversation, Document, DocumentChunk, Insight, InsightJob, Message, UserProfile
+)
+from .profile_stats import record_analysis
+from .prompt import DEFAULT_PROMPT, PromptBuilder, TokenCounter
+from .queries import conversations_for, insights_for, messages_for
+from .sentiment import SentimentService
+from .singleflight import DEFAULT_LLM_SINGLE_FLIGHT, SingleFlight
+from .taxonomy import CategoryEngine
+from .vector_index import FlatVectorIndex, InsightIndexStore, IVFVectorIndex
+from .views import ChatbotView
+
+
+class ConcurrentProfileUpdateTests(TransactionTestCase):
+    def test_parallel_chats_for_one_user_keep_exact_counts(self):
+        user = CustomUser.objects.create_user(username='busy', password='secret')
+        workers = 16
+        errors = []
+        start = threading.Barrier(workers)
+
+        def chat():
+            try:
+                start.wait()
+                ChatbotView().update_user_profile(
+                    user, {'label': 'POSITIVE', 'score': 0.5}, {'label': 'joy', 'score': 1.0}, ['Health']
+                )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=chat) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.sentiment_scores['model']['POSITIVE']['count'], workers)
+        self.assertEqual(profile.interaction_patterns['Health'], workers)
+        self.assertEqual(len(profile.recent_sentiments), min(workers, 20))
+
+
+class ChatIndexQueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='reader', password='secret')
+        Message.objects.create(user=self.user, user_message='hi', chatbot_response='hello', insight='')
+        Message.objects.create(session_id='anon', user_message='hi', chatbot_response='hello', insight='')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_user_messages_use_user_created_index(self):
+        self.assertUsesIndex(messages_for(self.user, None), 'chatbot_msg_user_created_idx')
+
+    def test_session_messages_use_session_created_index(self):
+        self.assertUsesIndex(messages_for(None, 'anon'), 'chatbot_msg_sess_created_idx')
+
+    def test_insight_lookups_use_created_indexes(self):
+        self.assertUsesIndex(insights_for(self.user, None), 'chatbot_ins_user_created_idx')
+        self.assertUsesIndex(insights_for(None, 'anon'), 'chatbot_ins_sess_created_idx')
+
+    def test_conversation_list_uses_activity_index(self):
+        self.assertUsesIndex(conversations_for(self.user), 'chatbot_conv_user_activity_idx')
+
+
+class ConversationCounterTests(TestCase):
+    def test_authenticated_sessions_are_separate_conversations(self):
+        user = CustomUser.objects.create_user(username='talker', password='secret')
+        save_message(user, 'first', user_message='How do I sleep better?', chatbot_response='...', insight='')
+        save_message(user, 'first', user_message='And wake up earlier?', chatbot_response='...', insight='')
+        save_message(user, 'second', user_message='Budget tips', chatbot_response='...', insight='')
+
+        first, second = Conversation.objects.get(session_id='first'), Conversation.objects.get(session_id='second')
+        self.assertEqual((first.message_count, second.message_count), (2, 1))
+        self.assertEqual(first.title, 'How do I sleep better?')
+        self.assertEqual(first.snippet, 'And wake up earlier?')
+        self.assertEqual(list(conversations_for(user)), [second, first])
+        self.assertEqual(first.messages.count(), 2)
+
+
+class HistoryConditionalRequestTests(TestCase):
+    url = '/api/chatbot/messages/anonymous/?session_id=guest'
+
+    def setUp(self):
+        save_message(None, 'guest', user_message='Hello', chatbot_response='Hi', insight='')
+
+    def test_current_copy_gets_304_from_one_aggregate_query(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_new_or_updated_messages_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        message = save_message(None, 'guest', user_message='Again', chatbot_response='Sure', insight='')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+
+        etag = response['ETag']
+        message.insight = 'Likes greetings'
+        message.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pages_have_their_own_etags(self):
+        save_message(None, 'guest', user_message='Again', chatbot_response='Sure', insight='')
+        first = self.client.get(self.url + '&page_size=1')
+        second = self.client.get(first.json()['next'])
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+
+class CategoryEngineTests(SimpleTestCase):
+    def test_overlapping_keywords_return_every_category(self):
+        engine = CategoryEngine({'Mental': ['mental health'], 'Health': ['health'], 'Mind': ['mental']})
+        self.assertEqual(engine.categorize('I worry about my mental health'), ['Mental', 'Health', 'Mind'])
+        self.assertEqual(engine.categorize('mental'), ['Mind'])
+
+    def test_keywords_with_punctuation_edges_match_whole_words(self):
+        engine = CategoryEngine({'Code': ['c++', '.net'], 'Letters': ['c']})
+        self.assertEqual(engine.categorize('Learning C++ and .NET'), ['Code', 'Letters'])
+        self.assertEqual(engine.categorize('c++17'), ['Letters'])
+        self.assertEqual(engine.categorize('abc++'), [])
+
+
+ADMISSION = {'enabled': True, 'max_concurrency': 1, 'max_queue': 3, 'max_queue_per_client': 2,
+             'queue_timeout': 5, 'expected_seconds': 5}
+
+
+@override_settings(LLM_ADMISSION=ADMISSION)
+class AdmissionControllerTests(SimpleTestCase):
+    def setUp(self):
+        self.controller = AdmissionController()
+        self.holder = self.controller.acquire('user:holder')
+        self.threads = []
+
+    def tearDown(self):
+        self.holder.release()
+        for thread in self.threads:
+            thread.join(5)
+
+    def queue(self, client, on_grant=None):
+        queued = self.controller.stats()['queued']
+
+        def wait():
+            with self.controller.acquire(client):
+                if on_grant:
+                    on_grant(client)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+        self.threads.append(thread)
+        while self.controller.stats()['queued'] == queued:
+            time.sleep(0.001)
+
+    def test_freed_slots_rotate_between_clients(self):
+        granted = []
+        self.queue('user:a', granted.append)
+        self.queue('user:a', granted.append)
+        self.queue('user:b', granted.append)
+        self.holder.release()
+        for thread in self.threads:
+            thread.join(5)
+        self.assertEqual(granted, ['user:a', 'user:b', 'user:a'])
+        self.assertEqual(self.controller.stats(), {'in_flight': 0, 'queued': 0, 'queued_clients': 0})
+
+    def test_client_over_its_queue_share_gets_429(self):
+        self.queue('user:a')
+        self.queue('user:a')
+        with self.assertRaises(AdmissionRejected) as rejected:
+            self.controller.acquire('user:a')
+        self.assertEqual(rejected.exception.status_code, 429)
+        self.assertEqual(rejected.exception.reason, 'client_queue_full')
+        # Two queued plus this one, at the expected five seconds each through one slot.
+        self.assertEqual(rejected.exception.headers, {'Retry-After': '15'})
+
+    def test_full_queue_gets_503(self):
+        self.queue('user:a')
+        self.queue('user:b')
+        self.queue('user:c')
+        with self.assertRaises(AdmissionRejected) as rejected:
+            self.controller.acquire('user:d')
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertEqual(rejected.exception.reason, 'queue_full')
+        self.assertEqual(rejected.exception.headers, {'Retry-After': '20'})
+
+    @override_settings(LLM_ADMISSION={**ADMISSION, 'queue_timeout': 0.01})
+    def test_wait_past_queue_timeout_gets_503(self):
+        with self.assertRaises(AdmissionRejected) as rejected:
+            self.controller.acquire('user:a')
+        self.assertEqual(rejected.exception.status_code, 503)
+        self.assertEqual(rejected.exception.reason, 'queue_timeout')
+        self.assertEqual(rejected.exception.headers, {'Retry-After': '5'})
+        self.assertEqual(self.controller.stats()['queued'], 0)
+
+
+@override_settings(LLM_ADMISSION={**ADMISSION, 'max_queue': 0})
+class ChatAdmissionViewTests(TestCase):
+    def setUp(self):
+        analysis = ({'label': 'POSITIVE', 'score': 0.9, 'source': 'model'}, {'label': 'joy', 'score': 0.9})
+        for target, value in [('batcher.analyze', analysis), ('relevant_insights', []), ('retrieve_passages', [])]:
+            patcher = mock.patch(f'chatbot.views.{target}', return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.holder = admission.acquire('user:holder')
+        self.addCleanup(self.holder.release)
+
+    def chat(self, **headers):
+        return self.client.post('/api/chatbot/chat/', {'message': 'hello'}, content_type='application/json',
+                                **headers)
+
+    def test_rejected_anonymous_chat_writes_nothing(self):
+        response = self.chat()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+        self.assertFalse(AnonymousInteraction.objects.exists())
+
+    def test_rejected_user_chat_leaves_the_profile_alone(self):
+        user = CustomUser.objects.create_user(username='turned-away', password='secret')
+        token = RefreshToken.for_user(user).access_token
+        response = self.chat(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(UserProfile.objects.filter(user=user).exists())
+
+
+class FakeSentimentRegistry:
+    def __init__(self):
+        self.scored = []
+
+    def get(self, name):
+        return self.classify
+
+    def classify(self, texts, batch_size=None):
+        self.scored.extend(texts)
+        return [{'label': 'NEGATIVE', 'score': 0.99} for _ in texts]
+
+
+@override_settings(CHATBOT_SENTIMENT={'mode': 'tiered', 'ambiguous_below': 0.3, 'long_message_words': 10})
+class SentimentServiceTests(SimpleTestCase):
+    def setUp(self):
+        self.registry = FakeSentimentRegistry()
+        self.service = SentimentService(self.registry)
+
+    def test_tiered_escalates_only_ambiguous_and_long_messages(self):
+        confident = 'I love this, it is wonderful!'
+        neutral = 'The meeting is on Tuesday.'
+        long = 'I love this, it is wonderful and I would happily say so again and again.'
+        results = self.service.classify([confident, neutral, long])
+        self.assertEqual(self.registry.scored, [neutral, long])
+        self.assertEqual([result['source'] for result in results], ['lexicon', 'model', 'model'])
+        self.assertEqual(results[0]['label'], 'POSITIVE')
+
+    def test_escalation_threshold_is_the_absolute_compound_score(self):
+        # VADER scores 'good' at compound 0.4404.
+        self.assertEqual(self.service.classify(['good'])[0]['source'], 'lexicon')
+        with override_settings(CHATBOT_SENTIMENT={'mode': 'tiered', 'ambiguous_below': 0.5}):
+            self.assertEqual(self.service.classify(['good'])[0]['source'], 'model')
+
+    @override_settings(CHATBOT_SENTIMENT={'mode': 'fast'})
+    def test_fast_mode_never_uses_the_model(self):
+        self.service.classify(['The meeting is on Tuesday.'])
+        self.assertEqual(self.registry.scored, [])
+
+    def test_profile_statistics_are_kept_per_source(self):
+        profile = UserProfile(sentiment_scores={}, personality_traits={}, interaction_patterns={},
+                              recent_sentiments=[])
+        emotion = {'label': 'joy', 'score': 1.0}
+        record_analysis(profile, {'label': 'POSITIVE', 'score': 0.6, 'source': 'lexicon'}, emotion, [])
+        record_analysis(profile, {'label': 'POSITIVE', 'score': 0.98, 'source': 'model'}, emotion, [])
+        self.assertEqual(profile.sentiment_scores['lexicon']['POSITIVE']['mean'], 0.6)
+        self.assertEqual(profile.sentiment_scores['model']['POSITIVE']['mean'], 0.98)
+        self.assertEqual([item['source'] for item in profile.recent_sentiments], ['lexicon', 'model'])
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def test_keys_ignore_whitespace_and_unicode_form_but_keep_case(self):
+        self.assertEqual(cache_key('m', ' Caf\u00e9   menu\n'), cache_key('m', 'Cafe\u0301 menu'))
+        self.assertNotEqual(cache_key('m', 'Is the US open?'), cache_key('m', 'Is the us open?'))
+        self.assertNotEqual(cache_key('m', 'hello'), cache_key('other', 'hello'))
+
+    def test_lru_evicts_least_recent_by_count_and_size(self):
+        lru = LRUBackend(max_entries=2, max_bytes=10)
+        lru.set('a', 'aaa', 60)
+        lru.set('b', 'bbb', 60)
+        lru.get('a')
+        lru.set('c', 'ccc', 60)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), ('aaa', None, 'ccc'))
+        lru.set('d', 'dddddddd', 60)
+        self.assertEqual((lru.get('a'), lru.get('c'), lru.get('d')), (None, None, 'dddddddd'))
+        lru.set('e', 'e' * 11, 60)
+        self.assertIsNone(lru.get('e'))
+
+    def test_lru_entries_expire(self):
+        lru = LRUBackend(max_entries=2, max_bytes=100)
+        lru.set('a', 'aaa', -1)
+        self.assertIsNone(lru.get('a'))
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+
+    def flight(self, **config):
+        self.coalesced = metrics.counter('llm_coalesced_requests_total', scope='local').value
+        return SingleFlight({**DEFAULT_LLM_SINGLE_FLIGHT, 'poll_interval': 0.005, **config})
+
+    def wait_for_waiters(self, count):
+        while metrics.counter('llm_coalesced_requests_total', scope='local').value < self.coalesced + count:
+            time.sleep(0.001)
+
+    def run_concurrently(self, callers):
+        results = [None] * len(callers)
+
+        def call(index):
+            try:
+                results[index] = callers[index]()
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=call, args=(index,)) for index in range(len(callers))]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_identical_prompts_share_one_call(self):
+        flight = self.flight()
+        release = threading.Event()
+        calls = []
+
+        def upstream():
+            calls.append(1)
+            release.wait(5)
+            return 'answer'
+
+        threads, results = self.run_concurrently([lambda: flight.do('m', 'same  prompt', upstream)] * 5)
+        self.wait_for_waiters(4)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['answer'] * 5)
+        self.assertEqual(flight._flights, {})
+
+    def test_waiters_share_the_leaders_exception(self):
+        flight = self.flight()
+        release = threading.Event()
+
+        def upstream():
+            release.wait(5)
+            raise ValueError('model server down')
+
+        threads, results = self.run_concurrently([lambda: flight.do('m', 'p', upstream)] * 3)
+        self.wait_for_waiters(2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(flight.do('m', 'p', lambda: 'recovered'), 'recovered')
+
+    def test_async_waiter_cancellation_does_not_cancel_the_call(self):
+        flight = self.flight()
+        calls = []
+
+        async def upstream():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'answer'
+
+        async def main():
+            first = asyncio.ensure_future(flight.ado('m', 'p', upstream))
+            second = asyncio.ensure_future(flight.ado('m', 'p', upstream))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second, first.cancelled()
+
+        self.assertEqual(asyncio.run(main()), ('answer', True))
+        self.assertEqual(calls, [1])
+
+    def test_shared_flight_hands_the_result_to_other_workers(self):
+        leader, follower = self.flight(shared=True), self.flight(shared=True)
+        release = threading.Event()
+        follower_calls = []
+
+        def upstream():
+            release.wait(5)
+            return 'from leader'
+
+        threads, results = self.run_concurrently([lambda: leader.do('m', 'p', upstream)])
+        while caches['default'].get(f"{cache_key('m', 'p')}:flight") is None:
+            time.sleep(0.001)
+        more, follower_results = self.run_concurrently(
+            [lambda: follower.do('m', 'p', lambda: follower_calls.append(1) or 'own call')]
+        )
+        time.sleep(0.05)
+        release.set()
+        for thread in threads + more:
+            thread.join(5)
+        self.assertEqual((results, follower_results), (['from leader'], ['from leader']))
+        self.assertEqual(follower_calls, [])
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def setUp(self):
+        self.counter = TokenCounter(None, cache_size=2)
+        self.builder = PromptBuilder(self.counter, DEFAULT_PROMPT)
+
+    def test_fallback_count_does_not_undercount_long_words(self):
+        self.assertEqual(self.counter.count('Hello, world'), 4)
+        self.assertEqual(self.counter.count('antidisestablishmentarianism'), 10)
+
+    def test_truncated_text_fits_its_budget(self):
+        text = 'pneumonoultramicroscopicsilicovolcanoconiosis is a word ' * 20
+        for budget in (1, 16, 50):
+            self.assertLessEqual(self.counter.count(self.counter.truncate(text, budget)), budget)
+        self.assertEqual(self.counter.truncate('short text', 16), 'short text')
+
+    def test_fit_keeps_whole_items_then_trims_one_and_drops_the_rest(self):
+        items = ['one two three', 'word ' * 40, 'never reached']
+        kept = self.builder.fit(items, 30)
+        self.assertEqual(kept[0], 'one two three')
+        self.assertEqual(len(kept), 2)
+        self.assertLessEqual(sum(self.counter.count(item) for item in kept), 30)
+        self.assertEqual(self.builder.fit(items, 5), ['one two three'])
+
+    def test_count_cache_is_bounded_and_keyed_by_digest(self):
+        for text in ('a', 'b b', 'c c c'):
+            self.counter.count(text)
+        self.assertEqual(len(self.counter._counts), 2)
+        self.assertTrue(all(isinstance(key, bytes) and len(key) == 16 for key in self.counter._counts))
+
+    def test_prompt_size_is_logged_under_the_trace(self):
+        with self.assertLogs('rag_project.trace', level='INFO') as logs:
+            tokens = self.builder.record('answer', 'User message: hello')
+        self.assertIn(f'prompt=answer tokens={tokens}', logs.output[0])
+
+
+def http_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO()
+    return response
+
+
+class LLMClientRetryTests(SimpleTestCase):
+    config = {**DEFAULT_LLM_CLIENT, 'backoff_base': 0, 'max_retries': 2}
+
+    def post_with(self, *outcomes):
+        client = LLMClient(self.config)
+        with mock.patch.object(client.session, 'post', side_effect=outcomes) as post:
+            try:
+                return client.post('http://llm/api/chat', json={}), post.call_count
+            except Exception as e:
+                return e, post.call_count
+
+    def test_connection_errors_are_retried(self):
+        result, calls = self.post_with(requests.exceptions.ConnectTimeout(), http_response(200))
+        self.assertEqual((result.status_code, calls), (200, 2))
+
+    def test_read_timeouts_are_not_retried(self):
+        result, calls = self.post_with(requests.exceptions.ReadTimeout(), http_response(200))
+        self.assertIsInstance(result, requests.exceptions.ReadTimeout)
+        self.assertEqual(calls, 1)
+
+    def test_busy_answers_are_retried_until_attempts_run_out(self):
+        result, calls = self.post_with(http_response(503), http_response(429), http_response(503))
+        self.assertEqual((result.status_code, calls), (503, 3))
+        result, calls = self.post_with(http_response(502))
+        self.assertEqual((result.status_code, calls), (502, 1))
+
+    def test_connection_pool_is_sized_from_settings(self):
+        client = LLMClient({**self.config, 'pool_size': 7})
+        self.assertEqual(client.session.get_adapter('http://llm')._pool_maxsize, 7)
+        self.assertEqual(client.timeout, (self.config['connect_timeout'], self.config['read_timeout']))
+
+    def test_backoff_is_full_jitter_and_capped(self):
+        config = {**DEFAULT_LLM_CLIENT, 'backoff_base': 1, 'backoff_max': 3}
+        for attempt in range(5):
+            self.assertTrue(0 <= backoff_delay(attempt, config) <= min(3, 2 ** attempt))
+
+    def test_async_client_retries_only_what_never_reached_the_server(self):
+        def run(*outcomes):
+            calls = []
+
+            def handler(request):
+                outcome = outcomes[len(calls)]
+                calls.append(request)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return httpx.Response(outcome)
+
+            async def post():
+                client = AsyncLLMClient(self.config)
+                client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+                try:
+                    return (await client.post('http://llm/api/chat', json={})).status_code
+                except Exception as e:
+                    return type(e)
+                finally:
+                    await client.aclose()
+
+            return asyncio.run(post()), len(calls)
+
+        self.assertEqual(run(httpx.ConnectError('refused'), 429, 200), (200, 3))
+        self.assertEqual(run(httpx.ReadTimeout('slow'), 200), (httpx.ReadTimeout, 1))
+
+
+INSIGHT_RESULT = {'insight': 'Asks about sleep', 'categories': ['Health']}
+
+
+class InsightJobRunnerTests(TestCase):
+    def setUp(self):
+        self.runner = InsightJobRunner()
+        self.message = Message.objects.create(session_id='s1', user_message='sleep?', chatbot_response='rest',
+                                              insight='')
+        self.job = InsightJob.objects.create(session_id='s1', message=self.message, question='sleep?')
+        self.llama = mock.patch('chatbot.jobs.LLaMA').start().return_value
+        self.llama.generate_insight.return_value = INSIGHT_RESULT
+        mock.patch('chatbot.jobs.index_insights').start()
+        self.enqueue = mock.patch.object(self.runner, 'enqueue').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_job_is_processed_once(self):
+        self.runner.run(self.job.pk)
+        self.assertIsNone(self.runner.run(self.job.pk))
+
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), (InsightJob.DONE, 1))
+        self.assertEqual(self.job.insight.insight, 'Asks about sleep')
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.insight, 'Asks about sleep')
+        self.assertEqual(self.llama.generate_insight.call_count, 1)
+
+    def test_only_stale_running_jobs_are_claimable(self):
+        InsightJob.objects.filter(pk=self.job.pk).update(status=InsightJob.RUNNING, attempts=1)
+        self.assertIsNone(self.runner.run(self.job.pk))
+
+        stale = timezone.now() - timedelta(seconds=self.runner.config()['stale_after'] + 1)
+        InsightJob.objects.filter(pk=self.job.pk).update(updated_at=stale)
+        self.assertEqual(self.runner.pending_jobs(), [(self.job.pk, self.job.run_after)])
+        self.assertEqual(self.runner.run(self.job.pk).attempts, 2)
+
+    def test_save_claimed_fails_after_another_worker_claims_the_job(self):
+        InsightJob.objects.filter(pk=self.job.pk).update(status=InsightJob.RUNNING, attempts=1)
+        job = InsightJob.objects.get(pk=self.job.pk)
+        InsightJob.objects.filter(pk=job.pk).update(attempts=2)
+
+        with self.assertRaises(LostClaim):
+            self.runner.save_claimed(job, last_error='late')
+        self.assertEqual(InsightJob.objects.get(pk=job.pk).last_error, '')
+
+    def test_result_of_a_lost_claim_is_rolled_back(self):
+        def reclaimed(*args, **kwargs):
+            InsightJob.objects.filter(pk=self.job.pk).update(attempts=F('attempts') + 1)
+            return INSIGHT_RESULT
+
+        self.llama.generate_insight.side_effect = reclaimed
+        self.runner.run(self.job.pk)
+
+        self.assertFalse(Insight.objects.exists())
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.insight, '')
+        self.assertEqual(InsightJob.objects.get(pk=self.job.pk).status, InsightJob.RUNNING)
+
+    def test_failures_are_retried_until_max_attempts(self):
+        self.llama.generate_insight.side_effect = ConnectionError('model server down')
+        max_attempts = self.runner.config()['max_attempts']
+        for attempt in range(1, max_attempts + 1):
+            self.runner.run(self.job.pk)
+            self.job.refresh_from_db()
+            self.assertEqual(self.job.attempts, attempt)
+            InsightJob.objects.filter(pk=self.job.pk).update(run_after=timezone.now())
+
+        self.assertEqual(self.job.status, InsightJob.FAILED)
+        self.assertEqual(self.job.last_error, 'model server down')
+        self.assertEqual(self.enqueue.call_count, max_attempts - 1)
+
+
+class InsightJobConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        self.runner = InsightJobRunner()
+        self.job = InsightJob.objects.create(session_id='s1', question='sleep?')
+
+    def test_parallel_runs_claim_the_job_once(self):
+        workers = 8
+        start = threading.Barrier(workers)
+        errors = []
+
+        def run():
+            try:
+                start.wait()
+                self.runner.run(self.job.pk)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        with mock.patch('chatbot.jobs.LLaMA') as llama, mock.patch('chatbot.jobs.index_insights'):
+            llama.return_value.generate_insight.return_value = INSIGHT_RESULT
+            threads = [threading.Thread(target=run) for _ in range(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(llama.return_value.generate_insight.call_count, 1)
+        self.assertEqual(Insight.objects.count(), 1)
+        self.assertEqual(InsightJob.objects.get(pk=self.job.pk).attempts, 1)
+
+    def test_heartbeat_refreshes_the_claim_until_it_is_lost(self):
+        stale = timezone.now() - timedelta(hours=1)
+        InsightJob.objects.filter(pk=self.job.pk).update(status=InsightJob.RUNNING, attempts=1, updated_at=stale)
+        job = InsightJob.objects.get(pk=self.job.pk)
+        heartbeat = Heartbeat(self.runner, job, 0.01)
+        heartbeat.start()
+        try:
+            deadline = time.monotonic() + 2
+            while InsightJob.objects.get(pk=job.pk).updated_at == stale and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertGreater(InsightJob.objects.get(pk=job.pk).updated_at, stale)
+
+            InsightJob.objects.filter(pk=job.pk).update(attempts=2)
+            heartbeat.join(timeout=2)
+            self.assertFalse(heartbeat.is_alive())
+        finally:
+            heartbeat.stop()
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+
+
+class FlatVectorIndexTests(TempDirMixin, SimpleTestCase):
+    def test_search_ranks_by_cosine_similarity(self):
+        index = FlatVectorIndex(os.path.join(self.base_dir, 'flat.f32'), 2)
+        index.add([1, 2, 3], [[1, 0], [0, 5], [3, 3]])
+
+        results = index.search([0, 1], 2)
+
+        self.assertEqual([record_id for record_id, _ in results], [2, 3])
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+
+    def test_an_id_written_twice_fills_one_slot(self):
+        index = FlatVectorIndex(os.path.join(self.base_dir, 'flat.f32'), 2)
+        index.add([1, 2], [[1, 0], [0, 1]])
+        index.add([1], [[1, 0.1]])
+
+        self.assertEqual([record_id for record_id, _ in index.search([1, 0], 3)], [1, 2])
+
+    def test_torn_trailing_record_is_ignored(self):
+        index = FlatVectorIndex(os.path.join(self.base_dir, 'flat.f32'), 2)
+        index.add([1], [[1, 0]])
+        with open(index.path, 'ab') as f:
+            f.write(b'\x00' * 5)
+
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.ids(), {1})
+
+    def test_missing_file_is_an_empty_index(self):
+        index = FlatVectorIndex(os.path.join(self.base_dir, 'missing.f32'), 2)
+        self.assertEqual((len(index), index.search([1, 0], 5)), (0, []))
+
+
+class InsightIndexStoreTests(TempDirMixin, SimpleTestCase):
+    def test_add_skips_ids_already_indexed(self):
+        store = InsightIndexStore(self.base_dir, 2)
+        key = store.owner_key(7, None)
+
+        self.assertEqual(store.add(key, [1, 2], [[1, 0], [0, 1]]), 2)
+        self.assertEqual(store.add(key, [2, 3], [[0, 1], [1, 1]]), 1)
+        self.assertEqual(len(store.index(key)), 3)
+
+    def test_owners_get_separate_indexes(self):
+        store = InsightIndexStore(self.base_dir, 2)
+        user_key, session_key = store.owner_key(7, 'abc'), store.owner_key(None, '../abc')
+        store.add(user_key, [1], [[1, 0]])
+        store.add(session_key, [2], [[1, 0]])
+
+        self.assertEqual(store.search(user_key, [1, 0], 5)[0][0], 1)
+        self.assertEqual(store.search(session_key, [1, 0], 5)[0][0], 2)
+        self.assertNotIn('/', session_key.replace('session-', ''))
+
+    def test_concurrent_adds_of_the_same_ids_write_them_once(self):
+        store = InsightIndexStore(self.base_dir, 2)
+        key = store.owner_key(7, None)
+        workers = 8
+        start = threading.Barrier(workers)
+        written = []
+
+        def add():
+            start.wait()
+            written.append(store.add(key, [1, 2, 3], np.eye(3, 2)))
+
+        threads = [threading.Thread(target=add) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sum(written), 3)
+        self.assertEqual(len(store.index(key)), 3)
+
+
+class InsightRetrievalTests(TempDirMixin, TestCase):
+    vectors = {'sleep': [1, 0], 'diet': [0, 1], 'naps': [0.9, 0.1]}
+
+    def setUp(self):
+        super().setUp()
+        self.user = CustomUser.objects.create_user(username='rested', password='secret')
+        mock.patch('chatbot.embeddings._store', InsightIndexStore(self.base_dir, 2)).start()
+        self.embed = mock.patch('chatbot.embeddings.embed_texts', side_effect=self.fake_embed).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def fake_embed(self, texts):
+        return np.asarray([self.vectors[text] for text in texts], dtype=np.float32)
+
+    def insight(self, text):
+        return Insight.objects.create(user=self.user, question='q', insight=text, categories=[])
+
+    def test_insights_are_embedded_once(self):
+        insights = [self.insight('sleep'), self.insight('diet')]
+
+        self.assertEqual(index_insights(insights), 2)
+        self.assertEqual(index_insights(insights + [self.insight('naps')]), 1)
+        self.assertEqual(self.embed.call_args.args[0], ['naps'])
+
+    def test_most_similar_insights_come_first(self):
+        index_insights([self.insight('diet'), self.insight('sleep'), self.insight('naps')])
+        query = mock.Mock(vector=np.asarray([1, 0], dtype=np.float32))
+
+        self.assertEqual(relevant_insights(self.user, None, query, k=2), ['sleep', 'naps'])
+
+    def test_falls_back_to_recent_insights_without_an_index(self):
+        for text in ('sleep', 'diet', 'naps'):
+            self.insight(text)
+        query = mock.Mock(vector=np.asarray([1, 0], dtype=np.float32))
+
+        self.assertEqual(relevant_insights(self.user, None, query, k=2), ['naps', 'diet'])
+
+
+def clustered_vectors(count, dim=8, clusters=4, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.eye(clusters, dim) * 10
+    return centers[np.arange(count) % clusters] + rng.normal(size=(count, dim))
+
+
+class IVFVectorIndexTests(TempDirMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = IVFVectorIndex(self.base_dir, 8)
+        self.vectors = clustered_vectors(200)
+        self.index.add(list(range(200)), self.vectors)
+
+    def ids(self, results):
+        return [record_id for record_id, _ in results]
+
+    def test_probing_every_list_matches_exact_search(self):
+        nlist = self.index.build(nlist=4)
+        query = self.vectors[5]
+
+        self.assertEqual(nlist, 4)
+        self.assertEqual(self.ids(self.index.search(query, 10, nprobe=4)),
+                         self.ids(self.index.search(query, 10, exact=True)))
+        self.assertEqual(self.ids(self.index.search(query, 1, nprobe=1)), [5])
+
+    def test_records_added_after_the_build_are_searched(self):
+        self.index.build(nlist=4)
+        self.index.add([500], [self.vectors[7] * 2])
+
+        self.assertIn(500, self.ids(self.index.search(self.vectors[7], 2, nprobe=1)))
+
+    def test_deleted_ids_are_skipped_and_compacted_by_the_next_build(self):
+        self.index.build(nlist=4)
+        self.index.delete([5, 6])
+
+        self.assertNotIn(5, self.ids(self.index.search(self.vectors[5], 200, nprobe=4)))
+        self.index.build(nlist=4)
+        self.assertEqual(len(self.index), 198)
+        self.assertFalse(os.path.exists(self.index.tombstone_path))
+        self.assertNotIn(5, self.index.flat.ids())
+
+    def test_readers_reopen_rebuilt_and_removed_files(self):
+        reader = IVFVectorIndex(self.base_dir, 8)
+        self.index.build(nlist=4)
+        self.assertEqual(self.ids(reader.search(self.vectors[5], 1, nprobe=1)), [5])
+
+        self.index.delete([5])
+        self.index.build(nlist=2)
+        self.assertEqual(len(reader._load()['centroids']), 2)
+        self.assertNotIn(5, self.ids(reader.search(self.vectors[5], 5, nprobe=2)))
+
+        shutil.rmtree(self.base_dir)
+        self.assertEqual(reader.search(self.vectors[5], 5), [])
+
+
+class ChunkStreamTests(SimpleTestCase):
+    def test_chunks_split_on_whitespace_and_overlap(self):
+        text = ' '.join(f"word{i}" for i in range(200))
+        chunks = list(chunk_stream(iter([text[:300], text[300:]]), 100, 20))
+
+        self.assertTrue(all(len(chunk) <= 100 for chunk in chunks))
+        self.assertTrue(all(not chunk.startswith('ord') for chunk in chunks))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertIn(chunk.split()[0], previous.split())
+        self.assertEqual(chunks[-1].split()[-1], 'word199')
+
+    def test_overlap_must_be_under_half_the_size(self):
+        with self.assertRaises(ValueError):
+            list(chunk_stream(iter(['text']), 100, 50))
+
+
+class CorpusIngestionTests(TempDirMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.index = IVFVectorIndex(os.path.join(self.base_dir, 'corpus'), 8)
+        mock.patch('chatbot.corpus._index', self.index).start()
+        mock.patch('chatbot.corpus.embed_texts', side_effect=self.fake_embed).start()
+        self.addCleanup(mock.patch.stopall)
+        self.path = os.path.join(self.base_dir, 'guide.txt')
+
+    def fake_embed(self, texts):
+        return np.asarray([[text.count('sleep'), text.count('diet'), 1, 0, 0, 0, 0, 0] for text in texts],
+                          dtype=np.float32)
+
+    def write(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+
+    def test_unchanged_files_are_skipped(self):
+        self.write('sleep well')
+        self.assertEqual(CorpusIngestor().ingest(self.path), 1)
+        self.assertIsNone(CorpusIngestor().ingest(self.path))
+
+    @override_settings(CHATBOT_CORPUS={'min_score': 0})
+    def test_reingested_file_replaces_its_passages(self):
+        self.write('sleep sleep sleep')
+        CorpusIngestor().ingest(self.path)
+        old_chunk = DocumentChunk.objects.get()
+        self.write('diet diet diet')
+        CorpusIngestor().ingest(self.path)
+
+        self.assertEqual(Document.objects.get().chunk_count, 1)
+        self.assertIn(old_chunk.pk, self.index.tombstones())
+        passages = retrieve_passages(mock.Mock(vector=np.asarray([1, 0, 0, 0, 0, 0, 0, 0], dtype=np.float32)))
+        self.assertEqual([passage['text'] for passage in passages], ['diet diet diet'])
+
+
+class MetricsEndpointTests(TestCase):
+    def test_local_scrapers_are_allowed(self):
+        self.client.get('/metrics')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_requests_total', response.content)
+
+    def test_remote_clients_are_forbidden(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+
+    @override_settings(METRICS_ACCESS={'token': 's3cret'})
+    def test_remote_scrapers_need_the_token(self):
+        remote = {'REMOTE_ADDR': '203.0.113.9'}
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret', **remote).status_code, 200)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer guess', **remote).status_code, 403)
+
+    def test_staff_users_are_allowed(self):
+        staff = CustomUser.objects.create_user(username='ops', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 200)
+
+
+class RequestTimingMiddlewareTests(SimpleTestCase):
+    def test_requests_are_counted_by_route_and_status(self):
+        counter = metrics.counter('http_requests_total', endpoint='/metrics', method='GET', status='403')
+        before = counter.value
+        self.client.get('/metrics', REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(counter.value, before + 1)
+
+    def test_request_id_is_reused_as_trace_id(self):
+        response = self.client.get('/metrics', HTTP_X_REQUEST_ID='req-42')
+        self.assertEqual(response['X-Trace-Id'], 'req-42')
+        self.assertTrue(self.client.get('/metrics')['X-Trace-Id'])
+        self.assertIsNone(current_trace_id())
+
+    def stream_through_middleware(self, close_early=False):
+        seen = []
+
+        def body():
+            for part in ('a', 'b'):
+                seen.append(current_trace_id())
+                yield part
+
+        middleware = RequestTimingMiddleware(lambda request: StreamingHttpResponse(body()))
+        response = middleware(RequestFactory().get('/stream', HTTP_X_REQUEST_ID='stream-1'))
+        self.assertEqual(current_trace_id(), 'stream-1')
+        if close_early:
+            response.close()
+        else:
+            self.assertEqual(b''.join(response.streaming_content), b'ab')
+        return seen
+
+    def test_streaming_trace_stays_bound_until_the_body_ends(self):
+        self.assertEqual(self.stream_through_middleware(), ['stream-1', 'stream-1'])
+        self.assertIsNone(current_trace_id())
+
+    def test_streaming_trace_ends_when_the_server_closes_the_response(self):
+        self.assertEqual(self.stream_through_middleware(close_early=True), [])
+        self.assertIsNone(current_trace_id())
+
+    def test_async_streaming_trace_ends_with_the_body(self):
+        async def body():
+            yield current_trace_id()
+
+        async def get_response(request):
+            return StreamingHttpResponse(body())
+
+        async def run():
+            middleware = RequestTimingMiddleware(get_response)
+            response = await middleware(RequestFactory().get('/stream', HTTP_X_REQUEST_ID='stream-2'))
+            parts = [part async for part in response.streaming_content]
+            return parts, current_trace_id()
+
+        self.assertEqual(asyncio.run(run()), ([b'stream-2'], None))
+
+
+class NodePoolTests(SimpleTestCase):
+    def pool(self, *nodes, **options):
+        options.setdefault('acquire_timeout', 5)
+        return NodePool(list(nodes) or [Node('http://a', max_concurrency=1)], **options)
+
+    def test_least_outstanding_balances_by_weight(self):
+        light, heavy = Node('http://a'), Node('http://b', weight=2)
+        pool = self.pool(light, heavy)
+        for _ in range(6):
+            pool.acquire()
+        self.assertEqual((light.outstanding, heavy.outstanding), (2, 4))
+
+    def test_weighted_round_robin_is_smooth(self):
+        a, b = Node('http://a', weight=2), Node('http://b')
+        pool = self.pool(a, b, balancing='weighted_round_robin')
+        picks = []
+        for _ in range(6):
+            node = pool.acquire()
+            picks.append(node.url)
+            pool.release(node, ok=True)
+        self.assertEqual(picks, ['http://a', 'http://b', 'http://a'] * 2)
+
+    def test_full_nodes_are_skipped(self):
+        full, free = Node('http://a', max_concurrency=1), Node('http://b', max_concurrency=1)
+        pool = self.pool(full, free)
+        self.assertIs(pool.acquire(), full)
+        self.assertIs(pool.acquire(), free)
+        self.assertIsNone(pool.try_acquire())
+
+    def test_nodes_are_ejected_after_consecutive_failures_and_come_back(self):
+        node = Node('http://a')
+        pool = self.pool(node, eject_after_failures=2, eject_seconds=0.05, acquire_timeout=0.01)
+        ejections = metrics.counter('llm_node_ejections_total', node='http://a')
+        before = ejections.value
+
+        pool.release(pool.acquire(), ok=False)
+        pool.release(pool.acquire(), ok=True)
+        pool.release(pool.acquire(), ok=False)
+        self.assertTrue(node.healthy)
+        pool.release(pool.acquire(), ok=False)
+
+        self.assertFalse(node.healthy)
+        self.assertEqual(ejections.value, before + 1)
+        with self.assertRaises(BackendUnavailable):
+            pool.acquire()
+        time.sleep(0.06)
+        self.assertIs(pool.try_acquire(), node)
+
+    def test_waiters_are_woken_by_release_from_another_thread(self):
+        pool = self.pool()
+        node = pool.acquire()
+        threading.Timer(0.05, pool.release, args=(node, True)).start()
+
+        started = time.monotonic()
+        self.assertIs(pool.acquire(), node)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+    def test_async_waiters_are_woken_by_release_from_another_thread(self):
+        pool = self.pool()
+        node = pool.acquire()
+
+        async def wait():
+            threading.Timer(0.05, pool.release, args=(node, True)).start()
+            started = time.monotonic()
+            acquired = await pool.aacquire()
+            return acquired, time.monotonic() - started
+
+        acquired, waited = asyncio.run(wait())
+        self.assertIs(acquired, node)
+        self.assertLess(waited, 0.5)
+
+    def test_async_waiters_are_woken_when_a_node_is_marked_healthy(self):
+        node = Node('http://a')
+        pool = self.pool(node, eject_after_failures=1, eject_seconds=60)
+        pool.release(pool.acquire(), ok=False)
+
+        async def wait():
+            threading.Timer(0.05, pool.mark_healthy, args=(node,)).start()
+            started = time.monotonic()
+            await pool.aacquire()
+            return time.monotonic() - started
+
+        self.assertLess(asyncio.run(wait()), 0.5)
+
+    def test_async_acquire_times_out(self):
+        pool = self.pool(acquire_timeout=0.05)
+        pool.acquire()
+        with self.assertRaises(BackendUnavailable):
+            asyncio.run(pool.aacquire())
+        self.assertFalse(pool._async_waiters)
+
+    def test_concurrent_callers_never_exceed_node_capacity(self):
+        nodes = [Node('http://a', max_concurrency=2), Node('http://b', max_concurrency=3)]
+        pool = self.pool(*nodes)
+        peak = {node.url: 0 for node in nodes}
+        lock = threading.Lock()
+
+        def call():
+            for _ in range(20):
+                node = pool.acquire()
+                with lock:
+                    peak[node.url] = max(peak[node.url], node.outstanding)
+                time.sleep(0.001)
+                pool.release(node, ok=True)
+
+        threads = [threading.Thread(target=call) for _ in range(12)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(peak, {'http://a': 2, 'http://b': 3})
+        self.assertEqual([node.outstanding for node in nodes], [0, 0])
+
+
+class HTTPBackendFailoverTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = OllamaBackend({**DEFAULT_LLM_BACKEND, 'nodes': [{'url': 'http://a'}, {'url': 'http://b'}],
+                                      'acquire_timeout': 0.01})
+        self.client = mock.Mock()
+        patcher = mock.patch('chatbot.backends.get_client', return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def respond(self, **outcomes):
+        def post(url, **kwargs):
+            outcome = outcomes[url.split('//')[1].split('/')[0]]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return mock.Mock(status_code=200, json=mock.Mock(return_value={'message': {'content': outcome}}))
+
+        self.client.post.side_effect = post
+
+    def test_connection_errors_fail_over_to_another_node(self):
+        self.respond(a=requests.exceptions.ConnectionError('refused'), b='from b')
+        self.assertEqual(self.backend.chat('hi'), 'from b')
+        self.assertEqual([node.failures for node in self.backend.pool.nodes], [1, 0])
+
+    def test_read_timeouts_do_not_fail_over(self):
+        self.respond(a=requests.exceptions.ReadTimeout('slow'), b='from b')
+        with self.assertRaises(requests.exceptions.ReadTimeout):
+            self.backend.chat('hi')
+        self.assertEqual(self.client.post.call_count, 1)
+        self.assertEqual([node.outstanding for node in self.backend.pool.nodes], [0, 0])
+
+    def test_failover_is_bounded(self):
+        self.respond(a=requests.exceptions.ConnectionError('refused'), b=requests.exceptions.ConnectionError('refused'))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.backend.chat('hi')
+        self.assertEqual(self.client.post.call_count, 2)
@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import ChatbotView, MessagesView, AnonymousMessagesView
+from .views import ChatbotView, AsyncChatbotView, MessagesView, AnonymousMessagesView, InsightJobStatusView, ReadinessView
 
 
 urlpatterns = [
     path('chat/', ChatbotView.as_view(), name='chatbot'),
+    path('chat/async/', AsyncChatbotView.as_view(), name='chatbot-async'),
     path('messages/', MessagesView.as_view(), name='messages'),
     path('messages/anonymous/', AnonymousMessagesView.as_view(), name='anonymous-messages'),
+    path('insights/jobs/<int:job_id>/', InsightJobStatusView.as_view(), name='insight-job-status'),
+    path('ready/', ReadinessView.as_view(), name='ready'),
 ]
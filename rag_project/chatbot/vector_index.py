@@ -0,0 +1,281 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+
+def record_dtype(dim):
+    return np.dtype([('id', '<i8'), ('vector', '<f4', (dim,))])
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores, best first."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class FlatVectorIndex:
+    """Append-only file of (id, float32 vector) records searched by exact cosine similarity.
+
+    Vectors are L2-normalised on write, so a search is one memory-mapped
+    matrix-vector product. A torn trailing record from a crash is ignored.
+    """
+
+    def __init__(self, path, dim):
+        self.path = path
+        self.dim = dim
+        self.dtype = record_dtype(dim)
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // self.dtype.itemsize
+        except FileNotFoundError:
+            return 0
+
+    def add(self, ids, vectors):
+        records = np.empty(len(ids), dtype=self.dtype)
+        records['id'] = ids
+        records['vector'] = normalize(vectors)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.write(records.tobytes())
+
+    def records(self):
+        count = len(self)
+        if not count:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode='r', shape=(count,))
+
+    def ids(self):
+        return set(self.records()['id'].tolist())
+
+    def search(self, query, k):
+        records = self.records()
+        if not len(records):
+            return []
+        # Only the first record of an id counts, so an id written twice cannot fill two slots.
+        _, first = np.unique(records['id'], return_index=True)
+        if len(first) < len(records):
+            records = records[np.sort(first)]
+        scores = records['vector'] @ normalize(query)
+        best = top_k(scores, k)
+        return [(int(records['id'][i]), float(scores[i])) for i in best]
+
+
+class InsightIndexStore:
+    """One FlatVectorIndex per user or anonymous session under a base directory."""
+
+    def __init__(self, base_dir, dim):
+        self.base_dir = str(base_dir)
+        self.dim = dim
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    @staticmethod
+    def owner_key(user_id, session_id):
+        if user_id is not None:
+            return f"user-{user_id}"
+        return 'session-' + hashlib.sha1(str(session_id).encode('utf-8')).hexdigest()
+
+    def index(self, key):
+        return FlatVectorIndex(os.path.join(self.base_dir, 'insights', f"{key}.f32"), self.dim)
+
+    def lock(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def add(self, key, ids, vectors):
+        """Appends the vectors whose ids are not in the index yet; returns how many were written."""
+        with self.lock(key):
+            index = self.index(key)
+            existing = index.ids()
+            keep = [i for i, record_id in enumerate(ids) if record_id not in existing]
+            if keep:
+                index.add([ids[i] for i in keep], np.asarray(vectors)[keep])
+            return len(keep)
+
+    def search(self, key, query, k):
+        return self.index(key).search(query, k)
+
+
+def kmeans(vectors, nlist, iterations=10, seed=0):
+    """Spherical k-means on normalised vectors; returns normalised centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+            else:
+                centroids[cluster] = vectors[rng.integers(len(vectors))]
+        centroids = normalize(centroids)
+    return centroids
+
+
+class IVFVectorIndex:
+    """Inverted-file ANN index layered over a FlatVectorIndex.
+
+    ``build`` clusters the flat records into ``nlist`` lists and writes the
+    vectors grouped by list as .npy files that are memory-mapped at query
+    time. A search scores the query against the centroids, scans only the
+    ``nprobe`` closest lists, and also scans exactly any records appended
+    after the last build.
+
+    ``delete`` appends ids to a tombstone file; searches skip them and the
+    next ``build`` drops them from the records. Searches notice when another
+    process rebuilt or removed the files and re-open them. Writes (add,
+    delete, build) are expected to come from a single process, the ingest
+    command.
+    """
+
+    def __init__(self, base_dir, dim):
+        self.base_dir = str(base_dir)
+        self.dim = dim
+        self.flat = FlatVectorIndex(os.path.join(self.base_dir, 'records.f32'), dim)
+        self._loaded = None
+        self._tombstones = None
+
+    def _path(self, name):
+        return os.path.join(self.base_dir, f"ivf_{name}.npy")
+
+    @property
+    def tombstone_path(self):
+        return os.path.join(self.base_dir, 'tombstones.i64')
+
+    def __len__(self):
+        return len(self.flat)
+
+    def add(self, ids, vectors):
+        self.flat.add(ids, vectors)
+
+    def delete(self, ids):
+        if not len(ids):
+            return
+        os.makedirs(self.base_dir, exist_ok=True)
+        with open(self.tombstone_path, 'ab') as f:
+            f.write(np.asarray(ids, dtype='<i8').tobytes())
+
+    def tombstones(self):
+        try:
+            stat = os.stat(self.tombstone_path)
+        except FileNotFoundError:
+            return np.empty(0, dtype=np.int64)
+        version = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if self._tombstones is None or self._tombstones[0] != version:
+            self._tombstones = (version, np.fromfile(self.tombstone_path, dtype='<i8'))
+        return self._tombstones[1]
+
+    def build(self, nlist=None, train_size=50000, chunk_size=65536):
+        records = self._compact()
+        count = len(records)
+        if not count:
+            return 0
+        nlist = min(nlist or max(1, int(np.sqrt(count))), count)
+        rng = np.random.default_rng(0)
+        sample = records['vector'][np.sort(rng.choice(count, size=min(train_size, count), replace=False))]
+        centroids = kmeans(np.asarray(sample), nlist)
+
+        assignments = np.empty(count, dtype=np.int32)
+        for start in range(0, count, chunk_size):
+            block = records['vector'][start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=offsets[1:])
+
+        vectors_out = np.lib.format.open_memmap(self._path('vectors.tmp'), mode='w+', dtype=np.float32,
+                                                shape=(count, self.dim))
+        ids_out = np.empty(count, dtype=np.int64)
+        for start in range(0, count, chunk_size):
+            rows = order[start:start + chunk_size]
+            vectors_out[start:start + len(rows)] = records['vector'][rows]
+            ids_out[start:start + len(rows)] = records['id'][rows]
+        vectors_out.flush()
+        del vectors_out
+        np.save(self._path('ids.tmp'), ids_out)
+        np.save(self._path('offsets.tmp'), offsets)
+        np.save(self._path('centroids.tmp'), centroids)
+        for name in ('ids', 'offsets', 'centroids', 'vectors'):
+            os.replace(self._path(f"{name}.tmp"), self._path(name))
+        self._loaded = None
+        return nlist
+
+    def _compact(self, chunk_size=65536):
+        """Rewrites the flat records without tombstoned ids and clears the tombstones."""
+        records = self.flat.records()
+        dead = self.tombstones()
+        if not len(dead):
+            return records
+        tmp_path = self.flat.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for start in range(0, len(records), chunk_size):
+                block = records[start:start + chunk_size]
+                f.write(block[~np.isin(block['id'], dead)].tobytes())
+        # The records are replaced before the IVF files, so a reader holding the old lists never
+        # treats old records as an unbuilt tail.
+        os.replace(tmp_path, self.flat.path)
+        os.remove(self.tombstone_path)
+        return self.flat.records()
+
+    def _load(self):
+        try:
+            stat = os.stat(self._path('vectors'))
+        except FileNotFoundError:
+            self._loaded = None
+            return None
+        version = (stat.st_ino, stat.st_mtime_ns)
+        loaded = self._loaded
+        if loaded is None or loaded['version'] != version:
+            loaded = {
+                name: np.load(self._path(name), mmap_mode='r')
+                for name in ('centroids', 'offsets', 'ids', 'vectors')
+            }
+            loaded['version'] = version
+            self._loaded = loaded
+        return loaded
+
+    def search(self, query, k, nprobe=8, exact=False):
+        """Best k (id, score) pairs; ``exact`` scans every record instead of the closest lists."""
+        query = normalize(query)
+        built = None if exact else self._load()
+
+        candidates_ids = []
+        candidates_scores = []
+        if built is None:
+            tail = self.flat.records()
+        else:
+            lists = top_k(built['centroids'] @ query, nprobe)
+            for cluster in lists:
+                start, end = int(built['offsets'][cluster]), int(built['offsets'][cluster + 1])
+                if start == end:
+                    continue
+                candidates_scores.append(built['vectors'][start:end] @ query)
+                candidates_ids.append(built['ids'][start:end])
+            tail = self.flat.records()[len(built['ids']):]
+        if len(tail):
+            candidates_scores.append(tail['vector'] @ query)
+            candidates_ids.append(tail['id'])
+
+        if not candidates_scores:
+            return []
+        scores = np.concatenate(candidates_scores)
+        ids = np.concatenate(candidates_ids)
+        dead = self.tombstones()
+        if len(dead):
+            live = ~np.isin(ids, dead)
+            scores, ids = scores[live], ids[live]
+        best = top_k(scores, k)
+        return [(int(ids[i]), float(scores[i])) for i in best]
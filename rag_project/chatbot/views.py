@@ -1,135 +1,324 @@
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from accounts.models import CustomUser
-from .models import Message, Insight, UserProfile, AnonymousInteraction
-from .serializers import MessageSerializer, InsightSerializer, AnonymousInteractionSerializer
-from .llama import LLaMA
-from transformers import pipeline
-import re
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Insight, InsightJob, AnonymousInteraction
+from .serializers import MessageSerializer
+from .llama import LLaMA, AsyncLLaMA
+from .nlp import registry, batcher
+from .jobs import insight_jobs, jobs_config
+from .taxonomy import categorize
+from .profile_stats import update_profile
+from .pagination import paginated_history
+from .embeddings import LazyEmbedding, index_insights, relevant_insights
+from .corpus import retrieve_passages
+from .queries import messages_for
+from rag_project.tracing import span
+from .conversations import save_message
+from .admission import AdmissionRejected, AdmittedStream, admission, admission_client
+import json
 import uuid
 
 class ChatbotView(APIView):
     permission_classes = [AllowAny]
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.sentiment_analyzer = pipeline('sentiment-analysis')
-        self.emotion_analyzer = pipeline('text-classification', model='bhadresh-savani/distilbert-base-uncased-emotion')
-
     def analyze_question(self, question):
-        sentiment = self.sentiment_analyzer(question)[0]
-        emotion = self.emotion_analyzer(question)[0]
-        categories = self.categorize_insight(question)
+        with span('analyze_question'):
+            sentiment, emotion = batcher.analyze(question)
+            categories = self.categorize_insight(question)
         return sentiment, emotion, categories
 
     def categorize_insight(self, text):
-        categories = []
-        if re.search(r'\b(productivity|efficient|focus)\b', text, re.IGNORECASE):
-            categories.append('Productivity')
-        if re.search(r'\b(health|wellness|fitness)\b', text, re.IGNORECASE):
-            categories.append('Health')
-        if re.search(r'\b(relationship|social|communication)\b', text, re.IGNORECASE):
-            categories.append('Relationships')
-        return categories
+        return categorize(text)
 
     def update_user_profile(self, user, sentiment, emotion, categories):
-        profile, created = UserProfile.objects.get_or_create(user=user)
-        profile.sentiment_scores.update({str(len(profile.sentiment_scores)): sentiment})
-        profile.personality_traits.update({
-            emotion['label']: profile.personality_traits.get(emotion['label'], 0) + emotion['score']
-        })
-        for category in categories:
-            profile.interaction_patterns[category] = profile.interaction_patterns.get(category, 0) + 1
-        profile.save()
-
-    def post(self, request):
-        user = request.user if request.user.is_authenticated else None
-        message = request.data.get('message')
-        session_id = request.data.get('session_id', str(uuid.uuid4()))  # Generate or use provided session ID
-
-        if not message or not isinstance(message, str):
-            return Response({'error': 'Message is required and must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+        return update_profile(user, sentiment, emotion, categories)
 
+    def prepare_chat(self, user, message, session_id, analysis=None):
+        """Retrieval and NLP analysis for a chat; read-only, so it can run before admission."""
         # Fetch previous insights
-        if user:
-            previous_insights = [i.insight for i in user.insights.all()]
-        else:
-            previous_insights = [i.insight for i in Insight.objects.filter(session_id=session_id)]
+        query = LazyEmbedding(message)
+        with span('retrieval'):
+            previous_insights = relevant_insights(user, session_id, query)
+            passages = retrieve_passages(query)
 
         # Perform NLP analysis
-        question_sentiment, question_emotion, question_categories = self.analyze_question(message)
+        if analysis is None:
+            analysis = self.analyze_question(message)
+        question_sentiment, question_emotion, question_categories = analysis
 
-        # Update user profile or save anonymous interaction
-        if user:
-            self.update_user_profile(user, question_sentiment, question_emotion, question_categories)
-        else:
-            AnonymousInteraction.objects.create(
-                session_id=session_id,
-                question=message,
-                question_sentiment=question_sentiment,
-                question_emotion=question_emotion,
-                question_categories=question_categories
-            )
-
-        # Generate response from LLaMA
-        profile_data = None
-        if user:
-            user_profile = getattr(user, 'profile', None)
-            profile_data = {
-                'sentiment_scores': user_profile.sentiment_scores if user_profile else {},
-                'personality_traits': user_profile.personality_traits if user_profile else {},
-                'interaction_patterns': user_profile.interaction_patterns if user_profile else {}
-            }
+        return {
+            'user': user,
+            'message': message,
+            'session_id': session_id,
+            'previous_insights': previous_insights,
+            'passages': [passage['text'] for passage in passages],
+            'profile_data': None,
+            'question_sentiment': question_sentiment,
+            'question_emotion': question_emotion,
+            'question_categories': question_categories,
+        }
 
-        llama = LLaMA()
-        try:
-            result = llama.chat(message, previous_insights, profile_data=profile_data)
-            chatbot_response = result['answer']
-            insight_text = result['insight']['insight']
-            categories = result['insight']['categories']
+    def record_question(self, chat):
+        """Folds an admitted chat's analysis into the user profile, or saves the anonymous interaction."""
+        user = chat['user']
+        with span('orm_profile'):
+            if user:
+                profile = self.update_user_profile(user, chat['question_sentiment'], chat['question_emotion'],
+                                                   chat['question_categories'])
+                chat['profile_data'] = {
+                    'sentiment_scores': profile.sentiment_scores,
+                    'personality_traits': profile.personality_traits,
+                    'interaction_patterns': profile.interaction_patterns
+                }
+            else:
+                AnonymousInteraction.objects.create(
+                    session_id=chat['session_id'],
+                    question=chat['message'],
+                    question_sentiment=chat['question_sentiment'],
+                    question_emotion=chat['question_emotion'],
+                    question_categories=chat['question_categories']
+                )
+        return chat
 
-            # Save message and insight
-            Message.objects.create(
-                user=user,
-                session_id=session_id if not user else None,
-                user_message=message,
+    def save_chat(self, chat, chatbot_response, insight_text, categories):
+        user = chat['user']
+        session_id = chat['session_id']
+        with span('orm_write'):
+            save_message(
+                user,
+                session_id,
+                user_message=chat['message'],
                 chatbot_response=chatbot_response,
                 insight=insight_text
             )
-            Insight.objects.create(
+            insight = Insight.objects.create(
                 user=user,
                 session_id=session_id if not user else None,
-                question=message,
+                question=chat['message'],
                 insight=insight_text,
                 categories=categories,
-                question_sentiment=question_sentiment,
-                question_emotion=question_emotion,
-                question_categories=question_categories
+                question_sentiment=chat['question_sentiment'],
+                question_emotion=chat['question_emotion'],
+                question_categories=chat['question_categories']
             )
+        with span('index_insight'):
+            index_insights([insight])
+        return self.response_data(chat, chatbot_response, insight_text, categories)
 
-            response_data = {
-                'session_id': session_id if not user else None,
-                'chatbotResponse': chatbot_response,
-                'insight': insight_text,
-                'categories': categories,
-                'anonymous': user is None,
-                'question_sentiment': question_sentiment,
-                'question_emotion': question_emotion,
-                'question_categories': question_categories
-            }
+    def save_deferred_chat(self, chat, chatbot_response):
+        """Saves the answer now and queues the insight for the background runner."""
+        user = chat['user']
+        with span('orm_write'), transaction.atomic():
+            message = save_message(
+                user,
+                chat['session_id'],
+                user_message=chat['message'],
+                chatbot_response=chatbot_response,
+                insight=''
+            )
+            job = InsightJob.objects.create(
+                user=user,
+                session_id=message.session_id,
+                message=message,
+                question=chat['message'],
+                previous_insights=chat['previous_insights'],
+                question_sentiment=chat['question_sentiment'],
+                question_emotion=chat['question_emotion'],
+                question_categories=chat['question_categories'],
+                use_cache=chat.get('use_cache', True)
+            )
+            transaction.on_commit(lambda: insight_jobs.enqueue(job.pk))
+        data = self.response_data(chat, chatbot_response, '', [])
+        data['insight_job'] = {'id': job.pk, 'status': job.status}
+        return data
+
+    def response_data(self, chat, chatbot_response, insight_text, categories):
+        user = chat['user']
+        return {
+            'session_id': chat['session_id'] if not user else None,
+            'chatbotResponse': chatbot_response,
+            'insight': insight_text,
+            'categories': categories,
+            'anonymous': user is None,
+            'question_sentiment': chat['question_sentiment'],
+            'question_emotion': chat['question_emotion'],
+            'question_categories': chat['question_categories']
+        }
+
+    def wants_stream(self, request):
+        stream = as_bool(request.data.get('stream', False))
+        return stream or 'text/event-stream' in request.headers.get('Accept', '')
+
+    def post(self, request):
+        user = request.user if request.user.is_authenticated else None
+        message = request.data.get('message')
+        session_id = request.data.get('session_id', str(uuid.uuid4()))  # Generate or use provided session ID
+
+        if not message or not isinstance(message, str):
+            return Response({'error': 'Message is required and must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+
+        chat = self.prepare_chat(user, message, session_id)
+        chat['use_cache'] = cache_allowed(request.data, request.headers)
+
+        # Retrieval and NLP above are read-only; nothing is written for a chat that admission turns away.
+        try:
+            permit = admission.acquire(admission_client(user, session_id))
+        except AdmissionRejected as e:
+            return Response({'error': str(e)}, status=e.status_code, headers=e.headers)
+        try:
+            self.record_question(chat)
+            if self.wants_stream(request):
+                return self.stream_chat(chat, permit)
+        except Exception:
+            permit.release()
+            raise
+
+        # Generate response from LLaMA
+        llama = LLaMA()
+        try:
+            if jobs_config()['deferred']:
+                with permit:
+                    answer = llama.answer(message, chat['profile_data'], use_cache=chat['use_cache'],
+                                          passages=chat['passages'])
+                return Response(self.save_deferred_chat(chat, answer), status=status.HTTP_200_OK)
+            with permit:
+                result = llama.chat(message, chat['previous_insights'], profile_data=chat['profile_data'],
+                                    use_cache=chat['use_cache'], passages=chat['passages'])
+            response_data = self.save_chat(
+                chat, result['answer'], result['insight']['insight'], result['insight']['categories']
+            )
             return Response(response_data, status=status.HTTP_200_OK)
         except Exception as e:
             return Response({'error': f'Failed to process response: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def stream_chat(self, chat, permit):
+        """Relays answer tokens as server-sent events, then saves the chat and sends a final ``done`` event."""
+        llama = LLaMA()
+
+        def events():
+            tokens = []
+            try:
+                for token in llama.stream(chat['message'], profile_data=chat['profile_data'],
+                                          use_cache=chat['use_cache'], passages=chat['passages']):
+                    tokens.append(token)
+                    yield sse_event('token', {'content': token})
+                if jobs_config()['deferred']:
+                    response_data = self.save_deferred_chat(chat, ''.join(tokens).strip())
+                else:
+                    insight = llama.generate_insight(chat['message'], chat['previous_insights'], chat['use_cache'])
+                    response_data = self.save_chat(
+                        chat, ''.join(tokens).strip(), insight['insight'], insight['categories']
+                    )
+                yield sse_event('done', response_data)
+            except Exception as e:
+                yield sse_event('error', {'error': f'Failed to process response: {str(e)}'})
+
+        # The slot is held until the response is closed, i.e. the whole stream has been sent.
+        response = StreamingHttpResponse(AdmittedStream(events(), permit), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncChatbotView(View):
+    """ASGI-native chat endpoint.
+
+    NLP results are awaited from the shared batcher, both Ollama calls run
+    concurrently and ORM work is pushed off the event loop, so one worker can
+    hold many in-flight chats without a thread each. With deferred insights
+    only the answer call runs and the insight is queued, as on ``/chat/``.
+    """
+
+    async def post(self, request):
+        try:
+            user = await sync_to_async(authenticate_jwt)(request)
+        except AuthenticationFailed as e:
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            return JsonResponse(detail, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+        message = data.get('message')
+        session_id = data.get('session_id', str(uuid.uuid4()))
+        if not message or not isinstance(message, str):
+            return JsonResponse({'error': 'Message is required and must be a string'}, status=status.HTTP_400_BAD_REQUEST)
+
+        view = ChatbotView()
+        with span('analyze_question'):
+            sentiment, emotion = await batcher.analyze_async(message)
+            analysis = (sentiment, emotion, view.categorize_insight(message))
+        chat = await sync_to_async(view.prepare_chat)(user, message, session_id, analysis)
+        chat['use_cache'] = cache_allowed(data, request.headers)
+
+        try:
+            permit = await admission.aacquire(admission_client(user, session_id))
+        except AdmissionRejected as e:
+            return JsonResponse({'error': str(e)}, status=e.status_code, headers=e.headers)
+        try:
+            await sync_to_async(view.record_question)(chat)
+        except Exception:
+            permit.release()
+            raise
+
+        llama = AsyncLLaMA()
+        try:
+            if jobs_config()['deferred']:
+                with permit:
+                    answer = await llama.answer(message, chat['profile_data'], use_cache=chat['use_cache'],
+                                                passages=chat['passages'])
+                response_data = await sync_to_async(view.save_deferred_chat)(chat, answer)
+                return JsonResponse(response_data, status=status.HTTP_200_OK)
+            with permit:
+                result = await llama.chat(message, chat['previous_insights'],
+                                          profile_data=chat['profile_data'], use_cache=chat['use_cache'],
+                                          passages=chat['passages'])
+            response_data = await sync_to_async(view.save_chat)(
+                chat, result['answer'], result['insight']['insight'], result['insight']['categories']
+            )
+            return JsonResponse(response_data, status=status.HTTP_200_OK)
+        except Exception as e:
+            return JsonResponse({'error': f'Failed to process response: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def authenticate_jwt(request):
+    result = JWTAuthentication().authenticate(request)
+    return result[0] if result else None
+
+
+def as_bool(value):
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def cache_allowed(data, headers):
+    """Per-request LLM cache bypass via ``"cache": false`` or ``Cache-Control: no-cache``."""
+    if 'no-cache' in headers.get('Cache-Control', ''):
+        return False
+    return as_bool(data.get('cache', True))
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 class MessagesView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        messages = Message.objects.filter(user=request.user)
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginated_history(self, request, messages_for(request.user, None), MessageSerializer)
     
 class AnonymousMessagesView(APIView):
     permission_classes = [AllowAny]
@@ -139,6 +328,39 @@ class AnonymousMessagesView(APIView):
         if not session_id:
             return Response({'error': 'session_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        messages = Message.objects.filter(session_id=session_id)
-        serializer = MessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return paginated_history(self, request, messages_for(None, session_id), MessageSerializer)
+
+
+class InsightJobStatusView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request, job_id):
+        job = InsightJob.objects.select_related('insight').filter(pk=job_id).first()
+        if job is None:
+            return Response({'error': 'Insight job not found'}, status=status.HTTP_404_NOT_FOUND)
+        if job.user_id:
+            allowed = request.user.is_authenticated and request.user.pk == job.user_id
+        else:
+            allowed = job.session_id == request.query_params.get('session_id')
+        if not allowed:
+            return Response({'error': 'Insight job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        data = {
+            'id': job.pk,
+            'status': job.status,
+            'attempts': job.attempts,
+            'insight': job.insight.insight if job.insight else None,
+            'categories': job.insight.categories if job.insight else [],
+        }
+        if job.status == InsightJob.FAILED:
+            data['error'] = job.last_error
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ReadinessView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        ready = registry.ready
+        return Response({'nlp_models_ready': ready},
+                        status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,199 @@
+"""Drives the chat, history and login endpoints at fixed concurrency levels and writes a JSON report.
+
+    python -m loadtest.run --base-url http://127.0.0.1:8000 --concurrency 1 8 32 --duration 30 \\
+        --output reports/$(git rev-parse --short HEAD).json --baseline reports/previous.json
+
+Each scenario runs for ``--duration`` seconds per concurrency level with one
+user per worker. The report has a stable layout (results[scenario][level])
+so two runs can be diffed directly or compared with ``--baseline``.
+"""
+import argparse
+import json
+import math
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import httpx
+
+SCENARIOS = ('login', 'chat', 'chat_stream', 'messages')
+PASSWORD = 'load-test-password'
+MESSAGES = [
+    'How can I stay focused while working from home?',
+    'What are good habits for better sleep?',
+    'How do I keep in touch with old friends?',
+    'Any tips for staying healthy on a busy schedule?',
+]
+
+
+def percentile(ordered, q):
+    """Nearest-rank percentile, the same definition as rag_project.metrics.Histogram."""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))]
+
+
+class LoadUser:
+    def __init__(self, client, username):
+        self.client = client
+        self.username = username
+        self.token = None
+        self.session_id = str(uuid.uuid4())
+        self.sent = 0
+
+    def setup(self):
+        self.client.post('/api/accounts/register/', json={'username': self.username, 'password': PASSWORD,
+                                                         'first_name': 'Load', 'last_name': 'Test'})
+        self.login()
+
+    def login(self):
+        response = self.client.post('/api/accounts/login/', json={'username': self.username, 'password': PASSWORD})
+        response.raise_for_status()
+        self.token = response.json()['access']
+        return response
+
+    @property
+    def auth(self):
+        return {'Authorization': f"Bearer {self.token}"}
+
+    def chat(self, stream=False):
+        self.sent += 1
+        data = {'message': MESSAGES[self.sent % len(MESSAGES)], 'session_id': self.session_id, 'cache': False}
+        if not stream:
+            response = self.client.post('/api/chatbot/chat/', json=data, headers=self.auth)
+            response.raise_for_status()
+            return response
+        with self.client.stream('POST', '/api/chatbot/chat/', json={**data, 'stream': True},
+                                headers=self.auth) as response:
+            response.raise_for_status()
+            body = response.read()
+        if b'event: done' not in body:
+            raise RuntimeError('stream ended without a done event')
+        return response
+
+    def messages(self):
+        response = self.client.get('/api/chatbot/messages/', headers=self.auth)
+        response.raise_for_status()
+        return response
+
+
+def run_level(users, scenario, duration):
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    actions = {
+        'login': lambda user: user.login(),
+        'chat': lambda user: user.chat(),
+        'chat_stream': lambda user: user.chat(stream=True),
+        'messages': lambda user: user.messages(),
+    }
+    action = actions[scenario]
+
+    def worker(user):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                action(user)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(users)) as executor:
+        list(executor.map(worker, users))
+    wall = time.monotonic() - started
+
+    ordered = sorted(latencies)
+    return {
+        'requests': len(ordered),
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'rps': round(len(ordered) / wall, 2),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 1),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 1),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 1) if ordered else 0.0,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    """One line per scenario/level with the change in RPS and p99 against a previous report."""
+    lines = []
+    for scenario, levels in report['results'].items():
+        for level, result in levels.items():
+            before = baseline.get('results', {}).get(scenario, {}).get(level)
+            if not before:
+                continue
+            rps = (result['rps'] - before['rps']) / before['rps'] * 100 if before['rps'] else 0.0
+            p99 = (result['p99_ms'] - before['p99_ms']) / before['p99_ms'] * 100 if before['p99_ms'] else 0.0
+            lines.append(f"{scenario:12} c={level:>4}  rps {before['rps']:>8} -> {result['rps']:>8} ({rps:+.1f}%)  "
+                         f"p99 {before['p99_ms']:>8} -> {result['p99_ms']:>8} ms ({p99:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=['login', 'chat', 'messages'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per scenario and level')
+    parser.add_argument('--warmup', type=float, default=3.0, help='Seconds of unrecorded chat traffic first')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--user-prefix', default='loadtest')
+    parser.add_argument('--output', help='Write the JSON report here (default: stdout)')
+    parser.add_argument('--baseline', help='Previous report to compare against')
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2, max_keepalive_connections=max(args.concurrency))
+    with httpx.Client(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        users = [LoadUser(client, f"{args.user_prefix}-{i}") for i in range(max(args.concurrency))]
+        with ThreadPoolExecutor(max_workers=min(len(users), 16)) as executor:
+            list(executor.map(LoadUser.setup, users))
+        if args.warmup:
+            run_level(users[:1], 'chat', args.warmup)
+
+        report = {
+            'meta': {
+                'base_url': args.base_url,
+                'git_commit': git_commit(),
+                'started_at': datetime.now(timezone.utc).isoformat(),
+                'duration': args.duration,
+                'concurrency': args.concurrency,
+            },
+            'results': {},
+        }
+        for scenario in args.scenarios:
+            for level in args.concurrency:
+                result = run_level(users[:level], scenario, args.duration)
+                report['results'].setdefault(scenario, {})[str(level)] = result
+                print(f"{scenario:12} c={level:>4}  {result['rps']:>8} rps  p50 {result['p50_ms']:>8} ms  "
+                      f"p99 {result['p99_ms']:>8} ms  errors {result['errors']}", flush=True)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print('\n'.join(compare(report, json.load(f))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Settings for load tests: stub NLP pipelines, a separate database and no LLM response cache.
+
+    DJANGO_SETTINGS_MODULE=loadtest.settings python manage.py migrate
+    DJANGO_SETTINGS_MODULE=loadtest.settings python manage.py runserver --noreload
+"""
+from rag_project.settings import *  # noqa: F401,F403
+from rag_project.settings import BASE_DIR, DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+DATABASES['default']['NAME'] = BASE_DIR / 'loadtest.db'
+DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_loadtest.db'}
+
+CHATBOT_NLP_MODELS = {
+    'sentiment': {'task': 'sentiment-analysis', 'stub': True, 'labels': ['POSITIVE', 'NEGATIVE'], 'latency_ms': 5},
+    'emotion': {'task': 'text-classification', 'stub': True,
+                'labels': ['joy', 'sadness', 'anger', 'fear', 'love', 'surprise'], 'latency_ms': 5},
+    'embedding': {'task': 'feature-extraction', 'stub': True, 'dim': 384, 'latency_ms': 2},
+}
+
+# Every chat should reach the (stub) model server.
+LLM_RESPONSE_CACHE = {'enabled': False}
+
+CHATBOT_PROMPT = {'tokenizer': None}
+
+CHATBOT_EMBEDDINGS = {'dim': 384, 'top_k': 5, 'dir': BASE_DIR / 'loadtest_vector_store'}
+CHATBOT_CORPUS = {'dir': BASE_DIR / 'loadtest_vector_store' / 'corpus'}
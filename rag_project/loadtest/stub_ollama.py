@@ -0,0 +1,123 @@
+"""Stub of the Ollama /api/chat endpoint for load tests.
+
+    python -m loadtest.stub_ollama --port 11434 --latency 0.3 --token-rate 40 --tokens 60
+
+Non-streaming requests wait ``latency + tokens / token_rate`` seconds and
+return one JSON object; streaming requests wait ``latency`` (time to first
+token) and then write one NDJSON line per token at ``token_rate``.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ['focus', 'on', 'small', 'steps', 'rest', 'well', 'and', 'keep', 'going', 'today']
+
+
+def now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self._json(200, {'models': [{'name': f"{self.config.model}:latest"}]})
+        else:
+            self._json(200, {'status': 'Ollama is running'})
+
+    def do_POST(self):
+        if self.path != '/api/chat':
+            self._json(404, {'error': 'not found'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            self._json(400, {'error': 'invalid JSON'})
+            return
+        config = self.config
+        if config.error_rate and random.random() < config.error_rate:
+            self._json(500, {'error': 'stub failure'})
+            return
+        model = body.get('model', config.model)
+        tokens = [random.choice(WORDS) + ' ' for _ in range(config.tokens)]
+        latency = max(0.0, random.gauss(config.latency, config.jitter)) if config.jitter else config.latency
+        if body.get('stream', True):
+            self._stream(model, tokens, latency)
+        else:
+            time.sleep(latency + len(tokens) / config.token_rate)
+            self._json(200, {
+                'model': model,
+                'created_at': now(),
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'done': True,
+                'eval_count': len(tokens),
+            })
+
+    def _stream(self, model, tokens, latency):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        time.sleep(latency)
+        for token in tokens:
+            self._chunk({'model': model, 'created_at': now(),
+                         'message': {'role': 'assistant', 'content': token}, 'done': False})
+            time.sleep(1.0 / self.config.token_rate)
+        self._chunk({'model': model, 'created_at': now(), 'message': {'role': 'assistant', 'content': ''},
+                     'done': True, 'eval_count': len(tokens)})
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _chunk(self, data):
+        line = (json.dumps(data) + '\n').encode('utf-8')
+        self.wfile.write(f"{len(line):x}\r\n".encode('ascii') + line + b'\r\n')
+        self.wfile.flush()
+
+    def _json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host='127.0.0.1', port=11434, latency=0.2, token_rate=50.0, tokens=40, jitter=0.0,
+                error_rate=0.0, model='mistral'):
+    config = argparse.Namespace(latency=latency, token_rate=token_rate, tokens=tokens, jitter=jitter,
+                                error_rate=error_rate, model=model)
+    handler = type('ConfiguredStubOllamaHandler', (StubOllamaHandler,), {'config': config})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds before the first token')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Standard deviation of the latency')
+    parser.add_argument('--token-rate', type=float, default=50.0, help='Tokens per second')
+    parser.add_argument('--tokens', type=int, default=40, help='Tokens per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with a 500')
+    parser.add_argument('--model', default='mistral')
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.latency, args.token_rate, args.tokens, args.jitter,
+                         args.error_rate, args.model)
+    print(f"Stub Ollama listening on http://{args.host}:{args.port}/api/chat")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
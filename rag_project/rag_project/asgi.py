@@ -14,3 +14,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rag_project.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings
+from chatbot.nlp import registry
+from chatbot.jobs import insight_jobs
+from accounts.enrichment import zoning_jobs
+
+if getattr(settings, 'CHATBOT_NLP_WARMUP', True):
+    registry.warm_up_in_background()
+insight_jobs.resume_pending_in_background()
+zoning_jobs.resume_pending_in_background()
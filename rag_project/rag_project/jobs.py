@@ -0,0 +1,191 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class LostClaim(Exception):
+    """The job was re-claimed by another worker, so this worker's result must be dropped."""
+
+
+class Heartbeat(threading.Thread):
+    """Keeps a claimed job's ``updated_at`` fresh so it does not look stale while it is still running."""
+
+    def __init__(self, runner, job, interval):
+        super().__init__(name=f"{runner.name}-heartbeat", daemon=True)
+        self.runner = runner
+        self.job = job
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                if not self.runner.claimed(self.job).update(updated_at=timezone.now()):
+                    return
+        except Exception:
+            logger.exception('Heartbeat for %s %s failed', self.runner.name, self.job.pk)
+        finally:
+            close_old_connections()
+
+    def stop(self):
+        self._stopped.set()
+
+
+class DatabaseJobRunner:
+    """Runs job rows on a small in-process thread pool.
+
+    The table is the source of truth: a job is claimed with a conditional
+    UPDATE, failures are rescheduled after ``retry_delay`` until
+    ``max_attempts``, and ``resume_pending`` picks up whatever a previous
+    process left behind. A RUNNING job becomes claimable again once its
+    ``updated_at`` is ``stale_after`` seconds old, so a heartbeat refreshes it
+    while the job runs. ``attempts`` doubles as the claim token: every write
+    checks that the job is still RUNNING under this worker's attempt, and a
+    worker that lost its claim drops its result.
+
+    Subclasses set ``model`` (with PENDING/RUNNING/DONE/FAILED statuses,
+    ``attempts``, ``last_error``, ``run_after`` and ``updated_at``) and
+    ``name``, and implement ``config`` and ``process``.
+    """
+
+    model = None
+    name = 'job'
+
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def config(self):
+        """Dict with at least ``workers``, ``max_attempts``, ``retry_backoff``, ``stale_after`` and ``heartbeat``."""
+        raise NotImplementedError
+
+    def process(self, job):
+        """Does the work of a claimed job and marks it done with ``finish``; an exception goes to ``failed``.
+
+        Run the result write and ``finish`` in one transaction, so a LostClaim
+        raised by ``finish`` rolls the write back.
+        """
+        raise NotImplementedError
+
+    def retryable(self, error):
+        return True
+
+    def retry_delay(self, job, config):
+        return config['retry_backoff'] * job.attempts
+
+    def get_job(self, job_id):
+        return self.model.objects.get(pk=job_id)
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.config()['workers'], thread_name_prefix=self.name
+                    )
+        return self._executor
+
+    def enqueue(self, job_id, delay=0):
+        if delay > 0:
+            timer = threading.Timer(delay, self.enqueue, args=(job_id,))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.executor.submit(self._run_in_thread, job_id)
+
+    def resume_pending(self):
+        try:
+            jobs = self.pending_jobs()
+        except Exception:
+            logger.exception('Could not load pending %s rows', self.name)
+            return
+        finally:
+            close_old_connections()
+        now = timezone.now()
+        for job_id, run_after in jobs:
+            self.enqueue(job_id, delay=max(0, (run_after - now).total_seconds()))
+
+    def resume_pending_in_background(self):
+        thread = threading.Thread(target=self.resume_pending, name=f"{self.name}-resume", daemon=True)
+        thread.start()
+        return thread
+
+    def claimable(self):
+        stale = timezone.now() - timedelta(seconds=self.config()['stale_after'])
+        return Q(status=self.model.PENDING) | Q(status=self.model.RUNNING, updated_at__lt=stale)
+
+    def pending_jobs(self, due_only=False):
+        jobs = self.model.objects.filter(self.claimable())
+        if due_only:
+            jobs = jobs.exclude(status=self.model.PENDING, run_after__gt=timezone.now())
+        return list(jobs.order_by('run_after').values_list('pk', 'run_after'))
+
+    def _run_in_thread(self, job_id):
+        close_old_connections()
+        try:
+            self.run(job_id)
+        except Exception:
+            logger.exception('%s %s crashed', self.name, job_id)
+        finally:
+            close_old_connections()
+
+    def run(self, job_id):
+        claimed = (
+            self.model.objects
+            .filter(self.claimable(), pk=job_id)
+            .update(status=self.model.RUNNING, attempts=F('attempts') + 1, updated_at=timezone.now())
+        )
+        if not claimed:
+            return None
+        job = self.get_job(job_id)
+        config = self.config()
+        heartbeat = Heartbeat(self, job, config['heartbeat'])
+        heartbeat.start()
+        try:
+            try:
+                self.process(job)
+            except LostClaim:
+                raise
+            except Exception as e:
+                self.failed(job, e)
+        except LostClaim:
+            logger.warning('%s %s was re-claimed by another worker; dropping this run', self.name, job.pk)
+        finally:
+            heartbeat.stop()
+        return job
+
+    def claimed(self, job):
+        """The job row, if this worker's claim on it still holds."""
+        return self.model.objects.filter(pk=job.pk, status=self.model.RUNNING, attempts=job.attempts)
+
+    def save_claimed(self, job, **fields):
+        """Updates ``fields`` on the job only while this worker's claim holds; raises LostClaim otherwise."""
+        if not self.claimed(job).update(updated_at=timezone.now(), **fields):
+            raise LostClaim(job.pk)
+        for field, value in fields.items():
+            setattr(job, field, value)
+
+    def finish(self, job, status, error='', fields=()):
+        self.save_claimed(job, status=status, last_error=error, **{field: getattr(job, field) for field in fields})
+
+    def failed(self, job, error):
+        config = self.config()
+        if not self.retryable(error):
+            self.finish(job, self.model.FAILED, str(error))
+            return
+        if job.attempts >= config['max_attempts']:
+            logger.warning('%s %s failed after %d attempts: %s', self.name, job.pk, job.attempts, error)
+            self.finish(job, self.model.FAILED, str(error))
+            return
+        delay = self.retry_delay(job, config)
+        self.save_claimed(job, status=self.model.PENDING, last_error=str(error),
+                          run_after=timezone.now() + timedelta(seconds=delay))
+        self.enqueue(job.pk, delay=delay)
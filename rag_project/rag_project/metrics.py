@@ -0,0 +1,143 @@
+import math
+import threading
+from collections import deque
+
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+
+class Gauge(Counter):
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+
+class Histogram:
+    """Keeps totals plus a bounded window of recent samples for percentile estimates."""
+
+    def __init__(self, max_samples=2048):
+        self._samples = deque(maxlen=max_samples)
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._samples.append(value)
+            self._count += 1
+            self._sum += value
+
+    @property
+    def count(self):
+        return self._count
+
+    @property
+    def sum(self):
+        return self._sum
+
+    def percentile(self, q):
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+    def snapshot(self):
+        return {
+            'count': self._count,
+            'sum': self._sum,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._descriptions = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, description, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = kind()
+                    self._metrics[key] = metric
+                    if description:
+                        self._descriptions.setdefault(name, description)
+        return metric
+
+    def counter(self, name, description='', **labels):
+        return self._get(Counter, name, description, labels)
+
+    def gauge(self, name, description='', **labels):
+        return self._get(Gauge, name, description, labels)
+
+    def histogram(self, name, description='', **labels):
+        return self._get(Histogram, name, description, labels)
+
+    def collect(self):
+        with self._lock:
+            items = sorted(self._metrics.items(), key=lambda item: item[0])
+        for (name, labels), metric in items:
+            yield name, dict(labels), metric
+
+    def snapshot(self):
+        data = {}
+        for name, labels, metric in self.collect():
+            value = metric.snapshot() if isinstance(metric, Histogram) else metric.value
+            data.setdefault(name, []).append({'labels': labels, 'value': value})
+        return data
+
+    def render_prometheus(self):
+        """Prometheus text exposition format; histograms are exported as summaries with p50/p95/p99."""
+        lines = []
+        seen = set()
+        for name, labels, metric in self.collect():
+            if name not in seen:
+                seen.add(name)
+                kind = 'summary' if isinstance(metric, Histogram) else 'gauge' if isinstance(metric, Gauge) else 'counter'
+                if name in self._descriptions:
+                    lines.append(f"# HELP {name} {self._descriptions[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+            if isinstance(metric, Histogram):
+                for q in (50, 95, 99):
+                    quantile = {**labels, 'quantile': str(q / 100)}
+                    lines.append(f"{name}{format_labels(quantile)} {metric.percentile(q)}")
+                lines.append(f"{name}_sum{format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{format_labels(labels)} {metric.value}")
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,112 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from rag_project.metrics import metrics
+from rag_project.tracing import current_trace_id, end_trace, set_endpoint, start_trace
+
+logger = logging.getLogger('rag_project.trace')
+
+
+class RequestTimingMiddleware:
+    """Starts a trace per request and records http_request_seconds by endpoint.
+
+    The endpoint label is the matched URL route, so spans recorded while the
+    view runs are grouped per endpoint too. An incoming X-Request-ID is reused
+    as the trace id; the id is returned in X-Trace-Id.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens, started = self._start(request)
+        response = self.get_response(request)
+        return self._finish(request, response, started, tokens)
+
+    async def __acall__(self, request):
+        tokens, started = self._start(request)
+        response = await self.get_response(request)
+        return self._finish(request, response, started, tokens)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_endpoint(self._endpoint(request))
+
+    def _start(self, request):
+        tokens = start_trace(request.headers.get('X-Request-ID'))
+        request.trace_id = current_trace_id()
+        return tokens, time.perf_counter()
+
+    def _finish(self, request, response, started, tokens):
+        elapsed = time.perf_counter() - started
+        endpoint = self._endpoint(request)
+        metrics.histogram('http_request_seconds', 'Request latency up to the first response byte',
+                          endpoint=endpoint, method=request.method).observe(elapsed)
+        metrics.counter('http_requests_total', 'Requests by endpoint and status',
+                        endpoint=endpoint, method=request.method, status=str(response.status_code)).inc()
+        response['X-Trace-Id'] = request.trace_id
+        logger.info('%s %s endpoint=%s status=%s duration_ms=%.1f%s', request.method, request.path, endpoint,
+                    response.status_code, elapsed * 1000, ' streaming' if response.streaming else '')
+        # Streaming responses keep producing spans after the view returns, so their trace stays bound
+        # until the body is exhausted or the server closes it.
+        if response.streaming:
+            stream_class = AsyncTracedStream if response.is_async else TracedStream
+            response.streaming_content = stream_class(response.streaming_content, tokens, started, endpoint)
+        else:
+            end_trace(tokens)
+        return response
+
+    def _endpoint(self, request):
+        match = getattr(request, 'resolver_match', None)
+        return f"/{match.route}" if match else 'unmatched'
+
+
+class StreamEnd:
+    """Records the full stream duration and ends the request's trace once, when the body finishes or is closed."""
+
+    def __init__(self, content, tokens, started, endpoint):
+        self.content = content
+        self.tokens = tokens
+        self.started = started
+        self.endpoint = endpoint
+        self._ended = False
+
+    def close(self):
+        if self._ended:
+            return
+        self._ended = True
+        metrics.histogram('http_stream_seconds', 'Streaming response latency up to the last byte',
+                          endpoint=self.endpoint).observe(time.perf_counter() - self.started)
+        end_trace(self.tokens)
+
+
+class TracedStream(StreamEnd):
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except StopIteration:
+            self.close()
+            raise
+
+
+class AsyncTracedStream(StreamEnd):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.content.__anext__()
+        except StopAsyncIteration:
+            self.close()
+            raise
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'chatbot',
 ]
 MIDDLEWARE = [
+    'rag_project.middleware.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -59,6 +60,16 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'database.db',
+        # IMMEDIATE takes SQLite's write lock at BEGIN, so read-modify-write
+        # transactions (profile updates) queue up instead of losing updates.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # An on-disk test database honours the busy timeout; shared-cache memory databases do not.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_database.db',
+        },
     }
 }
 AUTH_PASSWORD_VALIDATORS = [
@@ -84,3 +95,212 @@ USE_I18N = True
 USE_TZ = True
 STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Chatbot NLP models, loaded once per worker and warmed up at startup
+CHATBOT_NLP_WARMUP = True
+CHATBOT_NLP_MODELS = {
+    'sentiment': {'task': 'sentiment-analysis'},
+    'emotion': {'task': 'text-classification', 'model': 'bhadresh-savani/distilbert-base-uncased-emotion'},
+    'embedding': {'task': 'feature-extraction', 'model': 'sentence-transformers/all-MiniLM-L6-v2'},
+}
+# Sentiment mode (chatbot.sentiment): 'fast' uses only the VADER lexicon, 'accurate' only the transformer
+# 'sentiment' model, 'tiered' uses VADER and escalates to the transformer when |compound| is below
+# ambiguous_below or the message has more than long_message_words words.
+CHATBOT_SENTIMENT = {
+    'mode': 'tiered',
+    'ambiguous_below': 0.3,
+    'long_message_words': 50,
+}
+# Cross-request micro-batching: flush after window_ms or max_batch_size messages
+CHATBOT_NLP_BATCHING = {
+    'enabled': True,
+    'window_ms': 10,
+    'max_batch_size': 32,
+    'timeout': 30,
+}
+
+# Shared keep-alive client for the model server (chatbot.client)
+LLM_CLIENT = {
+    'connect_timeout': 3.05,
+    'read_timeout': 120,
+    'max_retries': 2,
+    'backoff_base': 0.5,
+    'backoff_max': 5.0,
+    'pool_size': 20,
+}
+
+# Model server backend (chatbot.backends): type is 'ollama', 'openai' (any /v1/chat/completions server),
+# 'stub' or a dotted class path. Requests are balanced across nodes ('least_outstanding' or
+# 'weighted_round_robin'); a node is ejected for eject_seconds after eject_after_failures failures
+# or a failed health check, and never has more than its max_concurrency requests in flight.
+LLM_BACKEND = {
+    'type': 'ollama',
+    'model': 'mistral',
+    'nodes': [
+        {'url': 'http://localhost:11434', 'weight': 1, 'max_concurrency': 8},
+    ],
+    'balancing': 'least_outstanding',
+    'acquire_timeout': 30,
+    'failover': 1,
+    'eject_after_failures': 3,
+    'eject_seconds': 30,
+    'health_check_interval': 10,
+    'api_key': None,
+}
+
+# Admission control in front of the model server (chatbot.admission): at most max_concurrency chats
+# hold a slot, the rest queue per user/session and are served round robin. A client with
+# max_queue_per_client chats waiting gets a 429; a full queue or a wait over queue_timeout seconds
+# gets a 503. Both carry Retry-After. Set max_concurrency near Ollama's OLLAMA_NUM_PARALLEL.
+LLM_ADMISSION = {
+    'enabled': True,
+    'max_concurrency': 4,
+    'max_queue': 32,
+    'max_queue_per_client': 4,
+    'queue_timeout': 15,
+    'expected_seconds': 5,
+}
+
+# Identical prompts in flight at the same time share one model server call (chatbot.singleflight).
+# With 'shared' the leader holds a lock in the 'alias' cache so other workers wait for its result;
+# that needs a cache all workers can see (Redis, Memcached, database).
+LLM_SINGLE_FLIGHT = {
+    'enabled': True,
+    'shared': False,
+    'alias': 'default',
+    'lock_timeout': 120,
+    'poll_interval': 0.05,
+    'result_ttl': 30,
+}
+
+# LLM response cache keyed on model + normalized prompt; backend is 'lru' or 'django'
+LLM_RESPONSE_CACHE = {
+    'enabled': True,
+    'backend': 'lru',
+    'alias': 'default',
+    'ttl': 3600,
+    'max_entries': 1000,
+    'max_bytes': 16 * 1024 * 1024,
+}
+
+# Insight generation after the answer is returned (chatbot.jobs). A running job refreshes its row every
+# heartbeat seconds; one silent for stale_after seconds is assumed dead and may be re-claimed.
+CHATBOT_INSIGHT_JOBS = {
+    'deferred': True,
+    'workers': 2,
+    'max_attempts': 3,
+    'retry_backoff': 5,
+    'stale_after': 300,
+    'heartbeat': 60,
+}
+
+# Category taxonomy (category -> keywords/phrases); CHATBOT_TAXONOMY_FILE may point to a JSON file instead
+CHATBOT_TAXONOMY = {
+    'Productivity': ['productivity', 'efficient', 'focus'],
+    'Health': ['health', 'wellness', 'fitness'],
+    'Relationships': ['relationship', 'social', 'communication'],
+}
+CHATBOT_TAXONOMY_FILE = None
+
+# Bounded per-user aggregates kept on chatbot.UserProfile
+CHATBOT_PROFILE_STATS = {
+    'recent_size': 20,
+    'emotion_decay': 0.9,
+}
+
+# Default page size for the cursor-paginated message history endpoints (?page_size= overrides, max 200)
+CHATBOT_HISTORY_PAGE_SIZE = 50
+
+# Per-user/session insight vectors (chatbot.embeddings); dim must match the 'embedding' model
+CHATBOT_EMBEDDINGS = {
+    'dim': 384,
+    'top_k': 5,
+    'dir': BASE_DIR / 'vector_store',
+}
+
+# Document corpus for retrieval (python manage.py ingest_documents <paths>); mode is 'ivf' or 'flat'
+CHATBOT_CORPUS = {
+    'enabled': True,
+    'dir': BASE_DIR / 'vector_store' / 'corpus',
+    'mode': 'ivf',
+    'nprobe': 8,
+    'top_k': 3,
+    'min_score': 0.3,
+    'chunk_size': 800,
+    'chunk_overlap': 100,
+}
+
+# Token budgets per prompt section (chatbot.prompt). tokenizer is a Hugging Face tokenizer name that should
+# match the LLM (gated repos need HF_TOKEN set). None approximates counts as the larger of words/punctuation
+# and one token per chars_per_token characters, which overcounts rather than overflowing the context.
+CHATBOT_PROMPT = {
+    'tokenizer': None,
+    'chars_per_token': 3,
+    'cache_size': 4096,
+    'budgets': {
+        'profile': 64,
+        'retrieved': 768,
+        'history': 512,
+        'message': 1024,
+    },
+    'min_trimmed_tokens': 16,
+}
+
+# Geocoding/zoning lookup cache (accounts.geo_cache); backend is 'db' (accounts_geolookup table) or 'django'
+GEO_LOOKUP_CACHE = {
+    'enabled': True,
+    'backend': 'db',
+    'alias': 'default',
+    'ttl': 30 * 24 * 3600,
+    'negative_ttl': 24 * 3600,
+    'coordinate_precision': 5,
+}
+
+# Local zoning lookups once an atlas is imported (python manage.py import_zoning_atlas <geojson>); cell_size in degrees
+ZONING_ATLAS = {
+    'enabled': True,
+    'cell_size': 0.01,
+}
+
+# Background zoning enrichment after OTP verification (accounts.enrichment); backoff doubles per attempt
+ZONING_ENRICHMENT = {
+    'workers': 2,
+    'max_attempts': 5,
+    'retry_backoff': 10,
+    'max_backoff': 600,
+    'stale_after': 300,
+    'heartbeat': 60,
+}
+# (connect, read) timeout in seconds for Nominatim/ArcGIS requests
+GEO_REQUEST_TIMEOUT = (5, 15)
+
+# Who may read /metrics: clients from allowed_ips, requests with 'Authorization: Bearer <token>', and staff users
+METRICS_ACCESS = {
+    'allowed_ips': ['127.0.0.1', '::1'],
+    'token': None,
+    'allow_staff': True,
+}
+
+# Request/stage timing logs carry the request's trace id (returned to clients as X-Trace-Id)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_id': {'()': 'rag_project.tracing.TraceIdFilter'},
+    },
+    'formatters': {
+        'traced': {'format': '%(asctime)s %(levelname)s [trace=%(trace_id)s] %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'filters': ['trace_id'], 'formatter': 'traced'},
+    },
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+    'loggers': {
+        # Replaces Django's own console handler so its records are not printed twice.
+        'django': {'level': 'WARNING'},
+        'rag_project.trace': {'level': 'INFO'},
+    },
+}
+
+# Nominatim usage policy: at most one request per second (accounts.geo_utils.RateLimiter)
+NOMINATIM_RPS = 1
@@ -0,0 +1,73 @@
+import contextvars
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+
+from rag_project.metrics import metrics
+
+logger = logging.getLogger('rag_project.trace')
+
+_trace_id = contextvars.ContextVar('trace_id', default=None)
+_endpoint = contextvars.ContextVar('endpoint', default='background')
+
+
+def new_trace_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+def start_trace(trace_id=None):
+    """Binds a trace id to the current context (request thread or task); returns the tokens for ``end_trace``."""
+    return _trace_id.set(trace_id or new_trace_id()), _endpoint.set('unmatched')
+
+
+def end_trace(tokens):
+    trace_token, endpoint_token = tokens
+    try:
+        _endpoint.reset(endpoint_token)
+        _trace_id.reset(trace_token)
+    except ValueError:
+        # A streamed response can be closed from a copy of the request's context (ASGI), where the
+        # tokens do not apply; unbind the trace there instead.
+        _endpoint.set('background')
+        _trace_id.set(None)
+
+
+def set_endpoint(endpoint):
+    _endpoint.set(endpoint)
+
+
+def current_endpoint():
+    return _endpoint.get()
+
+
+@contextmanager
+def span(stage):
+    """Times one pipeline stage into stage_seconds{stage, endpoint} and logs it with the trace id."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint.get()
+        metrics.histogram('stage_seconds', 'Chat pipeline stage latency', stage=stage, endpoint=endpoint).observe(
+            elapsed
+        )
+        logger.info('stage=%s endpoint=%s duration_ms=%.1f', stage, endpoint, elapsed * 1000)
+
+
+def annotate(**fields):
+    """Logs request-scoped facts (e.g. a prompt's token count) under the current trace id."""
+    logger.info('%s endpoint=%s', ' '.join(f"{key}={value}" for key, value in fields.items()), _endpoint.get())
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds ``trace_id`` to every log record so log lines of one request can be grepped together."""
+
+    def filter(self, record):
+        record.trace_id = _trace_id.get() or '-'
+        return True
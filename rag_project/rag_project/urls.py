@@ -17,8 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .views import prometheus_metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),
     path('api/chatbot/', include('chatbot.urls')),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]
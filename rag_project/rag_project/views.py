@@ -0,0 +1,36 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from rag_project.metrics import metrics
+
+DEFAULT_METRICS_ACCESS = {
+    'allowed_ips': ['127.0.0.1', '::1'],
+    'token': None,
+    'allow_staff': True,
+}
+
+
+def metrics_access_config():
+    return {**DEFAULT_METRICS_ACCESS, **getattr(settings, 'METRICS_ACCESS', {})}
+
+
+def metrics_allowed(request):
+    """Scrapers from an allowed address or with the bearer token, and staff users, may read /metrics."""
+    config = metrics_access_config()
+    if request.META.get('REMOTE_ADDR') in config['allowed_ips']:
+        return True
+    token = config['token']
+    authorization = request.headers.get('Authorization', '')
+    if token and hmac.compare_digest(authorization.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(config['allow_staff'] and user is not None and user.is_staff)
+
+
+def prometheus_metrics(request):
+    """Process-local metrics in Prometheus text format; scrape every worker (e.g. per pod) to aggregate."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden('Metrics are not available to this client')
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')